@@ -0,0 +1,136 @@
+# audio.py - SFX playback with reserved channel groups, voice limits and cooldowns
+#
+# Simulation code only calls play(name), which appends to a queue. flush() is
+# called once per rendered frame and is the only place that touches the mixer,
+# so a 20-coin combo burst costs 20 list appends, not 20 mixer calls, and can
+# never exhaust the channels other sounds rely on.
+import threading
+import time
+from collections import deque
+
+import pygame
+
+import log
+
+
+class SoundSpec:
+    def __init__(self, path, volume=1.0, group="sfx", max_voices=1, cooldown=0.0):
+        self.path = path
+        self.volume = volume
+        self.group = group
+        self.max_voices = max_voices  # simultaneous copies of this sound
+        self.cooldown = cooldown      # seconds before it may start again
+
+
+class AudioService:
+    def __init__(self, specs, groups):
+        """
+        specs:  {name: SoundSpec}
+        groups: {group name: channel count}; channels are reserved, so
+                pygame's own Sound.play() can never steal them.
+        """
+        self.specs = specs
+        self.sounds = {}
+        self.queue = deque()  # appended by the sim thread in threaded mode
+        self.last_played = {}
+        self.playing_on = {}  # Channel -> sound name
+
+        total = sum(groups.values())
+        if pygame.mixer.get_num_channels() < total:
+            pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)
+        self.groups = {}
+        i = 0
+        for name, count in groups.items():
+            self.groups[name] = [pygame.mixer.Channel(i + k) for k in range(count)]
+            i += count
+
+        self.stats = {"played": 0, "cooldown": 0, "voice_limit": 0, "no_channel": 0, "not_loaded": 0}
+        self.loader = threading.Thread(target=self._load_all, daemon=True)
+        self.loader.start()
+
+    def _load_all(self):
+        # Sound() decodes the whole file into a mixer buffer up front
+        for name, spec in self.specs.items():
+            try:
+                snd = pygame.mixer.Sound(spec.path)
+                snd.set_volume(spec.volume)
+                self.sounds[name] = snd
+            except (pygame.error, FileNotFoundError) as e:
+                log.warning("could not load %s: %s", spec.path, e)
+
+    def wait_loaded(self, timeout=None):
+        self.loader.join(timeout)
+
+    def play(self, name):
+        """Queue a sound; cheap enough for the simulation hot path."""
+        self.queue.append(name)
+
+    def flush(self):
+        if not self.queue:
+            return
+        now = time.perf_counter()
+        queue = self.queue
+        while queue:
+            self._start(queue.popleft(), now)
+
+    def _start(self, name, now):
+        snd = self.sounds.get(name)
+        if snd is None:
+            self.stats["not_loaded"] += 1
+            return
+        spec = self.specs[name]
+        if now - self.last_played.get(name, -1e9) < spec.cooldown:
+            self.stats["cooldown"] += 1
+            return
+
+        channels = self.groups[spec.group]
+        voices = 0
+        free = None
+        for ch in channels:
+            if ch.get_busy():
+                if self.playing_on.get(ch) == name:
+                    voices += 1
+            elif free is None:
+                free = ch
+        if voices >= spec.max_voices:
+            self.stats["voice_limit"] += 1
+            return
+        if free is None:
+            self.stats["no_channel"] += 1
+            return
+
+        free.play(snd)
+        self.playing_on[free] = name
+        self.last_played[name] = now
+        self.stats["played"] += 1
+
+    def pause_music(self):
+        pygame.mixer.music.pause()
+
+
+class NullAudio:
+    """Same interface, no mixer. Used for headless runs and when audio init fails."""
+    def __init__(self, *args, **kwargs):
+        self.stats = {}
+
+    def wait_loaded(self, timeout=None):
+        pass
+
+    def play(self, name):
+        pass
+
+    def flush(self):
+        pass
+
+    def pause_music(self):
+        pass
+
+
+def create_audio(specs, groups, enabled=True):
+    if enabled and pygame.mixer.get_init():
+        try:
+            return AudioService(specs, groups)
+        except pygame.error as e:
+            log.warning("audio disabled: %s", e)
+    return NullAudio()
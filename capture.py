@@ -0,0 +1,161 @@
+# capture.py - render a seeded run offscreen and dump frames + timings
+#
+#   python capture.py --frames 300 --size 1280x720 --seed 7 --out captures
+#   python capture.py --format raw --out captures   (single .rgba stream)
+#
+# Frames are rendered into an FBO on a hidden window (or a fully windowless
+# EGL context with --offscreen) and read back through PBOs, so the readback
+# of frame N overlaps the drawing of frame N+1.
+import glconfig  # first: sets PyOpenGL flags before OpenGL.GL is imported
+import argparse
+import os
+import queue
+import random
+import threading
+import time
+
+
+def parse_size(text):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+class FrameWriter(threading.Thread):
+    """Encodes and writes frames off the render thread."""
+    def __init__(self, out_dir, size, fmt):
+        super().__init__(daemon=True)
+        self.out_dir = out_dir
+        self.size = size
+        self.fmt = fmt
+        self.queue = queue.Queue(maxsize=8)
+        self.stream = None
+        if fmt == "raw":
+            self.stream = open(os.path.join(out_dir, "frames.rgba"), "wb")
+
+    def submit(self, index, data):
+        self.queue.put((index, data))
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        if self.stream:
+            self.stream.close()
+
+    def run(self):
+        import pygame
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            index, data = item
+            if self.stream:
+                # rows stay bottom-up as GL returns them (ffmpeg: -vf vflip)
+                self.stream.write(data)
+            else:
+                surf = pygame.image.frombuffer(data, self.size, "RGBA")
+                surf = pygame.transform.flip(surf, False, True)
+                pygame.image.save(surf, os.path.join(self.out_dir, f"frame_{index:05d}.png"))
+
+
+def capture(frames, size, seed, out_dir, fmt="png", fps=60):
+    # Imported late so --offscreen can pick the SDL video driver first.
+    from OpenGL.GL import glFinish
+    from game import Game
+    from framebuffer import Framebuffer, PixelReader, GpuTimer, MAX_GPU_MS
+
+    os.makedirs(out_dir, exist_ok=True)
+    random.seed(seed)
+
+    game = Game(size=size, hidden=True, persist=False, dynamic_res=False,
+                audio=False)
+    game.reset(seed)
+
+    w, h = size
+    target = Framebuffer(w, h)
+    reader = PixelReader(w, h)
+    gpu_timer = GpuTimer()
+    writer = FrameWriter(out_dir, size, fmt)
+    writer.start()
+
+    dt = 1.0 / fps
+    cpu_update, cpu_render, gpu_render = [], [], []
+    written = 0
+
+    target.bind()
+    for i in range(frames):
+        t0 = time.perf_counter()
+        game.update(dt)
+        game.events.drain()
+        t1 = time.perf_counter()
+
+        gpu_timer.begin()
+        game.render_frame()
+        gpu_ms = gpu_timer.end()
+        data = reader.read()
+        t2 = time.perf_counter()
+
+        cpu_update.append((t1 - t0) * 1000.0)
+        cpu_render.append((t2 - t1) * 1000.0)
+        if i >= gpu_timer.lag:
+            gpu_render.append(gpu_ms)  # None = rejected, keeps frames aligned
+        if data is not None:
+            writer.submit(written, data)
+            written += 1
+
+    for data in reader.drain():
+        writer.submit(written, data)
+        written += 1
+    gpu_render.extend(gpu_timer.drain())
+    glFinish()
+    target.unbind()
+    writer.close()
+
+    with open(os.path.join(out_dir, "timings.csv"), "w") as f:
+        f.write("frame,cpu_update_ms,cpu_render_ms,gpu_render_ms\n")
+        for i in range(frames):
+            g = gpu_render[i] if i < len(gpu_render) and gpu_render[i] is not None else ""
+            f.write(f"{i},{cpu_update[i]:.4f},{cpu_render[i]:.4f},{g}\n")
+
+    print(f"[CAPTURE] {written} frames {w}x{h} seed={seed} -> {out_dir} ({fmt})")
+    if fmt == "raw":
+        print(f"[CAPTURE] ffmpeg -f rawvideo -pix_fmt rgba -s {w}x{h} -r {fps} "
+              f"-i {os.path.join(out_dir, 'frames.rgba')} -vf vflip out.mp4")
+    if gpu_timer.rejected:
+        print(f"[CAPTURE] dropped {gpu_timer.rejected} implausible GPU timings (> {MAX_GPU_MS:.0f} ms)")
+    gpu_render = [g for g in gpu_render if g is not None]
+    for name, values in (("cpu update", cpu_update), ("cpu render", cpu_render), ("gpu render", gpu_render)):
+        mean = sum(values) / len(values) if values else 0.0
+        print(f"[CAPTURE] {name:10s} mean {mean:7.3f} ms  p50 {percentile(values, 50):7.3f}  "
+              f"p95 {percentile(values, 95):7.3f}  max {max(values, default=0.0):7.3f}")
+
+    import pygame
+    pygame.quit()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offscreen frame capture for Lane3D Runner")
+    ap.add_argument("--frames", type=int, default=120)
+    ap.add_argument("--size", type=parse_size, default=(900, 900), help="WxH, e.g. 1280x720")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="captures")
+    ap.add_argument("--format", choices=("png", "raw"), default="png")
+    ap.add_argument("--fps", type=int, default=60, help="simulation rate (fixed dt)")
+    ap.add_argument("--offscreen", action="store_true",
+                    help="use SDL's windowless EGL driver instead of a hidden window")
+    args = ap.parse_args()
+
+    if args.offscreen:
+        os.environ["SDL_VIDEODRIVER"] = "offscreen"
+    capture(args.frames, args.size, args.seed, args.out, args.format, args.fps)
+
+
+if __name__ == "__main__":
+    main()
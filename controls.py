@@ -0,0 +1,157 @@
+# controls.py - timestamped keyboard input, sub-step application, input latency
+#
+# pygame events carry no timestamp, so InputQueue stamps them with
+# perf_counter() when they are polled and keeps polling (about once a
+# millisecond) while the frame limiter waits, instead of sleeping through
+# clock.tick(). Game.run then hands each key to the fixed-step update whose
+# wall-clock interval contains it, rather than applying a whole frame's worth
+# of input before the first sub-step.
+#
+# In threaded mode poll() runs on the GL thread and due() on the sim thread;
+# they only meet in `pending`, a deque (append / popleft are thread-safe).
+#
+# Scripted input:   python controls.py script.json [--seed N] [--offscreen]
+#   script.json = [[seconds_after_start, "left"], [0.75, "right"], ...]
+# key names are pygame's ("left", "right", "space", "r", ...).
+import glconfig  # first: sets PyOpenGL flags before OpenGL.GL is imported
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+import pygame
+from pygame.locals import KEYDOWN
+
+
+class InputQueue:
+    def __init__(self, clock=time.perf_counter, window_keys=()):
+        """window_keys: keys delivered with the other events instead of `pending`."""
+        self.clock = clock
+        self.window_keys = frozenset(window_keys)
+        self.pending = deque()   # (t, key) not yet applied, in time order
+        self.script = deque()    # (t, key) injected, released once t has passed
+        self.other = []          # non-key events (QUIT, VIDEORESIZE, window keys) for the caller
+
+    def poll(self):
+        """Drain pygame's queue, stamping key presses. Returns the poll time."""
+        now = self.clock()
+        for ev in pygame.event.get():
+            if ev.type == KEYDOWN and ev.key not in self.window_keys:
+                self.pending.append((now, ev.key))
+            else:
+                self.other.append(ev)
+        while self.script and self.script[0][0] <= now:
+            t, key = self.script.popleft()
+            if key in self.window_keys:
+                self.other.append(pygame.event.Event(KEYDOWN, key=key))
+            else:
+                self.pending.append((t, key))
+        return now
+
+    def wait_until(self, deadline, resolution=0.001):
+        """Frame limiter that keeps stamping input while it waits."""
+        while True:
+            now = self.poll()
+            if now >= deadline:
+                return now
+            time.sleep(min(resolution, deadline - now))
+
+    def take_other(self):
+        events, self.other = self.other, []
+        return events
+
+    def due(self, until):
+        """Yield (t, key) for every pending key pressed at or before `until`."""
+        pending = self.pending
+        while pending and pending[0][0] <= until:
+            yield pending.popleft()
+
+    def inject(self, t, key):
+        """Queue a key press stamped `t` (perf_counter seconds)."""
+        self.script.append((t, key))
+
+    def play_script(self, steps, start=None):
+        """steps: [(seconds after start, key name or code), ...]."""
+        start = self.clock() if start is None else start
+        for offset, key in sorted(steps, key=lambda s: s[0]):
+            if isinstance(key, str):
+                key = pygame.key.key_code(key)
+            self.inject(start + offset, key)
+
+    def clear(self):
+        self.pending.clear()
+
+
+class LatencyTracker:
+    """
+    Input-to-photon latency: key timestamp -> the flip() that first shows the
+    resulting lane change. Accepted moves are matched to LaneChanged events in
+    order, so moves queued behind a running slide count their full wait.
+    In threaded mode presented() runs on the render thread and the rest on
+    the sim thread, so the pending queues are only touched under the lock.
+    """
+    def __init__(self, keep=4096):
+        self.lock = threading.Lock()
+        self.awaiting = deque()   # key times of accepted moves, lane not changed yet
+        self.changed = deque()    # (key time, sim frame) of lane changes not shown yet
+        self.samples = deque(maxlen=keep)
+
+    def accepted(self, t):
+        with self.lock:
+            self.awaiting.append(t)
+
+    def lane_changed(self, kind, frame, *_):
+        with self.lock:
+            if self.awaiting:
+                self.changed.append((self.awaiting.popleft(), frame))
+
+    def presented(self, now, frame=None):
+        """
+        Call right after pygame.display.flip(). frame: the sim frame that was
+        shown, when it may lag the simulation (threaded mode).
+        """
+        with self.lock:
+            changed = self.changed
+            while changed and (frame is None or changed[0][1] <= frame):
+                self.samples.append((now - changed.popleft()[0]) * 1000.0)
+
+    def reset(self):
+        with self.lock:
+            self.awaiting.clear()
+            self.changed.clear()
+
+    def percentiles(self, ps=(50, 95, 99)):
+        with self.lock:
+            s = sorted(self.samples)
+        if not s:
+            return {}
+        out = {f"p{p}": s[min(len(s) - 1, int(len(s) * p / 100.0))] for p in ps}
+        out["max"] = s[-1]
+        out["n"] = len(s)
+        return out
+
+
+def main(argv):
+    import argparse
+    import os
+    ap = argparse.ArgumentParser(description="Play a scripted input run and report input latency")
+    ap.add_argument("script")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--offscreen", action="store_true")
+    args = ap.parse_args(argv)
+    if args.offscreen:
+        os.environ["SDL_VIDEODRIVER"] = "offscreen"
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    with open(args.script) as f:
+        steps = json.load(f)
+
+    from game import Game
+    game = Game(persist=False, seed=args.seed)
+    game.reset(args.seed)
+    game.input.play_script(steps)
+    game.run(duration=max((s[0] for s in steps), default=0.0) + 1.0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
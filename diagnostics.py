@@ -0,0 +1,151 @@
+# diagnostics.py - resource counts, heap/GC stats and budget alerts for long sessions
+#
+# GL objects are counted where they are created and deleted (gl_created /
+# gl_deleted), entity counts come from callbacks the game registers, and
+# Diagnostics.tick() folds everything into one sample per interval
+# (default: a minute). A count over its budget, or one that has grown in
+# every sample of the leak window, is logged as a warning.
+#
+# tracemalloc is off by default (it slows allocation down); snapshot()
+# starts it on first use and diffs against the previous snapshot after that.
+import gc
+import time
+import tracemalloc
+from collections import deque
+
+import log
+
+# Live GL objects by kind: textures, buffers, framebuffers, renderbuffers,
+# queries, quadrics, display_lists
+GL_OBJECTS = {}
+# Allocation counters for things that should stay flat (e.g. overlay surfaces)
+ALLOCATIONS = {}
+
+
+def gl_created(kind, n=1):
+    GL_OBJECTS[kind] = GL_OBJECTS.get(kind, 0) + n
+
+
+def gl_deleted(kind, n=1):
+    GL_OBJECTS[kind] = GL_OBJECTS.get(kind, 0) - n
+
+
+def allocated(kind, n=1):
+    ALLOCATIONS[kind] = ALLOCATIONS.get(kind, 0) + n
+
+
+class Diagnostics:
+    def __init__(self, budgets=None, interval=60.0, leak_window=10, history=1440,
+                 clock=time.monotonic):
+        """
+        budgets:     {name: max count}; names are entity-source keys, GL kinds,
+                     allocation kinds, or "heap_mb" / "gc_ms" (per interval)
+        leak_window: samples in a row a count must grow before it is reported
+        history:     samples kept (1440 one-minute samples = a day)
+        """
+        self.budgets = dict(budgets or {})
+        self.interval = interval
+        self.leak_window = leak_window
+        self.clock = clock
+        self.sources = []
+        self.samples = deque(maxlen=history)
+        self.alerts = deque(maxlen=256)
+        self.next_sample = clock() + interval
+        self.last_snapshot = None
+
+        self.gc_ms = 0.0
+        self._gc_t0 = 0.0
+        self._gc_seen = [s["collections"] for s in gc.get_stats()]
+        gc.callbacks.append(self._gc_callback)
+
+    def add_source(self, fn):
+        """fn() -> {name: count}, called once per sample."""
+        self.sources.append(fn)
+
+    def _gc_callback(self, phase, info):
+        if phase == "start":
+            self._gc_t0 = time.perf_counter()
+        else:
+            self.gc_ms += (time.perf_counter() - self._gc_t0) * 1000.0
+
+    # --- sampling ---
+    def tick(self, now=None):
+        """Cheap per-frame call; samples once the interval has passed."""
+        now = self.clock() if now is None else now
+        if now < self.next_sample:
+            return None
+        self.next_sample = now + self.interval
+        return self.sample(now)
+
+    def sample(self, now=None):
+        counts = {}
+        for fn in self.sources:
+            counts.update(fn())
+        counts.update(GL_OBJECTS)
+        counts.update(ALLOCATIONS)
+
+        stats = gc.get_stats()
+        collections = [s["collections"] for s in stats]
+        gc_runs = [c - p for c, p in zip(collections, self._gc_seen)]
+        self._gc_seen = collections
+        counts["gc_ms"] = round(self.gc_ms, 2)
+        self.gc_ms = 0.0
+        counts["gc_objects"] = len(gc.get_objects())
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            counts["heap_mb"] = round(current / 2 ** 20, 2)
+            counts["heap_peak_mb"] = round(peak / 2 ** 20, 2)
+
+        sample = {"t": self.clock() if now is None else now, "counts": counts, "gc_runs": gc_runs}
+        self.samples.append(sample)
+        self._check(counts)
+        return sample
+
+    def _check(self, counts):
+        for name, budget in self.budgets.items():
+            value = counts.get(name)
+            if value is not None and value > budget:
+                self._alert(f"{name} = {value} over budget {budget}")
+
+        window = self.leak_window
+        if len(self.samples) > window:
+            recent = list(self.samples)[-window - 1:]
+            for name in counts:
+                if name in ("gc_ms", "heap_peak_mb"):
+                    continue
+                series = [s["counts"].get(name, 0) for s in recent]
+                if all(b > a for a, b in zip(series, series[1:])):
+                    self._alert(f"{name} grew in each of the last {window} samples "
+                                f"({series[0]} -> {series[-1]}), possible leak")
+
+    def _alert(self, msg):
+        self.alerts.append(msg)
+        log.warning("[DIAG] %s", msg)
+
+    # --- heap ---
+    def snapshot(self, top=10):
+        """
+        Start tracemalloc on the first call; later calls log the top
+        allocation sites by growth since the previous snapshot.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(8)
+            self.last_snapshot = tracemalloc.take_snapshot()
+            log.info("[DIAG] tracemalloc started; take another snapshot to diff")
+            return []
+        snap = tracemalloc.take_snapshot()
+        diff = snap.compare_to(self.last_snapshot, "lineno")[:top]
+        self.last_snapshot = snap
+        for stat in diff:
+            log.info("[DIAG] %s", stat)
+        return diff
+
+    def report(self):
+        """Latest sample plus recent alerts, e.g. for a status page."""
+        return {"last": self.samples[-1] if self.samples else None, "alerts": list(self.alerts)}
+
+    def close(self):
+        if self._gc_callback in gc.callbacks:
+            gc.callbacks.remove(self._gc_callback)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
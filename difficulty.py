@@ -0,0 +1,237 @@
+# difficulty.py - adaptive difficulty from rolling player metrics
+#
+# The fixed curve (speed +0.9/s plus score bumps, spawn interval x0.995 per
+# spawn) still runs; on top of it the controller picks a difficulty level
+# that scales spawn density and sets the obstacle pattern mix and coin rate.
+#
+# Simulation hands it the clearance of every obstacle the player passes,
+# measured by the collision sweep itself (the signed separation
+# swept_aabb_toi returns), and it notes the near ones, plus every lane change
+# the player actually made (a press into the road edge does not count, so
+# mashing against the wall is not read as busy steering). Every DECIDE_FRAMES
+# it folds that period into a short rolling window with the lane-change count and
+# the current combo, buckets the three window averages and reads the target
+# level from TABLE, precomputed at import. The level moves one step per
+# decision towards the target.
+#
+# Everything is derived from simulation state, so runs stay deterministic:
+# replays, savestates and LAN copies give the same levels.
+#
+#   python difficulty.py bench --runs 10        (update cost, adaptive vs fixed; 2-minute bot runs)
+import bisect
+import sys
+import time
+
+import numpy as np
+
+DECIDE_FRAMES = 60       # one decision a second
+WINDOW = 5               # decisions in the rolling window
+NEAR_MISS_RANGE = 2.0    # lateral clearance (world units) that counts as a near miss
+
+# Levels: (spawn interval scale, obstacle pattern cdf (cube, wide wall | tall wall), coin chance).
+# NEUTRAL is the fixed curve.
+LEVELS = (
+    (1.35, (0.75, 0.93), 0.34),
+    (1.22, (0.70, 0.91), 0.32),
+    (1.10, (0.65, 0.88), 0.30),
+    (1.00, (0.60, 0.85), 0.28),
+    (0.93, (0.55, 0.80), 0.26),
+    (0.87, (0.50, 0.75), 0.24),
+    (0.82, (0.45, 0.70), 0.22),
+)
+NEUTRAL = 3
+
+# Bucket edges for the window averages
+GAP_EDGES = (0.35, 0.8, 1.5)        # mean near-miss clearance; no near misses = widest bucket
+LANE_RATE_EDGES = (0.5, 1.2, 2.5)   # lane changes per second
+COMBO_EDGES = (0.5, 2.0, 5.0)       # combo sampled at each decision
+
+
+def build_table():
+    """Target level for every (gap, lane rate, combo) bucket, flattened."""
+    table = []
+    for gap in range(len(GAP_EDGES) + 1):
+        for rate in range(len(LANE_RATE_EDGES) + 1):
+            for combo in range(len(COMBO_EDGES) + 1):
+                skill = gap + combo
+                if gap < 2:  # busy steering while scraping past: struggling, not showing off
+                    skill -= max(0, rate - 1)
+                table.append(min(len(LEVELS) - 1, max(0, skill)))
+    return tuple(table)
+
+
+TABLE = build_table()
+_STRIDE_GAP = (len(LANE_RATE_EDGES) + 1) * (len(COMBO_EDGES) + 1)
+_STRIDE_RATE = len(COMBO_EDGES) + 1
+
+
+class DifficultyController:
+    def __init__(self, fps, every=DECIDE_FRAMES, window=WINDOW):
+        self.fps = fps
+        self.every = every
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.level = NEUTRAL
+        self.near = 0            # near misses this period
+        self.gap_sum = 0.0       # their summed clearance
+        self.moves = 0           # lane changes this period
+        # ring of per-period (near misses, clearance sum, lane changes, combo)
+        self.history = [0.0] * (4 * self.window)
+        self.head = 0
+        self.filled = 0
+
+    def observe(self, clearance):
+        """Clearances of the obstacles the player passed this step (from the collision sweep)."""
+        near = clearance[clearance < NEAR_MISS_RANGE]
+        if len(near):
+            self.near += len(near)
+            self.gap_sum += float(np.maximum(near, 0.0).sum())
+
+    def moved(self):
+        """A lane change the player's car accepted (not one refused at the road edge)."""
+        self.moves += 1
+
+    def decide(self, sim):
+        if self.close_period(sim.combo):
+            self.apply(sim)
+
+    def close_period(self, combo):
+        """
+        End a decision period given the current combo; True when the level
+        moved (decide() without a Simulation, for sessions.py).
+        """
+        h = self.history
+        i = 4 * self.head
+        h[i:i + 4] = (self.near, self.gap_sum, self.moves, combo)
+        self.near, self.gap_sum, self.moves = 0, 0.0, 0
+        self.head = (self.head + 1) % self.window
+        self.filled = min(self.filled + 1, self.window)
+        if self.filled < self.window:
+            return False  # not enough of the run seen yet
+
+        near = sum(h[0::4])
+        gap = sum(h[1::4]) / near if near else GAP_EDGES[-1]
+        rate = sum(h[2::4]) * self.fps / (self.every * self.window)
+        combo = sum(h[3::4]) / self.window
+        target = TABLE[bisect.bisect_right(GAP_EDGES, gap) * _STRIDE_GAP
+                       + bisect.bisect_right(LANE_RATE_EDGES, rate) * _STRIDE_RATE
+                       + bisect.bisect_right(COMBO_EDGES, combo)]
+        if target == self.level:
+            return False
+        self.level += 1 if target > self.level else -1
+        return True
+
+    def apply(self, sim):
+        density, cdf, coins = LEVELS[self.level]
+        sim.spawn_density = density
+        sim.spawner.pattern_cdf = cdf
+        sim.spawner.coin_chance = coins
+
+    # savestates
+    def state(self):
+        return [self.level, self.near, self.gap_sum, self.moves, self.head,
+                self.filled] + self.history
+
+    def set_state(self, values):
+        """values: a list from state() (savestate checks the length)."""
+        level, near, self.gap_sum, moves, head, filled = values[:6]
+        self.level, self.near, self.moves = int(level), int(near), int(moves)
+        self.head, self.filled = int(head), int(filled)
+        self.history = list(values[6:])
+
+
+def _dodge(sim, bot, lead=0.9):
+    """
+    Bench bot: when the next obstacle in its lane is less than `lead`
+    seconds away, head for the lane that stays clear longest, one lane at a
+    time and never through one with an obstacle alongside; wanders now and
+    then.
+    """
+    p = sim.player
+    if p.queue or p.t < 1.0:
+        return 0
+    lanes = sim.track.lane_x
+    back, front = p.z - p.d / 2.0, p.z + p.d / 2.0
+    clear = [float("inf")] * len(lanes)   # distance to the next obstacle, 0 = alongside
+    for o in sim.obstacles:
+        if o.z - o.d / 2.0 > front:
+            continue  # already past
+        gap = max(0.0, back - (o.z + o.d / 2.0))
+        for i, x in enumerate(lanes):
+            if abs(x - o.x) < (o.w + p.w) / 2.0 and gap < clear[i]:
+                clear[i] = gap
+    horizon = sim.speed * lead
+    if clear[p.lane] < horizon:
+        target = max(range(len(lanes)), key=lambda i: (clear[i], -abs(i - p.lane)))
+        if clear[target] <= clear[p.lane]:
+            return 0
+        d = 1 if target > p.lane else -1
+        return d if clear[p.lane + d] > 2.0 else 0
+    d = bot.choice((-1, 1))
+    if bot.random() < 0.01 and 0 <= p.lane + d < len(lanes) and clear[p.lane + d] > horizon:
+        return d
+    return 0
+
+
+def _timed(fn, spent):
+    def timed(*args):
+        t0 = time.perf_counter()
+        fn(*args)
+        spent[0] += time.perf_counter() - t0
+    return timed
+
+
+def bench(runs=10, seed=1):
+    """Mean update() cost with and without the controller over the same bot seeds."""
+    import random
+    from simulation import Simulation, SIM_DT
+    out = {}
+    spent = [0.0]
+    for adaptive in (False, True):
+        sim = Simulation(adaptive=adaptive)
+        if adaptive:
+            for name in ("observe", "decide"):
+                setattr(sim.difficulty, name, _timed(getattr(sim.difficulty, name), spent))
+        frames, elapsed, levels = 0, 0.0, [0] * len(LEVELS)
+        for n in range(runs):
+            bot = random.Random(seed + n)
+            sim.start(seed + n)
+            while sim.state == "playing" and sim.frame < 60 * 120:
+                d = _dodge(sim, bot)
+                if d:
+                    sim.move(d)
+                t0 = time.perf_counter()
+                sim.update(SIM_DT)
+                elapsed += time.perf_counter() - t0
+                sim.events.drain()
+                if adaptive:
+                    levels[sim.difficulty.level] += 1
+            frames += sim.frame
+        out[adaptive] = (elapsed / frames * 1e6, frames, levels)
+    out["controller_us"] = spent[0] / max(1, out[True][1]) * 1e6
+    return out
+
+
+def main(argv):
+    import argparse
+    ap = argparse.ArgumentParser(description="Adaptive difficulty")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="update() cost with and without the controller")
+    b.add_argument("--runs", type=int, default=10)
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        r = bench(args.runs)
+        controller = r.pop("controller_us")
+        for adaptive, (us, frames, levels) in r.items():
+            line = f"[DIFFICULTY] {'adaptive' if adaptive else 'fixed   '}: {us:.1f} us/update over {frames} frames"
+            if adaptive:
+                share = ", ".join(f"L{i} {n * 100.0 / max(1, frames):.0f}%" for i, n in enumerate(levels))
+                line += f"  (levels: {share})"
+            print(line)
+        print(f"[DIFFICULTY] controller: {controller:.2f} us/update (timed on its own)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,104 @@
+# events.py - simulation -> presentation event queue
+#
+# The simulation publishes small fixed-shape events into a preallocated ring
+# (parallel typed arrays, no per-event objects). Presentation systems
+# (audio, particles, HUD, logging, stats, persistence) subscribe and the
+# game drains the ring once per rendered frame.
+from array import array
+
+# Event types
+COIN_COLLECTED = 1     # i = combo, j = points, x/y/z = coin position
+CRASH = 2              # i = score, j = max combo, x/y/z = obstacle position
+SPEED_TIER = 3         # i = tier, x = speed
+LANE_CHANGED = 4       # i = new lane, j = direction, x = target x
+NEAR_MISS = 5          # i = points, j = clearance in mm, x/y/z = obstacle position
+
+EVENT_NAMES = {
+    COIN_COLLECTED: "CoinCollected",
+    CRASH: "Crash",
+    SPEED_TIER: "SpeedTierReached",
+    LANE_CHANGED: "LaneChanged",
+    NEAR_MISS: "NearMiss",
+}
+
+
+class EventBus:
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.kind = array("i", [0]) * capacity
+        self.frame = array("i", [0]) * capacity
+        self.i = array("i", [0]) * capacity
+        self.j = array("i", [0]) * capacity
+        self.x = array("d", [0.0]) * capacity
+        self.y = array("d", [0.0]) * capacity
+        self.z = array("d", [0.0]) * capacity
+        self.head = 0       # next write slot
+        self.count = 0      # events waiting to be drained
+        self.dropped = 0    # overwritten before anyone drained them
+        self.subscribers = {}  # kind -> [callback], 0 = every kind
+
+    def subscribe(self, callback, *kinds):
+        """callback(kind, frame, i, j, x, y, z); no kinds = all events."""
+        for k in kinds or (0,):
+            self.subscribers.setdefault(k, []).append(callback)
+
+    def publish(self, kind, frame, i=0, j=0, x=0.0, y=0.0, z=0.0):
+        if not self.subscribers:
+            return
+        h = self.head
+        self.kind[h] = kind
+        self.frame[h] = frame
+        self.i[h] = i
+        self.j[h] = j
+        self.x[h] = x
+        self.y[h] = y
+        self.z[h] = z
+        self.head = (h + 1) % self.capacity
+        if self.count == self.capacity:
+            self.dropped += 1
+        else:
+            self.count += 1
+
+    def drain(self):
+        """Deliver every pending event in publish order."""
+        subs = self.subscribers
+        every = subs.get(0, ())
+        idx = (self.head - self.count) % self.capacity
+        while self.count:
+            kind = self.kind[idx]
+            args = (kind, self.frame[idx], self.i[idx], self.j[idx], self.x[idx], self.y[idx], self.z[idx])
+            self.count -= 1
+            idx = (idx + 1) % self.capacity
+            for cb in subs.get(kind, ()):
+                cb(*args)
+            for cb in every:
+                cb(*args)
+
+    def clear(self):
+        self.count = 0
+
+
+class EventRecorder:
+    """Subscriber that keeps the full stream, e.g. to store next to a run recording."""
+    def __init__(self, bus):
+        self.events = []
+        bus.subscribe(self.record)
+
+    def record(self, kind, frame, i, j, x, y, z):
+        self.events.append((kind, frame, i, j, x, y, z))
+
+    def as_dicts(self):
+        return [
+            {"event": EVENT_NAMES.get(k, k), "frame": f, "i": i, "j": j, "x": x, "y": y, "z": z}
+            for k, f, i, j, x, y, z in self.events
+        ]
+
+
+class EventStats:
+    """Subscriber counting events per type."""
+    def __init__(self, bus):
+        self.counts = {}
+        bus.subscribe(self.record)
+
+    def record(self, kind, *_):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
@@ -0,0 +1,209 @@
+# framebuffer.py
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+from diagnostics import gl_created, gl_deleted
+
+
+def ids(*names):
+    """GL object names as a contiguous GLuint array for glDelete* calls."""
+    return np.array(names, dtype=np.uint32)
+
+
+class Framebuffer:
+    """Offscreen render target: RGBA8 color + 24-bit depth renderbuffers."""
+    def __init__(self, w, h):
+        self.w = 0
+        self.h = 0
+        self.fbo = glGenFramebuffers(1)
+        self.color_rb = glGenRenderbuffers(1)
+        self.depth_rb = glGenRenderbuffers(1)
+        gl_created("framebuffers")
+        gl_created("renderbuffers", 2)
+        self.resize(w, h)
+
+    def resize(self, w, h):
+        if (w, h) == (self.w, self.h):
+            return
+        self.w, self.h = w, h
+
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color_rb)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, w, h)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth_rb)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, w, h)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color_rb)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth_rb)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"framebuffer incomplete: 0x{status:x}")
+
+    def bind(self, w=None, h=None):
+        """Bind for drawing; w/h restrict the viewport to the lower-left region."""
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, w or self.w, h or self.h)
+
+    def blit_to(self, dst_fbo, src_w, src_h, dst_w, dst_h):
+        """Copy (and linearly scale) the lower-left src_w x src_h region into dst_fbo."""
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, dst_fbo)
+        glBlitFramebuffer(0, 0, src_w, src_h, 0, 0, dst_w, dst_h, GL_COLOR_BUFFER_BIT, GL_LINEAR)
+
+    def unbind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def delete(self):
+        # id arrays, not lists: fast mode (glconfig) refuses implicit copies
+        glDeleteFramebuffers(1, ids(self.fbo))
+        glDeleteRenderbuffers(2, ids(self.color_rb, self.depth_rb))
+        gl_deleted("framebuffers")
+        gl_deleted("renderbuffers", 2)
+
+
+class DynamicResolution:
+    """
+    Picks the 3D render scale from measured GPU frame time. Drops a step
+    when the smoothed time misses the budget, creeps back up when there is
+    clear headroom. The FBO stays allocated at full size; only the viewport
+    shrinks, so a scale change never reallocates anything.
+    """
+    def __init__(self, budget_ms, min_scale=0.5, max_scale=1.0, step=0.1):
+        self.budget_ms = budget_ms
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.step = step
+        self.scale = max_scale
+        self.avg_ms = None
+        self.cooldown = 0
+
+    def feed(self, frame_ms):
+        if frame_ms is None:
+            return self.scale
+        frame_ms = min(frame_ms, self.budget_ms * 4)  # one hitch shouldn't dominate
+        if self.avg_ms is None:
+            self.avg_ms = frame_ms
+        else:
+            self.avg_ms += (frame_ms - self.avg_ms) * 0.1
+
+        if self.cooldown > 0:
+            self.cooldown -= 1
+        elif self.avg_ms > self.budget_ms * 0.9 and self.scale > self.min_scale:
+            self.scale = max(self.min_scale, round(self.scale - self.step, 2))
+            self.cooldown = 20
+        elif self.avg_ms < self.budget_ms * 0.6 and self.scale < self.max_scale:
+            self.scale = min(self.max_scale, round(self.scale + self.step, 2))
+            self.cooldown = 60  # recover slowly so we don't oscillate
+        return self.scale
+
+
+class PixelReader:
+    """
+    Asynchronous readback through a ring of pixel buffer objects.
+    read() queues glReadPixels into the current PBO and returns the frame
+    queued `len(pbos) - 1` calls ago (None until the ring has filled), so
+    the CPU never waits on the frame the GPU is still drawing.
+    """
+    def __init__(self, w, h, count=2):
+        self.w, self.h = w, h
+        self.size = w * h * 4
+        self.pbos = [int(b) for b in glGenBuffers(count)]
+        gl_created("buffers", count)
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.index = 0
+        self.pending = 0
+
+    def read(self):
+        count = len(self.pbos)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[self.index])
+        glReadPixels(0, 0, self.w, self.h, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        self.index = (self.index + 1) % count
+        self.pending += 1
+
+        data = None
+        if self.pending >= count:
+            data = self._map(self.pbos[self.index])
+            self.pending -= 1
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return data
+
+    def drain(self):
+        """Return every frame still queued in the ring, oldest first."""
+        frames = []
+        count = len(self.pbos)
+        while self.pending > 0:
+            idx = (self.index - self.pending) % count
+            frames.append(self._map(self.pbos[idx]))
+            self.pending -= 1
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frames
+
+    def _map(self, pbo):
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        ptr = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        data = ctypes.string_at(ptr, self.size)
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        return data
+
+    def delete(self):
+        glDeleteBuffers(len(self.pbos), ids(*self.pbos))
+        gl_deleted("buffers", len(self.pbos))
+
+
+MAX_GPU_MS = 1000.0  # longer "frame times" are bogus query results (llvmpipe's first ring)
+
+
+class GpuTimer:
+    """GL_TIME_ELAPSED queries, read back a few frames late to avoid stalls."""
+    def __init__(self, count=4):
+        self.queries = [int(q) for q in glGenQueries(count)]
+        gl_created("queries", count)
+        self.index = 0
+        self.pending = 0
+        self.lag = count - 1   # frames between a query and its result
+        self.rejected = 0
+
+    def begin(self):
+        glBeginQuery(GL_TIME_ELAPSED, self.queries[self.index])
+
+    def end(self):
+        """Close the current query; returns a finished timing in ms (None while
+        the ring fills, or when the result was implausible)."""
+        glEndQuery(GL_TIME_ELAPSED)
+        count = len(self.queries)
+        self.index = (self.index + 1) % count
+        self.pending += 1
+        if self.pending < count:
+            return None
+        self.pending -= 1
+        return self._result(self.queries[self.index])
+
+    def drain(self):
+        results = []
+        count = len(self.queries)
+        while self.pending > 0:
+            idx = (self.index - self.pending) % count
+            results.append(self._result(self.queries[idx]))
+            self.pending -= 1
+        return results
+
+    def delete(self):
+        glDeleteQueries(len(self.queries), ids(*self.queries))
+        gl_deleted("queries", len(self.queries))
+
+    def _result(self, query):
+        ns = ctypes.c_uint64(0)
+        glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(ns))
+        ms = ns.value / 1e6
+        if ms > MAX_GPU_MS:
+            self.rejected += 1
+            return None
+        return ms
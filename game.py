@@ -1,71 +1,95 @@
 # game.py - COMPLETE FIXED VERSION
+import glconfig  # before OpenGL.GL: PyOpenGL fast-mode flags
 import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
+import os
 import time
 import random
+import threading
 
-from utils import load_high_score, save_high_score, aabb
-from player import Player
-from spawner import Spawner
+from utils import load_high_score, save_high_score
 from ui import Overlay
-from utils import load_texture
-from spawner import Spawner, Building
-
-
-# Config
+from sky import Sky
+from spawner import Building, Coin, Obstacle
+from player import CAR_SKINS, DEFAULT_SKIN, COL_PLAYER_HIT, COL_PLAYER_COLLECT, Player, draw_cube, init_gl
+from framebuffer import Framebuffer, GpuTimer, DynamicResolution
+from audio import SoundSpec, create_audio
+from events import EventStats, COIN_COLLECTED, CRASH, SPEED_TIER, LANE_CHANGED, NEAR_MISS
+from controls import InputQueue, LatencyTracker
+from diagnostics import Diagnostics
+from glstate import gl, STATE_OPAQUE, STATE_BLENDED, STATE_GHOST
+from operator import itemgetter
+from snapshot import WorldSnapshot, SnapshotBuffer
+from telemetry import RunTelemetry
+import log
+from simulation import Simulation, SIM_DT
+from track import Track
+from replay import save_run, LAST_RUN_FILE, BEST_RUN_FILE
+from savestate import StateRing, RESUME_FILE, load_state, write_state
+from ghost import GhostRecorder, GHOST_FILE, load_ghosts
+
+
+# Config (gameplay tuning lives in simulation.py)
 WIN_W, WIN_H = 900, 900
 FPS = 60
-LANE_COUNT = 3
-LANE_SPACING = 3.0
-LANE_X = [-(LANE_SPACING) + i * LANE_SPACING for i in range(LANE_COUNT)]
+MAX_STEPS_PER_FRAME = 5  # fixed-step catch-up limit after a long hitch
 CAMERA_POS = (0.0, 3.2, 12.0)
 CAMERA_LOOK_AT = (0.0, -0.2, 0.0)
-PLAYER_Z = 2.0
-OBSTACLE_START_Z = -80.0
-OBSTACLE_SPEED = 20.0
-SPAWN_INTERVAL = 0.8
-COIN_SPAWN_CHANCE = 0.28
-road_half_width = (LANE_SPACING * (LANE_COUNT - 1)) / 2.0
-side_offset = road_half_width + 12
-BLOCK_LENGTH = 15.0
+FOV_Y, Z_NEAR, Z_FAR = 50.0, 0.1, 300.0
 BUILDING_SPAWN_BLOCKS = 25  # Increased from 10 to cover more distance
-BUILDING_SPAWN_AHEAD = BLOCK_LENGTH * BUILDING_SPAWN_BLOCKS  # = 30.0
-
-
-BASE_FORWARD_SPEED = OBSTACLE_SPEED
-BASE_MOVE_DURATION = 0.06
-MIN_MOVE_DURATION = 0.02
-MAX_MOVE_DURATION = 0.18
-
-def draw_ground(scroll=0.0):
-    glDisable(GL_CULL_FACE)
+PREFILL_BLOCKS = 40         # building rows in place when a run starts
+BUILDING_POOL_MAX = 4 * PREFILL_BLOCKS
+# Keys that act on the window rather than the game; always handled on the GL thread
+WINDOW_KEYS = (K_ESCAPE, K_f, K_F9)
+# Practice mode: a savestate every CHECKPOINT_FRAMES, BACKSPACE after a crash
+# rewinds to the newest one at least REWIND_FRAMES before it
+CHECKPOINT_FRAMES = 30
+REWIND_FRAMES = 120
+
+# Sound effects: path, volume (0.0 to 1.0), channel group, max simultaneous voices, cooldown (s)
+SFX = {
+    "coin": SoundSpec("assets/coin.wav", 0.6, "pickup", max_voices=3, cooldown=0.04),
+    "horn": SoundSpec("assets/horn.mp3", 0.7, "horn", max_voices=1, cooldown=0.3),
+    "crash": SoundSpec("assets/losing.wav", 0.8, "events", max_voices=1),
+}
+SFX_CHANNEL_GROUPS = {"pickup": 3, "horn": 1, "events": 1}
+
+# Long-session budgets: a count above these (checked once a minute) is logged
+DIAG_BUDGETS = {
+    "obstacles": 60, "coins": 30, "buildings": 140, "particles": 400,
+    "textures": 2, "quadrics": 1, "framebuffers": 2, "buffers": 4, "queries": 8,
+    "overlay_surfaces": 64, "heap_mb": 256, "gc_ms": 500,
+}
+
+
+def draw_ground(track, scroll=0.0):
+    gl.disable(GL_CULL_FACE)
 
     # =========================
     # Road surface
     # =========================
-    glColor3f(0.22, 0.22, 0.25)
+    hw = track.road_width / 2.0
+    gl.color((0.22, 0.22, 0.25))
     glBegin(GL_QUADS)
-    glVertex3f(-40.0, -2.4, -300.0)
-    glVertex3f( 40.0, -2.4, -300.0)
-    glVertex3f( 40.0, -2.4,  80.0)
-    glVertex3f(-40.0, -2.4,  80.0)
+    glVertex3f(-hw, -2.4, -300.0)
+    glVertex3f( hw, -2.4, -300.0)
+    glVertex3f( hw, -2.4,  80.0)
+    glVertex3f(-hw, -2.4,  80.0)
     glEnd()
 
     # =========================
     # Moving dashed lane lines
     # =========================
-    glColor3f(0.95, 0.95, 0.2)
+    gl.color((0.95, 0.95, 0.2))
     dash_len = 3.0
     gap_len = 2.0
     cycle = dash_len + gap_len
     width = 0.08
     y = -2.38
 
-    for i in range(LANE_COUNT - 1):
-        x = -LANE_SPACING / 2 + i * LANE_SPACING
-
+    for x in track.dash_x:
         z = -300.0 + (scroll % cycle)
         while z < 80.0:
             glBegin(GL_QUADS)
@@ -77,28 +101,49 @@ def draw_ground(scroll=0.0):
 
             z += cycle
 
-    glEnable(GL_CULL_FACE)
+    gl.enable(GL_CULL_FACE)
 
 
 
-class Game:
-    def __init__(self):
+class Game(Simulation):
+    def __init__(self, size=(WIN_W, WIN_H), hidden=False, persist=True, dynamic_res=True, seed=None,
+                 audio=True, track=None, threaded=None):
+        """threaded: step the sim on its own thread (default: LANE3D_THREADED=1)."""
         pygame.init()
-        flags = DOUBLEBUF | OPENGL
-        self.screen = pygame.display.set_mode((WIN_W, WIN_H), flags)
+        self.width, self.height = size
+        self.persist = persist  # False for captures/tools: never touch the highscore file
+        flags = DOUBLEBUF | OPENGL | RESIZABLE
+        if hidden:
+            flags |= HIDDEN
+        self.screen = pygame.display.set_mode(size, flags)
         pygame.display.set_caption("Lane3D Runner - Modular")
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_CULL_FACE)  # Re-enable this for proper rendering
+        glconfig.log_startup()
+        init_gl()
+        gl.invalidate()  # fresh context
+        gl.enable(GL_DEPTH_TEST)
+        gl.enable(GL_CULL_FACE)  # Re-enable this for proper rendering
         glClearColor(0.05, 0.05, 0.06, 1.0)
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        gluPerspective(50.0, WIN_W / WIN_H, 0.1, 300.0)
-        glMatrixMode(GL_MODELVIEW)
-        try:
-            self.sky_tex = load_texture("assets/sky.jpg")
-        except:
-            self.sky_tex = 0
-            print("[WARNING] sky.jpg not found")
+
+        # --- DYNAMIC RESOLUTION ---
+        # The 3D pass renders into an FBO at `dynres.scale` of the window and
+        # is upscaled on blit; the HUD is always drawn at native resolution.
+        # output_fbo is where the final image goes (0 = window, capture.py
+        # points it at its own FBO).
+        self.output_fbo = 0
+        self.scene_target = None
+        self.scene_timer = None
+        self.dynres = None
+        if dynamic_res:
+            try:
+                self.scene_target = Framebuffer(self.width, self.height)
+                self.scene_timer = GpuTimer()
+                self.dynres = DynamicResolution(1000.0 / FPS)
+            except Exception as e:
+                self.scene_target = None
+                log.warning("dynamic resolution unavailable: %s", e)
+        self.sky = Sky("assets/sky.jpg")
+        if self.sky.fallback:
+            log.warning("sky.jpg not found, using gradient sky")
 
         # --- BACKGROUND MUSIC ---
         # try:
@@ -108,108 +153,342 @@ class Game:
         # except:
         #     print("[WARNING] music.mp3 not found")
 
-        # --- SOUND EFFECTS SETUP (NEW) ---
-        self.coin_fx = None
-        self.crash_fx = None
-        try:
-            self.coin_fx = pygame.mixer.Sound("assets/coin.wav")
-            self.coin_fx.set_volume(0.6) # Adjust volume (0.0 to 1.0)
-
-            self.horn_fx = pygame.mixer.Sound("assets/horn.mp3")
-            self.horn_fx.set_volume(0.7)  # Adjust volume (0.0 to 1.0)
-            
-            self.crash_fx = pygame.mixer.Sound("assets/losing.wav")
-            self.crash_fx.set_volume(0.8)
-            print("[DEBUG] SFX loaded successfully")
-        except:
-            print("[WARNING] SFX files (coin.wav or gameover.wav) not found")
+        # --- SOUND EFFECTS SETUP ---
+        # Decoded on a background thread; playback is queued and flushed once per frame
+        self.audio = create_audio(SFX, SFX_CHANNEL_GROUPS, enabled=audio)
         # ---------------------------------
 
-        self.clock = pygame.time.Clock()
-        self.player = Player(LANE_X, start_lane=1, y=-1.0, z=PLAYER_Z)
-        self.next_building_spawn_z = self.player.z - BUILDING_SPAWN_AHEAD
-
-        print("[DEBUG] Player start lane:", self.player.lane)
-        print("[DEBUG] Player start x:", self.player.x)
+        # Adaptive difficulty unless LANE3D_DIFFICULTY=fixed
+        adaptive = os.environ.get("LANE3D_DIFFICULTY", "adaptive") != "fixed"
+        super().__init__(seed, track or Track.load(), adaptive=adaptive)
+        self.building_spawn_ahead = self.track.block_length * BUILDING_SPAWN_BLOCKS
+        ev = self.events
+        ev.subscribe(self.audio_events, COIN_COLLECTED, CRASH)
+        ev.subscribe(self.particle_events, COIN_COLLECTED)
+        ev.subscribe(self.hud_events, COIN_COLLECTED, CRASH, SPEED_TIER, NEAR_MISS)
+        ev.subscribe(self.log_events, COIN_COLLECTED, CRASH)
+        ev.subscribe(self.persist_events, CRASH)
+        ev.subscribe(self.restart_events, CRASH)
+        self.event_stats = EventStats(ev)
+        # Session telemetry (JSONL, written off-thread) when LANE3D_TELEMETRY=path is set
+        telemetry_path = os.environ.get("LANE3D_TELEMETRY")
+        self.telemetry = RunTelemetry(telemetry_path, self) if telemetry_path else None
+        # Timestamped input, applied per sub-step; latency measured to the flip
+        self.input = InputQueue(window_keys=WINDOW_KEYS)
+        self.latency = LatencyTracker()
+        ev.subscribe(self.latency.lane_changed, LANE_CHANGED)
+        self.car_skin = DEFAULT_SKIN
+        self.player.model.skin = self.car_skin
+        self.diagnostics = Diagnostics(DIAG_BUDGETS)
+        self.diagnostics.add_source(self.entity_counts)
+        self.diagnostics.add_source(gl.take_counts)
+        # Threaded mode: the sim thread publishes snapshots, the GL thread draws them
+        if threaded is None:
+            threaded = os.environ.get("LANE3D_THREADED") == "1"
+        self.threaded = threaded
+        self.snapshots = None
+        if threaded:
+            self.snapshots = SnapshotBuffer(lambda: WorldSnapshot(Particle))
+            self.diagnostics.add_source(self.snapshots.take_stats)
+        self.draw_list = []
+        self.banner = None
+        # Practice runs (LANE3D_PRACTICE=1 or P in the menu) can rewind but never set a highscore
+        self.practice = os.environ.get("LANE3D_PRACTICE") == "1"
+        self.checkpoints = StateRing(every=CHECKPOINT_FRAMES, size=20)
+        self.resume_available = persist and os.path.exists(RESUME_FILE)
+        # Ghost cars: the best run by default, or LANE3D_GHOSTS=a.bin,b.bin
+        self.ghost_paths = os.environ.get("LANE3D_GHOSTS", GHOST_FILE).split(",")
+        self.ghosts_on = True
+        self.ghosts = []
+        self.ghost_recorder = None
+        # LAN races (net.py): a NetHost or NetClient once attach_net() is called
+        self.net = None
+        self.standings = ()
+        self.net_status = None
+        self.next_building_spawn_z = self.player.z - self.building_spawn_ahead
+
+        log.debug("Player start lane: %s", self.player.lane)
+        log.debug("Player start x: %s", self.player.x)
 
         self.buildings = []
-        self.obstacles = []
-        self.coins = []
         self.particles = []
-        self.spawner = Spawner(LANE_X, OBSTACLE_START_Z, coin_chance=COIN_SPAWN_CHANCE)
-        self.spawn_timer = 0.0
-        self.spawn_interval = SPAWN_INTERVAL
-        self.speed = OBSTACLE_SPEED
-        self.score = 0
-        self.combo = 0
-        self.combo_timer = 0.0
-        self.combo_timeout = 3.0
-        self.max_combo = 0
+        # Instant restart: culled / replaced buildings are pooled for reuse, and
+        # the next run's roadside is generated in the background while the
+        # menu or game-over screen is up, so reset() only swaps lists
+        self.building_pool = []
+        self.next_roadside = None     # (seed, roadside) built for the next run
+        self.next_seed = None         # seed reset() uses when none is given
+        # Scenery and particles draw from this, never the global random module,
+        # so a seeded run (capture.py) looks the same every time
+        self.scenery_rng = random.Random()
+        self.roadside_thread = None
+        self.restart_t = None       # key time of the restart waiting for its first frame
+        self.reset_ms = 0.0
+        self.restart_ms = []
+        self.prepare_roadside()
         self.highscore = load_high_score()
-        print("[DEBUG] loaded highscore:", self.highscore)
-        self.state = "menu"
+        log.debug("loaded highscore: %s", self.highscore)
         self.running = True
-        self.road_scroll = 0.0
-
-
-        self.overlay = Overlay(WIN_W, WIN_H)
-        self.font = pygame.font.SysFont("Arial", 26)
-        self.large_font = pygame.font.SysFont("Arial", 44)
-
-    def spawn(self):
-        self.spawner.spawn_pattern(self.obstacles, self.coins)
-
-    def reset(self):
-        self.player = Player(LANE_X, start_lane=1, y=-1.0, z=PLAYER_Z)
-        self.obstacles = []
-        self.coins = []
-        self.buildings = []
-        
-        # Start spawn cursor slightly ahead of camera
-        self.next_building_spawn_z = CAMERA_POS[2] + 5.0
-
-        # Pre-fill world
-        # CHANGED: range(100) -> range(40). 
-        # Since BLOCK_LENGTH is now 15.0, 40 blocks covers 600 units of distance.
-        for _ in range(40):
-            self.spawn_buildings(self.next_building_spawn_z)
-            self.next_building_spawn_z -= BLOCK_LENGTH
-
-        self.particles = []
-        self.spawn_timer = 0.0
-        self.spawn_interval = SPAWN_INTERVAL
-        self.speed = OBSTACLE_SPEED
-        self.score = 0
-        self.combo = 0
-        self.combo_timer = 0.0
-        self.max_combo = 0
-        self.state = "playing"
+        self.accumulator = 0.0
+
+
+        self.overlay = Overlay(self.width, self.height)
+        self.resize(self.width, self.height)
+
+    def reset(self, seed=None):
+        t0 = time.perf_counter()
+        # A crash and R can land in the same rendered frame: let the
+        # subscribers (persistence, ghost, telemetry) see the ended run first
+        self.events.drain()
+        if seed is None:
+            seed, self.next_seed = self.next_seed, None
+        self.start(seed)
+        self.player.model.skin = self.car_skin
+        self.latency.reset()
+        self.checkpoints.clear()
+        self.start_ghosts()
+        if self.telemetry:
+            self.telemetry.begin_run()
+
+        # Swap in the pre-built roadside; the old one goes back to the pool
+        old = self.buildings
+        self.buildings, self.next_building_spawn_z, self.scenery_rng = self.take_roadside(self.seed)
+        self.recycle(old)
+        self.particles.clear()
+        self.reset_ms = (time.perf_counter() - t0) * 1000.0
+        if self.practice:
+            self.checkpoints.record(self)  # frame 0, so an early crash can still rewind
+        if self.net and self.net.is_host:
+            self.net.start_race(self.seed)
+
+    def attach_net(self, net):
+        """Race over the LAN: net is a net.NetHost or net.NetClient."""
+        self.net = net
+        self.net_status = net.status()
+        self.diagnostics.add_source(net.take_stats)
+
+    def build_roadside(self, rng):
+        """
+        Buildings for the start of a run, the spawn cursor after them, and
+        `rng`, which goes on dressing that run.
+        """
+        buildings = []
+        # Start spawn cursor slightly ahead of camera.
+        # With 15.0 long blocks, 40 blocks covers 600 units of distance.
+        z = CAMERA_POS[2] + 5.0
+        for _ in range(PREFILL_BLOCKS):
+            self.spawn_buildings(z, buildings, rng)
+            z -= self.track.block_length
+        return buildings, z, rng
+
+    def _build_next_roadside(self, seed):
+        self.next_roadside = (seed, self.build_roadside(random.Random(seed)))
+
+    def prepare_roadside(self):
+        """
+        Pick the next run's seed and build its roadside on a background
+        thread (seeded from it, so the scenery is the same for that seed).
+        """
+        if self.roadside_thread is None and self.next_roadside is None:
+            self.next_seed = random.randrange(2 ** 31)
+            self.roadside_thread = threading.Thread(target=self._build_next_roadside,
+                                                    args=(self.next_seed,), name="roadside", daemon=True)
+            self.roadside_thread.start()
+
+    def take_roadside(self, seed):
+        """The roadside for a run on `seed`: the pre-built one, or built now for another seed."""
+        if self.roadside_thread is not None:
+            self.roadside_thread.join()  # normally long finished
+            self.roadside_thread = None
+        ready, self.next_roadside = self.next_roadside, None
+        if ready is not None:
+            if ready[0] == seed:
+                return ready[1]
+            self.recycle(ready[1][0])
+        return self.build_roadside(random.Random(seed))
+
+    def recycle(self, buildings):
+        room = BUILDING_POOL_MAX - len(self.building_pool)
+        if room > 0:
+            self.building_pool.extend(buildings[:room])
+
+    def start_ghosts(self):
+        """(Re)open the ghost files and start recording this run as a ghost."""
+        for g in self.ghosts:
+            g.close()
+        self.ghosts = load_ghosts(self.ghost_paths, self.track) if self.ghosts_on else []
+        self.ghost_recorder = GhostRecorder(self.track.lanes, self.track.start_lane, self.car_skin)
 
     def toggle_fullscreen(self):
         pygame.display.toggle_fullscreen()
+        self.resize(*pygame.display.get_window_size())
 
-    def handle_key(self, key):
-        if key == K_f:
+    def resize(self, w, h):
+        """Rebuild everything that depends on the window size; game state is untouched."""
+        self.width, self.height = max(1, w), max(1, h)
+        glViewport(0, 0, self.width, self.height)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        gluPerspective(FOV_Y, self.width / self.height, Z_NEAR, Z_FAR)
+        glMatrixMode(GL_MODELVIEW)
+        self.sky.build(FOV_Y, self.width / self.height, Z_FAR)
+        if self.scene_target:
+            self.scene_target.resize(self.width, self.height)
+        self.overlay.resize(self.width, self.height)
+        self.font = self.overlay.font
+        self.large_font = self.overlay.large_font
+
+    def handle_window_key(self, key):
+        """WINDOW_KEYS; must run on the thread that owns the GL context."""
+        if key == K_ESCAPE:
+            self.running = False
+        elif key == K_f:
             self.toggle_fullscreen()
+        elif key == K_F9:
+            self.diagnostics.snapshot()
+
+    def handle_key(self, key, t=None):
+        """t: perf_counter time of the key press, when known (for latency stats)."""
+        if key in WINDOW_KEYS:
+            self.handle_window_key(key)
             return
+        if self.net and not self.net.is_host and self.state != "playing":
+            return  # the host starts and restarts races
         if self.state == "menu":
             if key == K_SPACE:
+                self.restart_t = t if t is not None else self.input.clock()
                 self.reset()
+            elif key == K_p:
+                self.practice = not self.practice
+            elif key == K_l and self.resume_available:
+                self.resume()
+            elif key == K_g:
+                self.ghosts_on = not self.ghosts_on
+            elif key == K_c:
+                # cycle car skins
+                names = list(CAR_SKINS)
+                self.car_skin = names[(names.index(self.car_skin) + 1) % len(names)]
+                self.player.model.skin = self.car_skin
         elif self.state == "playing":
             if key == K_SPACE:
-                if self.horn_fx:
-                    self.horn_fx.play()
+                self.audio.play("horn")
+            moved = False
             if key == K_LEFT:
-                _ = self.player.request_move(-1, self.obstacles)
+                moved = self.move(-1)
             elif key == K_RIGHT:
-                _ = self.player.request_move(1, self.obstacles)
+                moved = self.move(1)
+            if moved and t is not None:
+                self.latency.accepted(t)
+            if moved and self.net:
+                self.net.local_input(self.frame, self.inputs[-1][1])
         elif self.state == "gameover":
-            if key == K_r:
-                self.highscore = max(self.highscore, self.score)
-                save_high_score(self.highscore)
+            if key == K_BACKSPACE and self.practice:
+                self.rewind()
+            elif key == K_r:
+                # highscore / best run / ghost were saved by persist_events
+                self.restart_t = t if t is not None else self.input.clock()
                 self.reset()
-                   
+
+    def restore(self, data):
+        """Continue from a savestate (rewind / resume)."""
+        self.events.drain()  # see reset()
+        load_state(self, data)
+        self.player.model.skin = self.car_skin
+        self.particles = []
+        self.banner = None
+        self.latency.reset()
+        self.ghost_recorder.valid = False  # only whole runs become ghosts
+        for g in self.ghosts:
+            g.seek(self.frame, SIM_DT)
+
+    def rewind(self):
+        saved = self.checkpoints.before(self.frame - REWIND_FRAMES)
+        if saved is None:
+            self.reset(self.seed)
+            return
+        frame, data = saved
+        self.checkpoints.discard_after(frame)
+        self.restore(data)
+
+    def resume(self):
+        """Pick up the run that was in progress when the game last quit."""
+        self.resume_available = False
+        try:
+            with open(RESUME_FILE, "rb") as f:
+                data = f.read()
+            os.remove(RESUME_FILE)
+            self.start_ghosts()
+            self.restore(data)
+        except (OSError, ValueError) as e:
+            log.warning("could not resume: %s", e)
+            return
+        self.checkpoints.clear()
+        if self.telemetry:
+            self.telemetry.begin_run()
+
+    # --- event subscribers (drained once per rendered frame, or per step when threaded,
+    #     and before reset() / restore() replace the run) ---
+    def audio_events(self, kind, frame, i, j, x, y, z):
+        if kind == COIN_COLLECTED:
+            # 🔊 PLAY COIN SOUND
+            self.audio.play("coin")
+        elif kind == CRASH:
+            # PLAY CRASH SOUND
+            self.audio.play("crash")
+            self.audio.pause_music()
+
+    def particle_events(self, kind, frame, combo, points, x, y, z):
+        base_particles = 8
+        bonus_particles = min(combo * 2, 20)
+        rng = self.scenery_rng
+        num_particles = rng.randint(base_particles, base_particles + bonus_particles)
+        for _ in range(num_particles):
+            self.particles.append(Particle(x, y, z, rng))
+
+    def hud_events(self, kind, frame, i, j, x, y, z):
+        if kind == COIN_COLLECTED:
+            self.player.color = COL_PLAYER_COLLECT
+            self.player.flash = 0.25
+        elif kind == CRASH:
+            self.player.color = COL_PLAYER_HIT
+        elif kind == SPEED_TIER:
+            self.banner = (f"SPEED UP  {x:.0f}", pygame.time.get_ticks() + 1200)
+        elif kind == NEAR_MISS:
+            self.banner = (f"NEAR MISS  +{i}", pygame.time.get_ticks() + 700)
+
+    def log_events(self, kind, frame, i, j, x, y, z):
+        if kind == COIN_COLLECTED:
+            log.debug("COMBO x%d +%d points!", i, j)
+        elif kind == CRASH:
+            log.info("GAME OVER score %d, max combo %dx", i, j)
+
+    def restart_events(self, kind, frame, i, j, x, y, z):
+        self.prepare_roadside()  # ready by the time R is pressed
+
+    def persist_events(self, kind, frame, score, max_combo, x, y, z):
+        if self.practice:
+            return
+        new_best = score > self.highscore
+        self.highscore = max(self.highscore, score)
+        if self.persist:
+            save_high_score(self.highscore)
+            save_run(self, LAST_RUN_FILE)
+            if new_best:
+                save_run(self, BEST_RUN_FILE)
+                if self.ghost_recorder and self.ghost_recorder.valid:
+                    self.ghost_recorder.save(GHOST_FILE, frame)
+
     def update(self, dt):
+        if self.net is None:
+            self.step_world(dt)
+            return
+        self.net.tick(self)
+        self.step_world(dt)
+        self.net.after_step(self)
+        self.standings = self.net.standings(self.net.player_id)
+        self.net_status = self.net.status()
+
+    def step_world(self, dt):
         # Update particles
         PARALLAX = 0.35
         for p in self.particles:
@@ -219,217 +498,132 @@ class Game:
         if self.state != "playing":
             return
 
-        self.speed += dt * 0.9
-        scaled = BASE_MOVE_DURATION * (BASE_FORWARD_SPEED / max(1e-6, self.speed))
-        self.player.move_duration = max(MIN_MOVE_DURATION, min(MAX_MOVE_DURATION, scaled))
-
+        super().update(dt)
+        if self.telemetry:
+            self.telemetry.sample()
+        self.ghost_recorder.step(self)
+        for g in self.ghosts:
+            if g.visible:
+                g.step(dt)
         dz = self.speed * dt
-
-        # Accelerate
-        self.road_scroll += self.speed * dt
-
-        # Combo timer
-        if self.combo > 0:
-            self.combo_timer -= dt
-            if self.combo_timer <= 0:
-                self.combo = 0
-                self.combo_timer = 0.0
-
-        for o in self.obstacles:
-            o.update(dz)
-        for c in self.coins:
-            c.update(dz)
-            
-        # Remove passed objects
-        self.obstacles = [o for o in self.obstacles if o.z < CAMERA_POS[2] + 8.0]
-        self.coins = [c for c in self.coins if c.z < CAMERA_POS[2] + 8.0]
-        self.buildings = [b for b in self.buildings if b.z < CAMERA_POS[2] + 20.0]
-
-        # Update player
-        self.player.update(dt, self.obstacles)
-
-        # Swept AABB
-        px = self.player.x
-        prev_px = getattr(self.player, "prev_x", px)
-        hx = self.player.w / 2.0
-        hy = self.player.h / 2.0
-        hz = self.player.d / 2.0
-
-        swept_min_x = min(prev_px, px) - hx
-        swept_max_x = max(prev_px, px) + hx
-        pmin_swept = (swept_min_x, self.player.y - hy, self.player.z - hz)
-        pmax_swept = (swept_max_x, self.player.y + hy, self.player.z + hz)
-
-        # Coin collection
-        for c in list(self.coins):
-            cmin, cmax = c.rect()
-            if aabb(pmin_swept, pmax_swept, cmin, cmax):
-                try:
-                    self.coins.remove(c)
-                except ValueError:
-                    pass
-                
-                # 🔊 PLAY COIN SOUND
-                if self.coin_fx:
-                    self.coin_fx.play()
-                self.combo += 1
-                self.combo_timer = self.combo_timeout
-                self.max_combo = max(self.max_combo, self.combo)
-                
-                points = 10 * self.combo
-                self.score += points
-                
-                self.player.color = (0.48, 1.0, 0.6)
-                self.player.flash = 0.25
-                
-                base_particles = 8
-                bonus_particles = min(self.combo * 2, 20)
-                num_particles = random.randint(base_particles, base_particles + bonus_particles)
-                for _ in range(num_particles):
-                    self.particles.append(Particle(c.x, c.y, c.z))
-                
-                print(f"[COMBO x{self.combo}] +{points} points!")
-
-                if self.score == 100: self.speed += 2.0
-                elif self.score == 150: self.speed += 3.0
-                elif self.score > 150 and self.score % 50 == 0: self.speed += 1.5
-
-        # --- OBSTACLE LOGIC ---
-        for o in list(self.obstacles):
-            omin, omax = o.rect()
-            if aabb(pmin_swept, pmax_swept, omin, omax):
-                self.player.color = (1.0, 0.26, 0.26)
-                
-                # PLAY CRASH SOUND
-                if self.crash_fx: self.crash_fx.play()
-                pygame.mixer.music.pause()
-
-                self.state = "gameover"
-                self.highscore = max(self.highscore, self.score)
-                save_high_score(self.highscore)
-                print(f"[GAME OVER] Max combo: {self.max_combo}x")
-                break
-        
-        self.spawn_timer += dt
-        if self.spawn_timer >= self.spawn_interval:
-            self.spawn_timer = 0.0
-            self.spawn()
-            self.spawn_interval = max(0.4, self.spawn_interval * 0.995)
         
         # --- BUILDING SPAWN LOGIC (FIXED) ---
-        for b in self.buildings: b.update(dz * PARALLAX)
-        self.buildings = [b for b in self.buildings if b.z < CAMERA_POS[2] + 20.0]
+        keep, pool = [], self.building_pool
+        limit = CAMERA_POS[2] + 20.0
+        for b in self.buildings:
+            b.update(dz * PARALLAX)
+            if b.z < limit:
+                keep.append(b)
+            elif len(pool) < BUILDING_POOL_MAX:
+                pool.append(b)
+        self.buildings = keep
         
         # [FIX] Move the spawn cursor forward just like the buildings!
         self.next_building_spawn_z += dz * PARALLAX 
         
-        spawn_horizon = self.player.z - BUILDING_SPAWN_AHEAD
+        spawn_horizon = self.player.z - self.building_spawn_ahead
         while self.next_building_spawn_z >= spawn_horizon:
             self.spawn_buildings(self.next_building_spawn_z) 
-            self.next_building_spawn_z -= BLOCK_LENGTH
+            self.next_building_spawn_z -= self.track.block_length
+
+        if self.practice and self.state == "playing":
+            self.checkpoints.record(self)
 
-    def look_at_camera(self):
+    def look_at_camera(self, px):
         glLoadIdentity()
-        px = self.player.x
         gluLookAt(
             px, CAMERA_POS[1], CAMERA_POS[2],
             px, CAMERA_LOOK_AT[1], CAMERA_LOOK_AT[2],
             0.0, 1.0, 0.0
         )
         
-    def draw_sky(self):
-        glDisable(GL_DEPTH_TEST)
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        gluOrtho2D(-1, 1, -1, 1)
-
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
-        glLoadIdentity()
-
-        glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, self.sky_tex)
-        glColor3f(1.0, 1.0, 1.0)
-
-        glBegin(GL_QUADS)
-        glTexCoord2f(0, 0); glVertex2f(-1, -0.6)
-        glTexCoord2f(1, 0); glVertex2f( 1, -0.6)
-        glTexCoord2f(1, 1); glVertex2f( 1,  1)
-        glTexCoord2f(0, 1); glVertex2f(-1,  1)
-        glEnd()
-
-        glBindTexture(GL_TEXTURE_2D, 0)
-        glDisable(GL_TEXTURE_2D)
-
-        glPopMatrix()
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
-
-        glEnable(GL_DEPTH_TEST)
-
-    def draw_scene(self):
-        draw_ground(self.road_scroll)
-
-        for b in self.buildings:
-            b.draw()
-        for c in self.coins: 
-            c.draw()
-        for o in self.obstacles: 
-            o.draw()
-        self.player.draw()
-        
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        for p in self.particles:
-            p.draw()
-        glDisable(GL_BLEND)
-
-    def build_overlay(self):
-        surf = self.overlay.surface
-
-        if self.state == "playing":
+    def draw_groups(self):
+        """(render state, drawables) per entity kind; WorldSnapshot has the same."""
+        return [
+            (Building.state_key, self.buildings),
+            (Coin.state_key, self.coins),
+            (Obstacle.state_key, self.obstacles),
+            (Player.state_key, (self.player,)),
+            (STATE_BLENDED, self.particles),
+            (STATE_GHOST, [g.model for g in self.ghosts if g.visible]),
+            (Player.state_key, self.net.models if self.net else ()),
+        ]
+
+    def draw_scene(self, view):
+        """view: the game itself, or a WorldSnapshot in threaded mode."""
+        draw_ground(self.track, view.road_scroll)
+
+        # Draw grouped by render state so each state is set once per group
+        # instead of toggled per object (sort is stable, so groups sharing a
+        # state keep their order)
+        groups = self.draw_list
+        groups.clear()
+        groups.extend(view.draw_groups())
+        groups.sort(key=itemgetter(0))
+
+        current = None
+        for key, group in groups:
+            if key != current:
+                gl.apply(key)
+                current = key
+            for e in group:
+                e.draw()
+        groups.clear()  # don't keep culled entities alive until next frame
+        gl.apply(STATE_OPAQUE)
+
+    def build_overlay(self, view):
+        ov = self.overlay
+        surf = ov.surface
+        W = surf.get_width()
+        px = ov.px
+
+        if view.state == "playing":
             surf.fill((0, 0, 0, 0))
-            bar_h = 44
-            pygame.draw.rect(surf, (12, 12, 14, 220), (0, 0, WIN_W, bar_h))
+            bar_h = px(44)
+            pygame.draw.rect(surf, (12, 12, 14, 220), (0, 0, W, bar_h))
             
-            score_surf = self.font.render(f"Score: {self.score}", True, (255,255,220))
-            surf.blit(score_surf, (12, 8))
-            W = surf.get_width()
-            hs_surf = self.font.render(f"High: {self.highscore}", True, (255,255,220))
-            surf.blit(hs_surf, (W - hs_surf.get_width() - 12, 8))
+            score_surf = self.font.render(f"Score: {view.score}", True, (255,255,220))
+            ov.place(score_surf, 0.0, 0.0, 12, 8)
+            hs_surf = self.font.render(f"High: {view.highscore}", True, (255,255,220))
+            ov.place(hs_surf, 1.0, 0.0, -12, 8)
+
+            for i, line in enumerate(view.standings):
+                row = self.font.render(line, True, (200, 220, 255))
+                ov.place(row, 1.0, 0.0, -12, 52 + 26 * i)
+
+            if view.banner and pygame.time.get_ticks() < view.banner[1]:
+                banner_surf = self.font.render(view.banner[0], True, (120, 220, 255))
+                ov.place(banner_surf, 0.5, 1.0, 0, -80)
             
-            if self.combo > 1:
-                if self.combo < 5:
+            if view.combo > 1:
+                if view.combo < 5:
                     combo_color = (255, 255, 100)
-                elif self.combo < 10:
+                elif view.combo < 10:
                     combo_color = (255, 180, 50)
                 else:
                     combo_color = (255, 80, 80)
                 
-                combo_text = f"COMBO x{self.combo}"
+                combo_text = f"COMBO x{view.combo}"
                 combo_surf = self.large_font.render(combo_text, True, combo_color)
-                combo_x = WIN_W // 2 - combo_surf.get_width() // 2
-                combo_y = 50
+                combo_dy = 50
                 
-                if self.combo >= 5:
+                if view.combo >= 5:
                     import math
                     pulse = abs(math.sin(pygame.time.get_ticks() * 0.01)) * 10
-                    combo_y = int(50 + pulse)
+                    combo_dy = 50 + pulse
                 
-                surf.blit(combo_surf, (combo_x, combo_y))
+                combo_x, combo_y = ov.place(combo_surf, 0.5, 0.0, 0, combo_dy)
                 
-                if self.combo_timer > 0:
-                    bar_width = 200
-                    bar_height = 8
-                    bar_x = WIN_W // 2 - bar_width // 2
-                    bar_y = combo_y + combo_surf.get_height() + 5
+                if view.combo_timer > 0:
+                    bar_width = px(200)
+                    bar_height = px(8)
+                    bar_x = W // 2 - bar_width // 2
+                    bar_y = combo_y + combo_surf.get_height() + px(5)
                     
                     pygame.draw.rect(surf, (40, 40, 40, 200), 
                                    (bar_x, bar_y, bar_width, bar_height))
                     
-                    progress = self.combo_timer / self.combo_timeout
+                    progress = view.combo_timer / view.combo_timeout
                     progress_width = int(bar_width * progress)
                     
                     if progress > 0.5:
@@ -443,98 +637,266 @@ class Game:
                                    (bar_x, bar_y, progress_width, bar_height))
         else:
             surf.fill((10, 10, 12, 220))
-            score_surf = self.font.render(f"Score: {self.score}", True, (255,255,220))
-            surf.blit(score_surf, (12, 8))
-            W = surf.get_width()
-            hs_surf = self.font.render(f"High: {self.highscore}", True, (255,255,220))
-            surf.blit(hs_surf, (W - hs_surf.get_width() - 12, 8))
+            score_surf = self.font.render(f"Score: {view.score}", True, (255,255,220))
+            ov.place(score_surf, 0.0, 0.0, 12, 8)
+            hs_surf = self.font.render(f"High: {view.highscore}", True, (255,255,220))
+            ov.place(hs_surf, 1.0, 0.0, -12, 8)
 
-            if self.state == "menu":
+            if view.state == "menu":
                 title = self.large_font.render("Lane3D Runner", True, (255, 240, 140))
                 instruct = self.font.render("Press SPACE to start  •  F = fullscreen  •  ESC = quit", True, (240,240,240))
-                surf.blit(title, (WIN_W//2 - title.get_width()//2, WIN_H//2 - 80))
-                surf.blit(instruct, (WIN_W//2 - instruct.get_width()//2, WIN_H//2 - 20))
+                ov.place(title, 0.5, 0.5, 0, -80)
+                ov.place(instruct, 0.5, 0.5, 0, -20)
                 start_hint = self.large_font.render("Press SPACE to start", True, (255, 220, 80))
-                surf.blit(start_hint, (WIN_W//2 - start_hint.get_width()//2, WIN_H//2 + 30))
-            elif self.state == "gameover":
+                ov.place(start_hint, 0.5, 0.5, 0, 30)
+                skin = self.font.render(f"Car: {view.car_skin}  (C to change)", True, (200, 200, 200))
+                ov.place(skin, 0.5, 0.5, 0, 90)
+                mode = "ON" if view.practice else "off"
+                ghosts = "on" if view.ghosts_on else "off"
+                modes = self.font.render(f"Practice mode: {mode} (P)  •  Ghosts: {ghosts} (G)",
+                                         True, (200, 200, 200))
+                ov.place(modes, 0.5, 0.5, 0, 120)
+                if view.resume_available:
+                    resume = self.font.render("L = resume last run", True, (120, 220, 255))
+                    ov.place(resume, 0.5, 0.5, 0, 150)
+                if view.net_status:
+                    status = self.font.render(view.net_status, True, (120, 220, 255))
+                    ov.place(status, 0.5, 0.5, 0, 180)
+            elif view.state == "gameover":
                 t = self.large_font.render("GAME OVER", True, (255,255,255))
-                surf.blit(t, (WIN_W//2 - t.get_width()//2, WIN_H//2 - 100))
+                ov.place(t, 0.5, 0.5, 0, -100)
                 
-                t2 = self.font.render(f"Final Score: {self.score}", True, (240,240,240))
-                surf.blit(t2, (WIN_W//2 - t2.get_width()//2, WIN_H//2 - 40))
+                t2 = self.font.render(f"Final Score: {view.score}", True, (240,240,240))
+                ov.place(t2, 0.5, 0.5, 0, -40)
                 
-                combo_text = f"Max Combo: {self.max_combo}x"
-                combo_color = (255, 200, 80) if self.max_combo >= 5 else (200, 200, 200)
+                combo_text = f"Max Combo: {view.max_combo}x"
+                combo_color = (255, 200, 80) if view.max_combo >= 5 else (200, 200, 200)
                 t3 = self.font.render(combo_text, True, combo_color)
-                surf.blit(t3, (WIN_W//2 - t3.get_width()//2, WIN_H//2 - 5))
+                ov.place(t3, 0.5, 0.5, 0, -5)
+                near = self.font.render(f"Near Misses: {view.near_misses}", True, (120, 220, 255))
+                ov.place(near, 0.5, 0.5, 0, 25)
                 
                 t4 = self.font.render("Press R to restart", True, (180, 180, 180))
-                surf.blit(t4, (WIN_W//2 - t4.get_width()//2, WIN_H//2 + 30))
+                ov.place(t4, 0.5, 0.5, 0, 60)
+                if view.practice:
+                    t5 = self.font.render("BACKSPACE = rewind", True, (120, 220, 255))
+                    ov.place(t5, 0.5, 0.5, 0, 90)
 
   
-    def run(self):
+    def run(self, duration=None):
+        """duration: stop after this many seconds (scripted runs)."""
+        if self.threaded:
+            return self.run_threaded(duration)
+        frame_time = 1.0 / FPS
+        start = last = next_frame = self.input.poll()
         while self.running:
-            dt = self.clock.tick(FPS) / 1000.0
-            for ev in pygame.event.get():
-                if ev.type == QUIT:
-                    self.running = False
-                elif ev.type == KEYDOWN:
-                    if ev.key == K_ESCAPE:
-                        self.running = False
-                    else:
-                        self.handle_key(ev.key)
-
-            self.update(dt)
-            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-            self.draw_sky()  # Draw sky first (background)
-            glClear(GL_DEPTH_BUFFER_BIT)  # Clear depth buffer so 3D scene renders on top
-            self.look_at_camera()
-            self.draw_scene()
-            self.build_overlay()
-            self.overlay.draw_fullscreen()
+            # Frame limiter; keeps polling so key presses get ~1 ms timestamps
+            next_frame = max(next_frame + frame_time, last)
+            now = self.input.wait_until(next_frame)
+            dt, last = now - last, now
+            self.window_events()
+
+            # Fixed-step simulation so runs are deterministic and replayable.
+            # The steps catch the sim up to `now`; each one covers SIM_DT of
+            # wall time and receives the keys pressed during that slice.
+            self.accumulator += dt
+            step_end = now - self.accumulator + SIM_DT
+            steps = 0
+            while self.accumulator >= SIM_DT and steps < MAX_STEPS_PER_FRAME:
+                self.apply_input(step_end)
+                self.update(SIM_DT)
+                self.accumulator -= SIM_DT
+                step_end += SIM_DT
+                steps += 1
+            if steps == MAX_STEPS_PER_FRAME:
+                self.accumulator = 0.0
+                self.apply_input(now)
+            if self.state != "playing":
+                self.apply_input(now)  # menus don't wait for a sub-step
+            self.events.drain()
+            self.audio.flush()
+            self.render_frame()
             pygame.display.flip()
+            self.latency.presented(self.input.clock())
+            self.restart_presented(self.state)
+            self.diagnostics.tick()
+            if duration is not None and now - start >= duration:
+                self.running = False
+        self.close()
+
+    def run_threaded(self, duration=None):
+        """
+        The sim steps on its own thread (sim_loop) and publishes a snapshot
+        per step; this thread polls input, draws the newest snapshot and
+        flips. A slow frame no longer delays the simulation, and a slow step
+        only makes the picture older instead of blocking the flip.
+        """
+        self.snapshots.publish(self, self.input.clock())
+        sim = threading.Thread(target=self.sim_loop, name="sim", daemon=True)
+        sim.start()
+        frame_time = 1.0 / FPS
+        start = last = next_frame = self.input.poll()
+        while self.running:
+            next_frame = max(next_frame + frame_time, last)
+            now = last = self.input.wait_until(next_frame)
+            self.window_events()
+            view = self.snapshots.read(now)
+            self.audio.flush()
+            self.render_frame(view)
+            pygame.display.flip()
+            self.latency.presented(self.input.clock(), view.frame)
+            self.restart_presented(view.state)
+            self.diagnostics.tick()
+            if duration is not None and now - start >= duration:
+                self.running = False
+        sim.join()
+        self.close()
+
+    def sim_loop(self):
+        """Threaded mode: one fixed step per SIM_DT of wall time, then publish."""
+        clock = self.input.clock
+        step_end = clock() + SIM_DT
+        while self.running:
+            now = clock()
+            if now < step_end:
+                time.sleep(min(0.001, step_end - now))
+                continue
+            if now - step_end > MAX_STEPS_PER_FRAME * SIM_DT:
+                step_end = now  # long hitch: skip ahead like the catch-up limit does
+            self.apply_input(step_end)
+            self.update(SIM_DT)
+            self.events.drain()
+            self.snapshots.publish(self, step_end)
+            step_end += SIM_DT
+
+    def restart_presented(self, state):
+        """After flip(): restart-to-first-frame latency, once the new run is on screen."""
+        if self.restart_t is None or state != "playing":
+            return
+        ms = (self.input.clock() - self.restart_t) * 1000.0
+        self.restart_t = None
+        self.restart_ms.append(ms)
+        log.info("restart: reset %.2f ms, first frame %.1f ms after the key", self.reset_ms, ms)
+
+    def window_events(self):
+        for ev in self.input.take_other():
+            if ev.type == QUIT:
+                self.running = False
+            elif ev.type == VIDEORESIZE:
+                self.resize(ev.w, ev.h)
+            elif ev.type == KEYDOWN:
+                self.handle_window_key(ev.key)
+
+    def close(self):
+        if self.persist and self.state == "playing":
+            try:
+                write_state(RESUME_FILE, self)  # picked up with L from the menu next time
+            except OSError as e:
+                log.warning("could not save the run for resume: %s", e)
+        lat = self.latency.percentiles()
+        if lat:
+            log.info("input latency ms: p50 %.1f, p95 %.1f, p99 %.1f, max %.1f (n=%d)",
+                     lat["p50"], lat["p95"], lat["p99"], lat["max"], lat["n"])
+        if self.restart_ms:
+            s = sorted(self.restart_ms)
+            log.info("restart to first frame ms: p50 %.1f, max %.1f (n=%d)",
+                     s[len(s) // 2], s[-1], len(s))
+        if self.snapshots:
+            snaps = self.snapshots
+            age = snaps.percentiles()
+            if age:
+                log.info("snapshot age ms: p50 %.1f, p95 %.1f, p99 %.1f, max %.1f",
+                         age["p50"], age["p95"], age["p99"], age["max"])
+            log.info("snapshots: %d published, %d dropped; %d of %d frames repeated one",
+                     snaps.published, snaps.dropped, snaps.repeated, snaps.frames)
+        if self.net:
+            self.net.close()
+        if self.telemetry:
+            self.telemetry.close()
+        self.diagnostics.close()
+        log.shutdown()
         pygame.quit()
 
-    def spawn_buildings(self, z_val):
+    def entity_counts(self):
+        return {
+            "obstacles": len(self.obstacles),
+            "coins": len(self.coins),
+            "buildings": len(self.buildings),
+            "particles": len(self.particles),
+            "pending_events": self.events.count,
+            "dropped_events": self.events.dropped,
+        }
+
+    def apply_input(self, until):
+        for t, key in self.input.due(until):
+            self.handle_key(key, t)
+
+    def render_frame(self, view=None):
+        """view: a WorldSnapshot in threaded mode; the live game otherwise."""
+        view = view or self
+        if self.scene_target:
+            # 3D pass at reduced resolution, then upscale into the output
+            sw = max(1, int(self.width * self.dynres.scale))
+            sh = max(1, int(self.height * self.dynres.scale))
+            self.scene_target.bind(sw, sh)
+            self.scene_timer.begin()
+            self.draw_world(view)
+            self.dynres.feed(self.scene_timer.end())
+            self.scene_target.blit_to(self.output_fbo, sw, sh, self.width, self.height)
+            glBindFramebuffer(GL_FRAMEBUFFER, self.output_fbo)
+            glViewport(0, 0, self.width, self.height)
+        else:
+            self.draw_world(view)
+        self.build_overlay(view)
+        self.overlay.draw_fullscreen()
+
+    def draw_world(self, view):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.sky.draw(view.player.x)  # background; writes no depth
+        self.look_at_camera(view.player.x)
+        self.draw_scene(view)
+
+    def spawn_buildings(self, z_val, out=None, rng=None):
         # We use the specific Z passed to the function, not the Camera position
         # This ensures they lock to the grid perfectly.
-        
-        road_half_width = (LANE_SPACING * (LANE_COUNT - 1)) / 2.0
-        side_offset = road_half_width + 4.5
-
-        for side in (-1, 1):  # left & right
-            x = side * side_offset
-            
+        out = self.buildings if out is None else out
+        rng = rng or self.scenery_rng
+        pool = self.building_pool
+        for x in self.track.building_x:  # left & right
             # Add slight random offset to Z, but keep it centered on z_val
-            z = z_val + random.uniform(-1.0, 1.0)
+            z = z_val + rng.uniform(-1.0, 1.0)
 
-            if random.random() < 0.7:
-                height = random.uniform(4.0, 10.0)
+            if rng.random() < 0.7:
+                height = rng.uniform(4.0, 10.0)
             else:
-                height = random.uniform(12.0, 22.0)
+                height = rng.uniform(12.0, 22.0)
             
-            width  = random.uniform(2.5, 4.0)
-            depth  = random.uniform(8.0, 12.0)
+            width  = rng.uniform(2.5, 4.0)
+            depth  = rng.uniform(8.0, 12.0)
 
-            self.buildings.append(
-                Building(x, z, width=width, depth=depth, height=height)
-            )
+            try:
+                b = pool.pop()  # may race with the roadside thread after a rewind
+            except IndexError:
+                b = Building(x, z, width=width, depth=depth, height=height, rng=rng)
+            else:
+                b.reset(x, z, width=width, depth=depth, height=height, rng=rng)
+            out.append(b)
 
 
 
 # PARTICLE CLASS - OUTSIDE GAME CLASS
 class Particle:
     """A single particle that flies outward and fades away"""
-    def __init__(self, x, y, z):
+    def __init__(self, x, y, z, rng=random):
         self.x = x
         self.y = y
         self.z = z
-        self.vx = random.uniform(-3, 3)
-        self.vy = random.uniform(1, 4)
-        self.vz = random.uniform(-1, 1)
-        self.life = random.uniform(0.3, 0.6)
+        self.vx = rng.uniform(-3, 3)
+        self.vy = rng.uniform(1, 4)
+        self.vz = rng.uniform(-1, 1)
+        self.life = rng.uniform(0.3, 0.6)
         self.max_life = self.life
-        self.size = random.uniform(0.2, 0.4)
+        self.size = rng.uniform(0.2, 0.4)
         
     def update(self, dt):
         """Move particle and decrease lifetime"""
@@ -551,8 +913,6 @@ class Particle:
         """Draw particle with fade-out effect"""
         if self.life > 0:
             alpha = self.life / self.max_life
-            glColor4f(1.0, 0.85, 0.25, alpha)
-            from player import draw_cube
             draw_cube((self.x, self.y, self.z), 
                      (self.size, self.size, self.size), 
-                     (1.0, 0.85, 0.25))
\ No newline at end of file
+                     (1.0, 0.85, 0.25, alpha))
\ No newline at end of file
@@ -0,0 +1,250 @@
+# ghost.py - ghost cars replayed from compact lane-change recordings
+#
+# A ghost file holds what is needed to redraw a run's car, not to
+# re-simulate it: every lane change (with the slide time it started with),
+# the key presses and where the run ended. Records are delta-encoded against
+# the previous record and written as varints, so a lane change costs 3-4
+# bytes and an hour of play a few KB.
+#
+#   header: b"L3DG", version, varint lanes, varint start lane, varint skin length, skin
+#   record: varint(frames since previous record << 2 | kind) + payload
+#     LANE_KEY / LANE: varint zigzag(lane delta), varint slide ms   (LANE_KEY: a key caused it)
+#     KEY:             varint zigzag(direction)                    (key that queued / did nothing)
+#     END:             -                                           (run crashed here)
+#
+# GhostReader decodes the file a few KB at a time as the ghost advances;
+# nothing but the current record is kept in memory.
+import os
+
+import log
+from player import CAR_SKINS, CarModel, DEFAULT_SKIN
+
+MAGIC = b"L3DG"
+GHOST_VERSION = 1
+GHOST_FILE = "lane3d_ghost.bin"
+
+LANE_KEY, LANE, KEY, END = 0, 1, 2, 3
+
+COL_GHOST = (0.55, 0.8, 1.0)
+
+
+def _varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -(n >> 1) - 1
+
+
+class GhostRecorder:
+    """Called once per simulation step; encodes the run as it goes."""
+    def __init__(self, lanes, start_lane, skin=DEFAULT_SKIN):
+        out = bytearray(MAGIC)
+        out.append(GHOST_VERSION)
+        _varint(out, lanes)
+        _varint(out, start_lane)
+        name = skin.encode()
+        _varint(out, len(name))
+        out += name
+        self.out = out
+        self.last_frame = 0
+        self.lane = start_lane
+        self.inputs_seen = 0
+        self.valid = True    # False once the run was not recorded from its start
+
+    def _record(self, frame, kind):
+        _varint(self.out, (frame - self.last_frame) << 2 | kind)
+        self.last_frame = frame
+
+    def step(self, sim):
+        """After sim.update(): the lane change and keys of the step that ended at sim.frame."""
+        keys = sim.inputs[self.inputs_seen:]
+        self.inputs_seen = len(sim.inputs)
+        lane = sim.player.lane
+        if lane != self.lane:
+            direction = 1 if lane > self.lane else -1
+            from_key = any(d == direction for _, d in keys)
+            if from_key:
+                keys.remove(next(k for k in keys if k[1] == direction))
+            self._record(sim.frame, LANE_KEY if from_key else LANE)
+            _varint(self.out, _zigzag(lane - self.lane))
+            _varint(self.out, int(round(sim.player.move_duration * 1000.0)))
+            self.lane = lane
+        for _, d in keys:
+            self._record(sim.frame, KEY)
+            _varint(self.out, _zigzag(d))
+
+    def finish(self, frame):
+        """The encoded run, ending at `frame`."""
+        self._record(frame, END)
+        return bytes(self.out)
+
+    def save(self, path, frame):
+        # temp file + rename: a kill mid-write must not leave a broken ghost behind
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(self.finish(frame))
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+class GhostReader:
+    """Streams records from a ghost file: (frame, kind, value, slide seconds)."""
+    def __init__(self, path, chunk=4096):
+        self.path = path
+        self.chunk = chunk
+        self.f = open(path, "rb")
+        self.buf = b""
+        self.pos = 0
+        self.frame = 0
+        try:
+            self._header()
+        except (EOFError, ValueError) as e:
+            self.close()
+            if isinstance(e, EOFError):
+                raise ValueError(f"{path}: truncated ghost header")
+            raise
+
+    def _header(self):
+        if self._read(4) != MAGIC:
+            raise ValueError(f"{self.path}: not a ghost file")
+        version = self._byte()
+        if version != GHOST_VERSION:
+            raise ValueError(f"{self.path}: unsupported ghost version {version}")
+        self.lanes = self.varint()
+        self.start_lane = self.varint()
+        self.skin = self._read(self.varint()).decode()
+        if self.start_lane >= self.lanes or self.skin not in CAR_SKINS:
+            raise ValueError(f"{self.path}: bad ghost header")
+
+    def _byte(self):
+        if self.pos >= len(self.buf):
+            self.buf = self.f.read(self.chunk)
+            self.pos = 0
+            if not self.buf:
+                raise EOFError
+        b = self.buf[self.pos]
+        self.pos += 1
+        return b
+
+    def _read(self, n):
+        return bytes(self._byte() for _ in range(n))
+
+    def varint(self):
+        n = shift = 0
+        while True:
+            b = self._byte()
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def next(self):
+        """The next record, or None at the end of the file."""
+        try:
+            head = self.varint()
+            self.frame += head >> 2
+            kind = head & 3
+            if kind in (LANE_KEY, LANE):
+                return self.frame, kind, _unzigzag(self.varint()), self.varint() / 1000.0
+            if kind == KEY:
+                return self.frame, kind, _unzigzag(self.varint()), 0.0
+            return self.frame, kind, 0, 0.0
+        except EOFError:
+            return None
+
+    def close(self):
+        self.f.close()
+
+
+class Ghost:
+    """
+    A translucent car following a recorded run. x is rebuilt with the same
+    per-step smoothstep slide Player.update uses, from the lane changes and
+    their recorded slide times.
+    """
+    def __init__(self, path, track, y=-1.0, z=2.0):
+        self.path = path
+        self.track = track
+        self.reader = GhostReader(path)
+        if self.reader.lanes != track.lanes:
+            self.reader.close()
+            raise ValueError(f"{path}: ghost is for {self.reader.lanes} lanes, track has {track.lanes}")
+        self.model = CarModel(0.0, y, z, skin=self.reader.skin)
+        self.model.color = COL_GHOST
+        self._start()
+
+    def _start(self):
+        self.frame = 0
+        self.lane = self.reader.start_lane
+        self.x = self.target_x = self.track.lane_x[self.lane]
+        self.t = 1.0
+        self.duration = 0.06
+        self.visible = True
+        self.pending = self.reader.next()
+        self.model.x = self.x
+
+    def seek(self, frame, dt):
+        """Jump to `frame` (after a rewind or resume): restart if needed and replay forward."""
+        if frame < self.frame:
+            self.reader.close()
+            self.reader = GhostReader(self.path)
+            self._start()
+        while self.frame < frame and self.visible:
+            self.step(dt)
+
+    def step(self, dt):
+        self.frame += 1
+        prev = self.x
+        rec = self.pending
+        while rec is not None and rec[0] <= self.frame:
+            frame, kind, value, seconds = rec
+            if kind == END:
+                self.visible = False
+            elif kind != KEY:
+                self.lane += value
+                if not 0 <= self.lane < self.track.lanes:
+                    log.warning("ghost %s: corrupt lane change at frame %d, hiding it", self.path, frame)
+                    self.lane -= value
+                    self.visible = False
+                    rec = None
+                    break
+                self.target_x = self.track.lane_x[self.lane]
+                self.duration = seconds
+                self.t = 0.0
+            rec = self.reader.next()
+        self.pending = rec
+
+        if self.t < 1.0:
+            self.t += dt / max(1e-6, self.duration)
+            s = min(1.0, self.t)
+            s = s * s * (3 - 2 * s)
+            self.x = (1 - s) * prev + s * self.target_x
+        else:
+            self.x = self.target_x
+        self.model.x = self.x
+
+    def close(self):
+        self.reader.close()
+
+
+def load_ghosts(paths, track):
+    """Ghosts for the files that exist and fit the track; others are skipped."""
+    ghosts = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            ghosts.append(Ghost(path, track))
+        except (OSError, ValueError) as e:
+            log.warning("ghost skipped: %s", e)
+    return ghosts
@@ -0,0 +1,61 @@
+# glconfig.py - PyOpenGL runtime flags; import before anything imports OpenGL.GL
+#
+# PyOpenGL's defaults favour safety: glGetError after every call, logging
+# wrappers, per-context pointer storage and array size checks. That costs
+# more than the driver call itself for the small immediate-mode calls the
+# renderer makes, so they are off unless LANE3D_GL_DEBUG=1.
+#
+# Fast mode also raises on implicit array copies (ERROR_ON_COPY), which
+# points straight at any draw path that still hands Python tuples to an
+# array call. Debug mode turns every check back on and allows copies.
+import os
+import sys
+
+import OpenGL
+
+DEBUG_GL = os.environ.get("LANE3D_GL_DEBUG", "") not in ("", "0")
+IMPORTED_LATE = "OpenGL.GL" in sys.modules  # flags below are read when OpenGL.GL loads
+
+OpenGL.ERROR_CHECKING = DEBUG_GL
+OpenGL.ERROR_LOGGING = DEBUG_GL
+OpenGL.CONTEXT_CHECKING = DEBUG_GL
+OpenGL.ARRAY_SIZE_CHECKING = DEBUG_GL
+# Without contextdata (STORE_POINTERS) PyOpenGL no longer keeps arrays
+# alive for us, so it insists on ERROR_ON_COPY: every array argument must
+# already be a contiguous array of the right type (our vertex buffers are,
+# and live for the whole run).
+OpenGL.STORE_POINTERS = DEBUG_GL
+OpenGL.ERROR_ON_COPY = not DEBUG_GL
+
+
+def accelerations():
+    """What the GL binding is running with, for the startup log."""
+    info = {
+        "pyopengl": OpenGL.__version__,
+        "debug": DEBUG_GL,
+        "error_checking": OpenGL.ERROR_CHECKING,
+        "accelerate": None,
+        "numpy": None,
+    }
+    if OpenGL.USE_ACCELERATE:
+        try:
+            import OpenGL_accelerate
+            info["accelerate"] = OpenGL_accelerate.__version__
+        except ImportError:
+            pass
+    try:
+        import numpy
+        info["numpy"] = numpy.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def log_startup():
+    import log
+    info = accelerations()
+    log.info("PyOpenGL %s: accelerate %s, numpy arrays %s, error checking %s%s",
+             info["pyopengl"], info["accelerate"] or "not available", info["numpy"] or "not available",
+             "on" if info["error_checking"] else "off", " (LANE3D_GL_DEBUG)" if info["debug"] else "")
+    if IMPORTED_LATE:
+        log.warning("glconfig imported after OpenGL.GL; fast-mode flags may not apply")
@@ -0,0 +1,152 @@
+# glstate.py - shadow copy of GL state so redundant calls are never issued
+#
+# Every PyOpenGL call costs a Python -> C round trip plus error checking,
+# and draw code used to toggle the same caps for every object. Code that
+# goes through `gl` only reaches the driver when something actually changes;
+# `issued` / `elided` count both outcomes.
+#
+# The shadow copy is only right if every change goes through `gl`, so:
+#   * display lists that change state: call gl.assume(...) / gl.forget_color()
+#     after glCallList with what the list leaves behind
+#   * while compiling a list (glNewList ... glEndList) wrap it in
+#     `with gl.compiling():` so nothing is elided from the recording
+#   * after anything else touched GL behind our back: gl.invalidate()
+from contextlib import contextmanager
+
+from OpenGL.GL import *
+
+# Render state keys. Draw lists are sorted by key, so this is also the order
+# the groups are drawn in (blended ones last).
+STATE_OPAQUE = 0       # back-face culling, no blending
+STATE_TWO_SIDED = 1    # no culling (spinning coins)
+STATE_BLENDED = 2      # alpha blended (particles)
+STATE_GHOST = 3        # whole mesh faded by a constant alpha (ghost cars)
+
+GHOST_ALPHA = 0.35
+
+_STATES = {
+    STATE_OPAQUE: {GL_CULL_FACE: True, GL_BLEND: False},
+    STATE_TWO_SIDED: {GL_CULL_FACE: False, GL_BLEND: False},
+    STATE_BLENDED: {GL_CULL_FACE: True, GL_BLEND: True},
+    STATE_GHOST: {GL_CULL_FACE: True, GL_BLEND: True},
+}
+
+
+class GLState:
+    def __init__(self):
+        self.caps = {}          # cap -> bool
+        self.blend = None       # (src, dst)
+        self.blend_alpha = None # glBlendColor alpha
+        self.texture = None     # GL_TEXTURE_2D binding
+        self.current_color = None
+        self.passthrough = False
+        self.issued = 0
+        self.elided = 0
+
+    # --- caps ---
+    def set(self, cap, on):
+        if not self.passthrough and self.caps.get(cap) == on:
+            self.elided += 1
+            return
+        if on:
+            glEnable(cap)
+        else:
+            glDisable(cap)
+        self.issued += 1
+        if not self.passthrough:
+            self.caps[cap] = on
+
+    def enable(self, cap):
+        self.set(cap, True)
+
+    def disable(self, cap):
+        self.set(cap, False)
+
+    def apply(self, key):
+        """Switch to one of the STATE_* render states."""
+        for cap, on in _STATES[key].items():
+            self.set(cap, on)
+        if key == STATE_BLENDED:
+            self.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        elif key == STATE_GHOST:
+            # constant alpha, so baked display lists (opaque colors) fade as-is
+            self.blend_func(GL_CONSTANT_ALPHA, GL_ONE_MINUS_CONSTANT_ALPHA)
+            self.blend_color_alpha(GHOST_ALPHA)
+
+    # --- other state ---
+    def blend_func(self, src, dst):
+        if not self.passthrough and self.blend == (src, dst):
+            self.elided += 1
+            return
+        glBlendFunc(src, dst)
+        self.issued += 1
+        if not self.passthrough:
+            self.blend = (src, dst)
+
+    def blend_color_alpha(self, a):
+        if not self.passthrough and self.blend_alpha == a:
+            self.elided += 1
+            return
+        glBlendColor(0.0, 0.0, 0.0, a)
+        self.issued += 1
+        if not self.passthrough:
+            self.blend_alpha = a
+
+    def bind_texture(self, tex):
+        if not self.passthrough and self.texture == tex:
+            self.elided += 1
+            return
+        glBindTexture(GL_TEXTURE_2D, tex)
+        self.issued += 1
+        if not self.passthrough:
+            self.texture = tex
+
+    def color(self, c):
+        """c: (r, g, b) or (r, g, b, a)."""
+        if not self.passthrough and self.current_color == c:
+            self.elided += 1
+            return
+        if len(c) == 4:
+            glColor4f(*c)
+        else:
+            glColor3f(*c)
+        self.issued += 1
+        if not self.passthrough:
+            self.current_color = c
+
+    # --- keeping the shadow copy honest ---
+    def assume(self, cap, on):
+        """Record a cap change made outside `gl` (e.g. inside a display list)."""
+        self.caps[cap] = on
+
+    def assume_texture(self, tex):
+        self.texture = tex
+
+    def forget_color(self):
+        self.current_color = None
+
+    def invalidate(self):
+        self.caps.clear()
+        self.blend = None
+        self.blend_alpha = None
+        self.texture = None
+        self.current_color = None
+
+    @contextmanager
+    def compiling(self):
+        """Issue every call while a display list is being recorded."""
+        prev = self.passthrough
+        self.passthrough = True
+        try:
+            yield
+        finally:
+            self.passthrough = prev
+
+    def take_counts(self):
+        """Issued / elided calls since the last call (for diagnostics)."""
+        counts = {"gl_state_calls": self.issued, "gl_state_elided": self.elided}
+        self.issued = self.elided = 0
+        return counts
+
+
+gl = GLState()
@@ -0,0 +1,137 @@
+# log.py - leveled logging with a background writer thread
+#
+# Call sites never block on stdout: messages go into a bounded queue and a
+# daemon thread formats and writes them in batches. If the queue is full the
+# message is dropped and counted instead of stalling the game loop.
+#
+# Level checks are plain module booleans, so hot paths can skip even the
+# argument tuple:   if log.DEBUG_ON: log.debug("x=%s", x)
+# Set the level with LANE3D_LOG=debug|info|warning|error (default: info).
+import json
+import os
+import queue
+import sys
+import threading
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class AsyncWriter(threading.Thread):
+    """Bounded queue + daemon thread that writes lines in batches."""
+    def __init__(self, stream, maxsize=4096, batch=256, encode=str):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch = batch
+        self.encode = encode  # runs on the writer thread
+        self.dropped = 0
+        self.start()
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        q = self.queue
+        while True:
+            item = q.get()
+            lines = []
+            done = False
+            while True:
+                if item is None:
+                    done = True
+                    break
+                lines.append(self.encode(item))
+                if len(lines) >= self.batch:
+                    break
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass
+            if done:
+                return
+
+    def close(self):
+        self.queue.put(None)
+        self.join(timeout=2.0)
+
+
+def _format(item):
+    level, msg, args = item
+    if args:
+        try:
+            msg = msg % args
+        except (TypeError, ValueError):
+            msg = f"{msg} {args}"
+    return f"[{LEVEL_NAMES.get(level, level)}] {msg}"
+
+
+class JsonlSink(AsyncWriter):
+    """Append dict records to a .jsonl file off the calling thread."""
+    def __init__(self, path, maxsize=8192, batch=512):
+        super().__init__(open(path, "a"), maxsize, batch, encode=lambda rec: json.dumps(rec, separators=(",", ":")))
+
+    def close(self):
+        super().close()
+        self.stream.close()
+
+
+# --- module-level logger -------------------------------------------------
+level = INFO
+DEBUG_ON = INFO_ON = WARNING_ON = True
+_writer = None
+
+
+def configure(new_level=None, stream=None):
+    global level, DEBUG_ON, INFO_ON, WARNING_ON, _writer
+    if new_level is None:
+        name = os.environ.get("LANE3D_LOG", "info").upper()
+        new_level = next((k for k, v in LEVEL_NAMES.items() if v == name), INFO)
+    level = new_level
+    DEBUG_ON = level <= DEBUG
+    INFO_ON = level <= INFO
+    WARNING_ON = level <= WARNING
+    if _writer is None or stream is not None:
+        _writer = AsyncWriter(stream or sys.stdout, encode=_format)
+
+
+def log(lvl, msg, *args):
+    if lvl >= level:
+        _writer.put((lvl, msg, args))
+
+
+def debug(msg, *args):
+    if DEBUG_ON:
+        _writer.put((DEBUG, msg, args))
+
+
+def info(msg, *args):
+    if INFO_ON:
+        _writer.put((INFO, msg, args))
+
+
+def warning(msg, *args):
+    if WARNING_ON:
+        _writer.put((WARNING, msg, args))
+
+
+def error(msg, *args):
+    _writer.put((ERROR, msg, args))
+
+
+def shutdown():
+    """Flush everything still queued (call before exit)."""
+    if _writer:
+        _writer.close()
+
+
+configure()
@@ -1,4 +1,5 @@
 # main.py
+import glconfig  # first: sets PyOpenGL flags before OpenGL.GL is imported
 from game import Game
 
 if __name__ == "__main__":
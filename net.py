@@ -0,0 +1,705 @@
+# net.py - LAN races: host-authoritative simulation, delta-compressed UDP snapshots
+#
+# Every racer drives their own copy of the same seeded road. The host steps
+# an authoritative Simulation per remote player, fed with the lane inputs
+# that player's client sends. Inputs are stamped with the frame they were
+# pressed on and resent until acknowledged, and the host only steps a copy
+# up to the frame its client has reported, so the host applies every input
+# on the frame the client did.
+#
+# Clients predict locally (their whole Simulation, which matches the host's
+# copy while the inputs do) and reconcile their Player against the host's
+# copy in every snapshot. If the slide state at that frame differs, the
+# player is reset to the host's and the slide re-run over the frames since.
+#
+# Snapshots go out every SNAPSHOT_EVERY steps, one datagram per client,
+# delta-compressed against the last snapshot that client acknowledged: only
+# racers and fields that changed are sent (a bit mask each).
+#
+#   python net.py host [--port 7777] [--offscreen --script s.json --duration 20]
+#   python net.py join 192.168.1.20 [--port 7777]
+#   python net.py bench --clients 7 --seconds 10 --loss 0.1   (headless, localhost UDP)
+import glconfig  # first: sets PyOpenGL flags before OpenGL.GL is imported
+import bisect
+import random
+import socket
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+
+import log
+from player import CarModel, CAR_SKINS, DEFAULT_SKIN
+from simulation import Simulation, SIM_DT, PLAYER_Z
+
+DEFAULT_PORT = 7777
+MAX_PLAYERS = 8            # host included; ids 0..7 fit the roster bit mask
+SNAPSHOT_EVERY = 2         # steps between snapshots (30 Hz)
+MAX_LEAD = 10              # frames a client may run ahead of the host's race clock
+TIMEOUT = 5.0              # seconds of silence before a peer is dropped
+JOIN_RETRY = 0.5
+BASELINES_KEPT = 64
+MAX_RESEND = 32            # unacknowledged inputs carried per packet
+MAX_DATAGRAM = 1200
+
+SKINS = tuple(CAR_SKINS)
+STATES = ("menu", "playing", "gameover")
+OPPONENT_COLORS = ((1.0, 0.55, 0.15), (0.75, 0.35, 1.0), (0.3, 0.9, 0.45), (1.0, 0.85, 0.2),
+                   (1.0, 0.4, 0.6), (0.5, 0.9, 0.95), (0.85, 0.85, 0.85), (0.6, 0.45, 0.3))
+
+MAGIC = 0x4C33
+MSG_JOIN, MSG_WELCOME, MSG_INPUT, MSG_SNAPSHOT, MSG_LEAVE = 1, 2, 3, 4, 5
+
+_HDR = struct.Struct("<HB")
+# track digest (Track.digest), skin index, adaptive difficulty
+_JOIN = struct.Struct("<IB?")
+# player id, 0 = refused (full / wrong track)
+_WELCOME = struct.Struct("<B")
+# race id, newest snapshot decoded, client frame, input count
+_INPUT = struct.Struct("<HIIB")
+# input seq, frame pressed on, direction
+_INPUT_ITEM = struct.Struct("<IIb")
+# seq, baseline seq (0 = full), race id, seed, race frame, inputs received, roster mask, changed mask
+_SNAP = struct.Struct("<IIHqIIBB")
+# the receiving client's own player on the host: frame, lane, x, t, queued moves
+_SELF = struct.Struct("<IBddB")
+
+# Per-racer fields; a snapshot sends the ones that changed since the baseline
+FIELDS = (("frame", "I"), ("lane", "B"), ("x", "f"), ("distance", "f"),
+          ("score", "I"), ("combo", "H"), ("state", "B"), ("skin", "B"))
+_FIELD = [struct.Struct("<" + fmt) for _, fmt in FIELDS]
+
+
+def _f32(v):
+    return array("f", (v,))[0]
+
+
+def racer_entry(sim, skin):
+    """The replicated view of one racer, with floats already rounded to float32."""
+    return (sim.frame, sim.player.lane, _f32(sim.player.x), _f32(sim.road_scroll),
+            sim.score, min(sim.combo, 0xFFFF), STATES.index(sim.state),
+            SKINS.index(skin) if skin in SKINS else 0)
+
+
+def encode_entries(entries, base):
+    """(roster mask, changed mask, bytes) for {id: entry} against baseline {id: entry}."""
+    roster = changed = 0
+    out = []
+    for pid in sorted(entries):
+        e = entries[pid]
+        b = base.get(pid)
+        roster |= 1 << pid
+        mask = 0
+        vals = []
+        for k, fmt in enumerate(_FIELD):
+            if b is None or e[k] != b[k]:
+                mask |= 1 << k
+                vals.append(fmt.pack(e[k]))
+        if mask:
+            changed |= 1 << pid
+            out.append(bytes((mask,)))
+            out.extend(vals)
+    return roster, changed, b"".join(out)
+
+
+def decode_entries(data, pos, roster, changed, base):
+    entries = {}
+    for pid in range(MAX_PLAYERS):
+        if not roster >> pid & 1:
+            continue
+        e = list(base.get(pid, (0, 0, 0.0, 0.0, 0, 0, 0, 0)))
+        if changed >> pid & 1:
+            if pos >= len(data):
+                raise ValueError("truncated snapshot")
+            mask = data[pos]
+            pos += 1
+            for k, fmt in enumerate(_FIELD):
+                if mask >> k & 1:
+                    (e[k],) = fmt.unpack_from(data, pos)
+                    pos += fmt.size
+        if e[6] >= len(STATES) or e[7] >= len(SKINS):
+            raise ValueError("racer state / skin out of range")
+        entries[pid] = tuple(e)
+    return entries, pos
+
+
+class NetStats:
+    """Byte counters and latency samples, reported per diagnostics interval and at exit."""
+    def __init__(self, keep=4096):
+        self.bytes_out = self.bytes_in = 0
+        self.packets_out = self.packets_in = 0
+        self.latency = deque(maxlen=keep)   # ms
+        self._taken = (0, 0, time.perf_counter())
+
+    def rates(self):
+        """(KB/s out, KB/s in) since the last call."""
+        out0, in0, t0 = self._taken
+        now = time.perf_counter()
+        self._taken = (self.bytes_out, self.bytes_in, now)
+        dt = max(now - t0, 1e-6)
+        return (self.bytes_out - out0) / dt / 1024.0, (self.bytes_in - in0) / dt / 1024.0
+
+    def percentiles(self, ps=(50, 95)):
+        if not self.latency:
+            return {}
+        s = sorted(self.latency)
+        return {f"p{p}": s[min(len(s) - 1, int(len(s) * p / 100.0))] for p in ps}
+
+
+class _Peer:
+    """Shared socket plumbing: non-blocking UDP, counted, optional simulated loss."""
+    def __init__(self, bind, loss=0.0, seed=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(bind)
+        self.sock.setblocking(False)
+        self.loss = loss
+        self.loss_rng = random.Random(seed)
+        self.stats = NetStats()
+        self.models = []          # CarModels of the other racers, for draw_groups
+        self.racers = {}          # id -> latest entry
+        self.malformed = 0        # datagrams dropped as short / out of range
+
+    def send(self, data, addr):
+        self.stats.bytes_out += len(data)
+        self.stats.packets_out += 1
+        if self.loss and self.loss_rng.random() < self.loss:
+            return
+        try:
+            self.sock.sendto(data, addr)
+        except OSError as e:
+            log.debug("net send to %s failed: %s", addr, e)
+
+    def receive(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:  # e.g. ICMP port unreachable reported on Windows
+                continue
+            if len(data) < _HDR.size:
+                continue
+            magic, kind = _HDR.unpack_from(data, 0)
+            if magic != MAGIC:
+                continue
+            self.stats.bytes_in += len(data)
+            self.stats.packets_in += 1
+            yield kind, data, addr
+
+    def _malformed(self, addr, e):
+        self.malformed += 1
+        log.debug("[NET] dropped malformed packet from %s: %s", addr, e)
+
+    def place_models(self, my_id, my_distance):
+        """Opponents drawn where they are relative to us: further down the road when ahead."""
+        models = self.models
+        n = 0
+        for pid, e in sorted(self.racers.items()):
+            if pid == my_id or STATES[e[6]] == "menu":
+                continue
+            z = PLAYER_Z - (e[3] - my_distance)
+            if not -300.0 < z < 20.0:
+                continue
+            if n == len(models):
+                models.append(CarModel(0.0, -1.0, 0.0))
+            m = models[n]
+            m.x, m.z = e[2], z
+            m.skin = SKINS[e[7]]
+            m.color = OPPONENT_COLORS[pid % len(OPPONENT_COLORS)]
+            n += 1
+        del models[n:]
+
+    def standings(self, my_id):
+        """HUD lines, best score first."""
+        rows = sorted(self.racers.items(), key=lambda kv: -kv[1][4])
+        return tuple(f"{'>' if pid == my_id else ' '} P{pid + 1}  {e[4]}"
+                     f"{'  (out)' if STATES[e[6]] == 'gameover' else ''}" for pid, e in rows)
+
+    def close(self):
+        self.sock.close()
+
+
+class _Remote:
+    """Host-side state for one connected client."""
+    def __init__(self, pid, addr, skin, track, adaptive):
+        self.id = pid
+        self.addr = addr
+        self.skin = skin
+        self.sim = Simulation(track=track, adaptive=adaptive)  # same rules as the client's own
+        self.sim.state = "menu"
+        self.pending = deque()      # (frame, dir) not applied yet
+        self.input_seq = 0          # newest input received
+        self.frame_reported = 0
+        self.seq = 0                # snapshots sent to this client
+        self.acked = 0              # newest of them the client decoded
+        self.baselines = {}         # seq -> entries sent
+        self.sent_at = {}           # seq -> perf_counter
+        self.last_heard = time.perf_counter()
+        self.stats = NetStats()
+
+
+class NetHost(_Peer):
+    is_host = True
+
+    def __init__(self, track, port=DEFAULT_PORT, bind="0.0.0.0", loss=0.0):
+        super().__init__((bind, port), loss)
+        self.track = track
+        self.track_digest = track.digest()  # joiners must send the same
+        self.player_id = 0
+        self.remotes = {}           # addr -> _Remote
+        self.race_id = 0
+        self.seed = 0
+        self.race_frame = 0
+        self.port = port
+
+    # --- hooks called by the game ---
+    def start_race(self, seed):
+        """Everyone restarts on `seed` (clients see the new race id in the next snapshot)."""
+        self.race_id = self.race_id % 0xFFFF + 1
+        self.seed = seed
+        self.race_frame = 0
+        for r in self.remotes.values():
+            r.sim.start(seed)
+            r.pending.clear()
+            r.frame_reported = 0
+
+    def local_input(self, frame, direction):
+        pass  # the host's own inputs go straight into its simulation
+
+    def tick(self, game):
+        """Before the game's step: take in joins and inputs."""
+        now = time.perf_counter()
+        for kind, data, addr in self.receive():
+            r = self.remotes.get(addr)
+            if r is not None:
+                r.last_heard = now
+                r.stats.bytes_in += len(data)
+            try:
+                if kind == MSG_JOIN:
+                    self._join(data, addr, r)
+                elif kind == MSG_INPUT and r is not None:
+                    self._input(r, data, now)
+                elif kind == MSG_LEAVE and r is not None:
+                    self._drop(r, "left")
+            except (struct.error, ValueError) as e:
+                self._malformed(addr, e)
+        for r in list(self.remotes.values()):
+            if now - r.last_heard > TIMEOUT:
+                self._drop(r, "timed out")
+
+    def after_step(self, game):
+        """After the game's step: advance the clients' copies, send snapshots."""
+        if self.race_id:
+            self.race_frame += 1
+        for r in self.remotes.values():
+            self._advance(r)
+        self.racers = {0: racer_entry(game, game.car_skin)}
+        for r in self.remotes.values():
+            self.racers[r.id] = racer_entry(r.sim, r.skin)
+        self.place_models(0, game.road_scroll)
+        if self.race_frame % SNAPSHOT_EVERY == 0 or not self.race_id:
+            now = time.perf_counter()
+            for r in self.remotes.values():
+                self._send_snapshot(r, now)
+
+    # --- internals ---
+    def _join(self, data, addr, r):
+        if r is None:
+            digest, skin, adaptive = _JOIN.unpack_from(data, _HDR.size)
+            used = {x.id for x in self.remotes.values()}
+            free = [i for i in range(1, MAX_PLAYERS) if i not in used]
+            if digest != self.track_digest or not free:
+                self.send(_HDR.pack(MAGIC, MSG_WELCOME) + _WELCOME.pack(0), addr)
+                return
+            r = _Remote(free[0], addr, SKINS[skin % len(SKINS)], self.track, adaptive)
+            self.remotes[addr] = r
+            log.info("[NET] P%d joined from %s:%d", r.id + 1, *addr)
+        self.send(_HDR.pack(MAGIC, MSG_WELCOME) + _WELCOME.pack(r.id), addr)
+
+    def _drop(self, r, why):
+        log.info("[NET] P%d %s", r.id + 1, why)
+        self._log_remote(r)
+        del self.remotes[r.addr]
+
+    def _input(self, r, data, now):
+        race_id, ack, frame, n = _INPUT.unpack_from(data, _HDR.size)
+        if len(data) < _HDR.size + _INPUT.size + n * _INPUT_ITEM.size:
+            raise ValueError("truncated input list")
+        if ack > r.acked and ack in r.baselines:
+            r.acked = ack
+            sent = r.sent_at.pop(ack, None)
+            if sent is not None:
+                r.stats.latency.append((now - sent) * 1000.0)  # snapshot round trip
+        if race_id != self.race_id:
+            return  # still on the previous race
+        pos = _HDR.size + _INPUT.size
+        for _ in range(n):
+            seq, f, d = _INPUT_ITEM.unpack_from(data, pos)
+            pos += _INPUT_ITEM.size
+            if seq > r.input_seq and d in (-1, 1):
+                r.pending.append((f, d))
+                r.input_seq = seq
+        r.frame_reported = max(r.frame_reported, frame)
+
+    def _advance(self, r):
+        sim = r.sim
+        target = min(r.frame_reported, self.race_frame + MAX_LEAD)
+        pending = r.pending
+        while sim.state == "playing" and sim.frame < target:
+            while pending and pending[0][0] <= sim.frame:
+                sim.move(pending.popleft()[1])
+            sim.update(SIM_DT)
+            sim.events.drain()
+
+    def _send_snapshot(self, r, now):
+        r.seq += 1
+        seq = r.seq
+        base_seq = r.acked if r.acked in r.baselines else 0
+        roster, changed, body = encode_entries(self.racers, r.baselines.get(base_seq, {}))
+        p = r.sim.player
+        queue = array("b", p.queue[:255]).tobytes()
+        data = b"".join((_HDR.pack(MAGIC, MSG_SNAPSHOT),
+                         _SNAP.pack(seq, base_seq, self.race_id, self.seed, self.race_frame,
+                                    r.input_seq, roster, changed),
+                         body,
+                         _SELF.pack(r.sim.frame, p.lane, p.x, p.t, len(queue)), queue))
+        r.baselines[seq] = dict(self.racers)
+        r.sent_at[seq] = now
+        # older than the acked baseline can't be used again
+        for old in [s for s in r.baselines if s < r.acked or s <= seq - BASELINES_KEPT]:
+            del r.baselines[old]
+            r.sent_at.pop(old, None)
+        r.stats.bytes_out += len(data)
+        self.send(data, r.addr)
+
+    def status(self):
+        return f"Hosting on port {self.port}  •  {len(self.remotes) + 1} players"
+
+    def take_stats(self):
+        out, inn = self.stats.rates()
+        n = max(1, len(self.remotes))
+        stats = {"net_clients": len(self.remotes),
+                 "net_kbps_out_per_client": round(out / n, 2),
+                 "net_kbps_in_per_client": round(inn / n, 2),
+                 "net_malformed": self.malformed}
+        rtts = [x for r in self.remotes.values() for x in r.stats.latency]
+        if rtts:
+            stats["net_rtt_ms_max"] = round(max(rtts), 2)
+        return stats
+
+    def _log_remote(self, r):
+        out, inn = r.stats.rates()
+        rtt = r.stats.percentiles()
+        log.info("[NET] P%d: %.2f KB/s down, %.2f KB/s up, snapshot rtt p50 %.1f / p95 %.1f ms",
+                 r.id + 1, out, inn, rtt.get("p50", 0.0), rtt.get("p95", 0.0))
+
+    def close(self):
+        for r in list(self.remotes.values()):
+            self._log_remote(r)
+            self.send(_HDR.pack(MAGIC, MSG_LEAVE), r.addr)
+        super().close()
+
+
+class NetClient(_Peer):
+    is_host = False
+
+    def __init__(self, host, port=DEFAULT_PORT, loss=0.0, seed=0):
+        super().__init__(("0.0.0.0", 0), loss, seed)
+        # resolved once: datagrams are accepted from exactly this address
+        self.host = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+        self.player_id = None
+        self.refused = False
+        self.race_id = 0
+        self.ack = 0                    # newest snapshot decoded
+        self.received = {}              # seq -> entries (baselines for the host's deltas)
+        self.inputs = deque()           # (seq, frame, dir) not acknowledged yet
+        self.input_seq = 0
+        self.sent_at = {}               # input seq -> perf_counter of the first send
+        self.history = {}               # frame -> (lane, x, t, queue) after that step
+        self.durations = {}             # frame -> move_duration used in that step
+        self.reconciled = 0
+        self.undecodable = 0
+        self.last_heard = time.perf_counter()
+        self.next_join = 0.0
+
+    def local_input(self, frame, direction):
+        """From Game.handle_key: a lane input applied locally on `frame`."""
+        self.input_seq += 1
+        self.inputs.append((self.input_seq, frame, direction))
+        self.sent_at[self.input_seq] = time.perf_counter()
+
+    def tick(self, game):
+        now = time.perf_counter()
+        if self.player_id is None and not self.refused and now >= self.next_join:
+            skin = SKINS.index(game.car_skin) if game.car_skin in SKINS else 0
+            self.send(_HDR.pack(MAGIC, MSG_JOIN)
+                      + _JOIN.pack(game.track.digest(), skin, game.difficulty is not None), self.host)
+            self.next_join = now + JOIN_RETRY
+        for kind, data, addr in self.receive():
+            if addr != self.host:
+                continue
+            try:
+                self._handle(game, kind, data, now)
+            except (struct.error, ValueError) as e:
+                self._malformed(addr, e)
+                continue
+            self.last_heard = now
+        if self.player_id is not None and now - self.last_heard > TIMEOUT:
+            log.warning("[NET] no snapshots for %.0f s", now - self.last_heard)
+            self.last_heard = now
+
+    def _handle(self, game, kind, data, now):
+        if kind == MSG_WELCOME:
+            (pid,) = _WELCOME.unpack_from(data, _HDR.size)
+            if pid >= MAX_PLAYERS:
+                raise ValueError(f"player id {pid}")
+            if pid == 0:
+                if not self.refused:
+                    log.warning("[NET] host refused us (full, or a different track)")
+                self.refused = True
+            elif self.player_id is None:
+                self.player_id = pid
+                log.info("[NET] joined as P%d", pid + 1)
+        elif kind == MSG_SNAPSHOT and self.player_id is not None:
+            self._snapshot(game, data, now)
+        elif kind == MSG_LEAVE:
+            log.warning("[NET] host left")
+            self.player_id = None
+
+    def after_step(self, game):
+        if game.state == "playing":
+            p = game.player
+            self.history[game.frame] = (p.lane, p.x, p.t, tuple(p.queue))
+            self.durations[game.frame] = p.move_duration
+            if game.frame % 120 == 0:
+                for d in (self.history, self.durations):
+                    for f in [f for f in d if f < game.frame - 600]:
+                        del d[f]
+        if self.player_id is None:
+            return
+        items = list(self.inputs)[-MAX_RESEND:]
+        data = [_HDR.pack(MAGIC, MSG_INPUT),
+                _INPUT.pack(self.race_id, self.ack, game.frame if game.state != "menu" else 0,
+                            len(items))]
+        data.extend(_INPUT_ITEM.pack(*i) for i in items)
+        self.send(b"".join(data), self.host)
+        self.place_models(self.player_id, game.road_scroll)
+
+    def _snapshot(self, game, data, now):
+        pos = _HDR.size
+        seq, base_seq, race_id, seed, race_frame, input_ack, roster, changed = _SNAP.unpack_from(data, pos)
+        pos += _SNAP.size
+        if base_seq and base_seq not in self.received:
+            self.undecodable += 1
+            return
+        if seq <= self.ack:
+            return  # late duplicate / reordered
+        entries, pos = decode_entries(data, pos, roster, changed, self.received.get(base_seq, {}))
+        frame, lane, x, t, nqueue = _SELF.unpack_from(data, pos)
+        pos += _SELF.size
+        queue = tuple(array("b", data[pos:pos + nqueue]))
+        if lane >= game.track.lanes or len(queue) != nqueue or any(d not in (-1, 1) for d in queue):
+            raise ValueError("own player state out of range")
+        self.received[seq] = entries
+        self.ack = seq
+        for old in [s for s in self.received if s <= seq - BASELINES_KEPT]:
+            del self.received[old]
+        self.racers = entries
+
+        while self.inputs and self.inputs[0][0] <= input_ack:
+            s = self.inputs.popleft()[0]
+            sent = self.sent_at.pop(s, None)
+            if sent is not None:
+                self.stats.latency.append((now - sent) * 1000.0)  # input -> acknowledged
+
+        if race_id and race_id != self.race_id:
+            self.race_id = race_id
+            self.inputs.clear()
+            self.sent_at.clear()
+            self.history.clear()
+            self.durations.clear()
+            game.reset(seed)
+            return
+
+        if game.state == "playing":
+            self.reconcile(game, frame, lane, x, t, queue)
+            mine = entries.get(self.player_id)
+            if mine and STATES[mine[6]] == "gameover" and mine[0] <= game.frame:
+                game.state = "gameover"  # the host's word on crashes is final
+
+    def reconcile(self, game, frame, lane, x, t, queue):
+        """Correct the predicted slide if the host's copy differs at `frame`."""
+        predicted = self.history.get(frame)
+        if predicted is None or predicted == (lane, x, t, queue):
+            return
+        self.reconciled += 1
+        p = game.player
+        p.lane, p.x, p.t, p.queue = lane, x, t, list(queue)
+        p.target_x = game.track.lane_x[lane]
+        self.history[frame] = (lane, x, t, queue)
+        inputs = game.inputs
+        i = bisect.bisect_left([f for f, _ in inputs], frame)
+        for f in range(frame, game.frame):
+            while i < len(inputs) and inputs[i][0] == f:
+                p.request_move(inputs[i][1], ())
+                i += 1
+            p.move_duration = self.durations.get(f + 1, p.move_duration)
+            p.update(SIM_DT, ())
+            self.history[f + 1] = (p.lane, p.x, p.t, tuple(p.queue))
+        game.lane = p.lane
+
+    def status(self):
+        if self.refused:
+            return "The host refused to let us join"
+        if self.player_id is None:
+            return f"Joining {self.host[0]}:{self.host[1]} ..."
+        return f"Joined as P{self.player_id + 1}  •  the host starts the race"
+
+    def take_stats(self):
+        out, inn = self.stats.rates()
+        stats = {"net_kbps_out": round(out, 2), "net_kbps_in": round(inn, 2),
+                 "net_reconciled": self.reconciled, "net_undecodable": self.undecodable,
+                 "net_malformed": self.malformed}
+        if self.stats.latency:
+            stats["net_input_ack_ms_max"] = round(max(self.stats.latency), 2)
+        return stats
+
+    def close(self):
+        out, inn = self.stats.rates()
+        lat = self.stats.percentiles()
+        log.info("[NET] %.2f KB/s down, %.2f KB/s up, input ack p50 %.1f / p95 %.1f ms, "
+                 "%d reconciliations", inn, out, lat.get("p50", 0.0), lat.get("p95", 0.0),
+                 self.reconciled)
+        if self.player_id is not None:
+            self.send(_HDR.pack(MAGIC, MSG_LEAVE), self.host)
+        super().close()
+
+
+# --- headless benchmark ---
+class _Bot(Simulation):
+    """Simulation with the bits of Game the net code uses."""
+    car_skin = DEFAULT_SKIN
+
+    def reset(self, seed=None):
+        self.start(seed)
+
+
+def bench(clients=3, seconds=10.0, loss=0.0, port=DEFAULT_PORT + 1, move_chance=0.03):
+    """Host + clients in one process over localhost UDP, real-time paced; returns a report."""
+    host_game = _Bot()
+    host = NetHost(host_game.track, port=port, bind="127.0.0.1", loss=loss)
+    bots = [(_Bot(adaptive=True), NetClient("127.0.0.1", port, loss=loss, seed=i + 1)) for i in range(clients)]
+    rng = random.Random(7)
+    for _, c in bots:
+        c.stats.rates()
+    host.stats.rates()
+
+    def step(game, net, playing_moves):
+        net.tick(game)
+        if game.state == "playing" and playing_moves and rng.random() < move_chance:
+            d = rng.choice((-1, 1))
+            game.move(d)
+            net.local_input(game.frame, d)
+        game.update(SIM_DT)
+        game.events.drain()
+        net.after_step(game)
+
+    races = 0
+    start = next_t = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        if len(host.remotes) == clients and host_game.state != "playing" and \
+                all(r.sim.state != "playing" for r in host.remotes.values()):
+            host_game.reset(random.randrange(2 ** 31))
+            host.start_race(host_game.seed)
+            races += 1
+        for g, c in bots:
+            step(g, c, True)
+        step(host_game, host, True)
+        next_t += SIM_DT
+        time.sleep(max(0.0, next_t - time.perf_counter()))
+
+    elapsed = time.perf_counter() - start
+
+    # let the host's copies catch up with the clients (sims paused, packets still flowing)
+    for _ in range(60):
+        for g, c in bots:
+            c.tick(g)
+            c.after_step(g)
+        host.tick(host_game)
+        host.after_step(host_game)
+        time.sleep(SIM_DT)
+    # every client's own run must match the host's authoritative copy
+    mismatched = 0
+    for g, c in bots:
+        r = next(r for r in host.remotes.values() if r.id == c.player_id)
+        if (g.frame, g.score, g.state) != (r.sim.frame, r.sim.score, r.sim.state):
+            mismatched += 1
+    down = sum(c.stats.bytes_in for _, c in bots) / clients / elapsed / 1024.0
+    up = sum(c.stats.bytes_out for _, c in bots) / clients / elapsed / 1024.0
+    snaps = sum(c.stats.packets_in for _, c in bots)
+    lat = sorted(x for _, c in bots for x in c.stats.latency)
+    rtt = sorted(x for r in host.remotes.values() for x in r.stats.latency)
+    report = {
+        "clients": clients, "races": races, "loss": loss,
+        "kb_s_down": down, "kb_s_up": up,
+        "bytes_per_snapshot": sum(c.stats.bytes_in for _, c in bots) / max(1, snaps),
+        "input_ack_ms_p50": lat[len(lat) // 2] if lat else 0.0,
+        "input_ack_ms_p95": lat[int(len(lat) * 0.95)] if lat else 0.0,
+        "rtt_ms_p50": rtt[len(rtt) // 2] if rtt else 0.0,
+        "reconciled": sum(c.reconciled for _, c in bots),
+        "mismatched": mismatched,
+    }
+    for _, c in bots:
+        c.sock.close()
+    host.sock.close()
+    return report
+
+
+def main(argv):
+    import argparse
+    import json
+    import os
+    ap = argparse.ArgumentParser(description="Lane3D LAN races")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("host", "join"):
+        p = sub.add_parser(name)
+        if name == "join":
+            p.add_argument("address")
+        p.add_argument("--port", type=int, default=DEFAULT_PORT)
+        p.add_argument("--offscreen", action="store_true")
+        p.add_argument("--script", help="scripted keys, as for controls.py")
+        p.add_argument("--duration", type=float, default=None)
+    b = sub.add_parser("bench", help="host + clients in one process over localhost UDP")
+    b.add_argument("--clients", type=int, default=3)
+    b.add_argument("--seconds", type=float, default=10.0)
+    b.add_argument("--loss", type=float, default=0.0)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        r = bench(min(args.clients, MAX_PLAYERS - 1), args.seconds, args.loss)
+        print(f"[NET] {r['clients']} clients, {r['races']} races, loss {r['loss']:.0%}: "
+              f"{r['kb_s_down']:.2f} KB/s down / {r['kb_s_up']:.2f} KB/s up per client, "
+              f"{r['bytes_per_snapshot']:.0f} B per snapshot")
+        print(f"[NET] input ack p50 {r['input_ack_ms_p50']:.1f} ms, p95 {r['input_ack_ms_p95']:.1f} ms; "
+              f"snapshot rtt p50 {r['rtt_ms_p50']:.1f} ms; {r['reconciled']} reconciliations, "
+              f"{r['mismatched']} runs differing from the host")
+        return
+
+    if args.offscreen:
+        os.environ["SDL_VIDEODRIVER"] = "offscreen"
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    from game import Game
+    game = Game(persist=False)
+    if args.cmd == "host":
+        game.attach_net(NetHost(game.track, port=args.port))
+    else:
+        game.attach_net(NetClient(args.address, args.port))
+    if args.script:
+        with open(args.script) as f:
+            game.input.play_script(json.load(f))
+    game.run(duration=args.duration)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
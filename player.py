@@ -1,171 +1,181 @@
 # player.py
 import math
+import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from utils import aabb
+from diagnostics import gl_created
+from glstate import gl, STATE_OPAQUE
 
 # Colors
 COL_PLAYER = (0.16, 0.65, 1.0)
 COL_PLAYER_HIT = (1.0, 0.26, 0.26)
 COL_PLAYER_COLLECT = (0.48, 1.0, 0.6)
 
+# Unit cube as 6 quads (24 vertices) in one contiguous float32 array.
+# draw_cube scales/offsets it into _cube_buf, which stays bound as the
+# vertex pointer, so a cube is one glDrawArrays instead of 24 glVertex3fv
+# calls converting Python tuples.
+_CUBE_CORNERS = np.array([
+    (-0.5, -0.5, -0.5), (0.5, -0.5, -0.5), (0.5, 0.5, -0.5), (-0.5, 0.5, -0.5),
+    (-0.5, -0.5, 0.5), (0.5, -0.5, 0.5), (0.5, 0.5, 0.5), (-0.5, 0.5, 0.5),
+], dtype=np.float32)
+_CUBE_FACES = [
+    (0, 1, 2, 3),
+    (4, 5, 6, 7),
+    (0, 1, 5, 4),
+    (2, 3, 7, 6),
+    (1, 2, 6, 5),
+    (0, 3, 7, 4),
+]
+_UNIT_CUBE = np.ascontiguousarray(_CUBE_CORNERS[np.array(_CUBE_FACES).ravel()])
+_cube_buf = np.empty_like(_UNIT_CUBE)
+
+def init_gl():
+    """Per-context setup for draw_cube (call once after the GL context exists)."""
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(3, GL_FLOAT, 0, _cube_buf)
+
 def draw_cube(center, size, color):
-    cx, cy, cz = center
-    sx, sy, sz = size[0] / 2.0, size[1] / 2.0, size[2] / 2.0
-    verts = [
-        (cx - sx, cy - sy, cz - sz),
-        (cx + sx, cy - sy, cz - sz),
-        (cx + sx, cy + sy, cz - sz),
-        (cx - sx, cy + sy, cz - sz),
-        (cx - sx, cy - sy, cz + sz),
-        (cx + sx, cy - sy, cz + sz),
-        (cx + sx, cy + sy, cz + sz),
-        (cx - sx, cy + sy, cz + sz),
-    ]
-    faces = [
-        (0, 1, 2, 3),
-        (4, 5, 6, 7),
-        (0, 1, 5, 4),
-        (2, 3, 7, 6),
-        (1, 2, 6, 5),
-        (0, 3, 7, 4),
-    ]
-    glColor3f(*color)
-    glBegin(GL_QUADS)
-    for f in faces:
-        for vi in f:
-            glVertex3fv(verts[vi])
-    glEnd()
-
-def draw_cylinder(center, radius, height, axis='x', color=(0.0,0.0,0.0)):
-    glColor3f(*color)
-    quad = gluNewQuadric()
+    gl.color(color)
+    np.multiply(_UNIT_CUBE, size, out=_cube_buf)
+    np.add(_cube_buf, center, out=_cube_buf)
+    glDrawArrays(GL_QUADS, 0, 24)
+
+_quadric = None
+
+def get_quadric():
+    """One GLU quadric for every cylinder/disk; creating one per call leaked them."""
+    global _quadric
+    if _quadric is None:
+        _quadric = gluNewQuadric()
+        gl_created("quadrics")
+    return _quadric
+
+def draw_cylinder(center, radius, height, axis='x', color=(0.0,0.0,0.0), slices=12):
+    """Capped cylinder along `axis`. Cheap inside a display list, costly per frame."""
+    gl.color(color)
+    quad = get_quadric()
     cx, cy, cz = center
     glPushMatrix()
+    glTranslatef(cx, cy, cz)
+    # gluCylinder extrudes along local +Z
     if axis == 'x':
-        glTranslatef(cx, cy, cz)
-        glRotatef(90, 0, 0, 1)
-    elif axis == 'z':
-        glTranslatef(cx, cy, cz)
-        glRotatef(90, 1, 0, 0)
-    else:
-        glTranslatef(cx, cy, cz)
-    glTranslatef(0, -height/2.0, 0)
-    gluCylinder(quad, radius, radius, height, 12, 1)
-    glPushMatrix(); glRotatef(180, 1,0,0); gluDisk(quad, 0, radius, 12, 1); glPopMatrix()
-    glTranslatef(0, height, 0); gluDisk(quad, 0, radius, 12, 1)
+        glRotatef(90, 0, 1, 0)
+    elif axis == 'y':
+        glRotatef(-90, 1, 0, 0)
+    glTranslatef(0, 0, -height/2.0)
+    gluCylinder(quad, radius, radius, height, slices, 1)
+    glPushMatrix(); glRotatef(180, 1,0,0); gluDisk(quad, 0, radius, slices, 1); glPopMatrix()
+    glTranslatef(0, 0, height); gluDisk(quad, 0, radius, slices, 1)
     glPopMatrix()
-    gluDeleteQuadric(quad)
+
+
+# ======================
+# CAR SKINS
+# ======================
+# Parts are in model space (car origin at 0,0,0, +Z = front):
+#   (center, size, color, tilt about X in degrees)
+# color "body" takes the car's tint, "dark" the tint * 0.7.
+GLASS = (0.08, 0.12, 0.18)
+TRIM = (0.75, 0.75, 0.78)
+WHEEL = (0.12, 0.12, 0.14)
+LIGHT = (1.0, 1.0, 0.85)
+TAIL = (0.9, 0.15, 0.15)
+
+def _lamps(z_head, z_tail):
+    return [((side * 0.55, 0.15, z_head), (0.25, 0.18, 0.12), LIGHT, 0) for side in (-1, 1)] + \
+           [((side * 0.55, 0.2, z_tail), (0.25, 0.15, 0.12), TAIL, 0) for side in (-1, 1)]
+
+CAR_SKINS = {
+    "sedan": {
+        "parts": [
+            ((0, 0.25, 0), (1.9, 0.5, 3.2), "body", 0),        # main body
+            ((0, 0.7, 0.3), (1.3, 0.45, 1.6), "dark", 0),      # roof
+            ((0, 0.2, 1.9), (1.8, 0.35, 0.6), "dark", 0),      # hood
+            ((0, 0.7, 1.1), (1.2, 0.35, 0.1), GLASS, -20),     # windshield
+            ((0, 0.7, -0.7), (1.2, 0.35, 0.1), GLASS, 15),     # rear window
+            ((0, 0.05, 2.25), (1.9, 0.15, 0.25), TRIM, 0),     # front bumper
+            ((0, 0.05, -2.15), (1.9, 0.15, 0.2), TRIM, 0),     # rear bumper
+        ] + _lamps(2.1, -2.0),
+        # (radius, width, centers)
+        "wheels": (0.3, 0.25, [(side * 1.05, -0.25, dz) for side in (-1, 1) for dz in (1.25, -1.25)]),
+    },
+    "sport": {
+        "parts": [
+            ((0, 0.2, 0), (1.9, 0.4, 3.4), "body", 0),
+            ((0, 0.55, -0.1), (1.2, 0.3, 1.3), "dark", 0),
+            ((0, 0.55, 0.7), (1.1, 0.28, 0.1), GLASS, -35),
+            ((0, 0.55, -0.8), (1.1, 0.25, 0.1), GLASS, 30),
+            ((0, 0.75, -1.6), (1.8, 0.08, 0.35), "dark", 0),   # spoiler wing
+            ((0, 0.5, -1.6), (0.1, 0.45, 0.1), TRIM, 0),       # spoiler post
+            ((0, 0.0, 2.2), (1.9, 0.12, 0.25), TRIM, 0),
+            ((0, 0.0, -2.05), (1.9, 0.12, 0.2), TRIM, 0),
+        ] + _lamps(2.05, -1.95),
+        "wheels": (0.32, 0.3, [(side * 1.05, -0.25, dz) for side in (-1, 1) for dz in (1.3, -1.2)]),
+    },
+    "van": {
+        "parts": [
+            ((0, 0.45, -0.2), (1.9, 0.9, 3.0), "body", 0),
+            ((0, 0.25, 1.6), (1.9, 0.5, 0.8), "dark", 0),
+            ((0, 0.65, 1.25), (1.6, 0.4, 0.1), GLASS, -25),
+            ((0, 0.05, 2.1), (1.9, 0.15, 0.25), TRIM, 0),
+            ((0, 0.05, -1.8), (1.9, 0.15, 0.2), TRIM, 0),
+        ] + _lamps(2.0, -1.75),
+        "wheels": (0.3, 0.25, [(side * 1.05, -0.25, dz) for side in (-1, 1) for dz in (1.25, -1.1)]),
+    },
+}
+DEFAULT_SKIN = "sedan"
+
+_car_lists = {}  # (skin, tint) -> display list
+
+def car_mesh(skin, tint):
+    """Display list for a skin in one tint, compiled on first use."""
+    key = (skin, tint)
+    lst = _car_lists.get(key)
+    if lst is None:
+        spec = CAR_SKINS[skin]
+        dark = tuple(c * 0.7 for c in tint)
+        lst = glGenLists(1)
+        gl_created("display_lists")
+        glNewList(lst, GL_COMPILE)
+        with gl.compiling():
+            for center, size, color, tilt in spec["parts"]:
+                color = tint if color == "body" else dark if color == "dark" else color
+                if tilt:
+                    glPushMatrix()
+                    glTranslatef(*center)
+                    glRotatef(tilt, 1, 0, 0)
+                    draw_cube((0, 0, 0), size, color)
+                    glPopMatrix()
+                else:
+                    draw_cube(center, size, color)
+            radius, width, centers = spec["wheels"]
+            for c in centers:
+                draw_cylinder(c, radius, width, axis='x', color=WHEEL, slices=16)
+        glEndList()
+        _car_lists[key] = lst
+    return lst
 
 class CarModel:
-    def __init__(self, x, y, z):
+    def __init__(self, x, y, z, skin=DEFAULT_SKIN):
         self.x, self.y, self.z = x, y, z
         self.w, self.h, self.d = 1.8, 0.8, 3.0
         self.color = COL_PLAYER
+        self.skin = skin
 
     def draw(self):
-        x, y, z = self.x, self.y, self.z
-
-        body_color = self.color
-        dark = tuple(c * 0.7 for c in body_color)
-        glass = (0.08, 0.12, 0.18)
-        trim = (0.75, 0.75, 0.78)
-        wheel = (0.12, 0.12, 0.14)
-        light = (1.0, 1.0, 0.85)
-        tail = (0.9, 0.15, 0.15)
-
-    # ======================
-    # MAIN BODY
-    # ======================
-        draw_cube(
-            (x, y + 0.25, z),
-            (1.9, 0.5, 3.2),
-            body_color
-        )
-
-    # ======================
-    # ROOF
-    # ======================
-        draw_cube(
-            (x, y + 0.7, z + 0.3),
-            (1.3, 0.45, 1.6),
-            dark
-        )
-
-    # ======================
-    # HOOD
-    # ======================
-        draw_cube(
-            (x, y + 0.2, z + 1.9),
-            (1.8, 0.35, 0.6),
-            dark
-        )
-
-    # ======================
-    # WINDSHIELD
-    # ======================
+        # baked once per (skin, tint); flashes just pick another list
         glPushMatrix()
-        glTranslatef(x, y + 0.7, z + 1.1)
-        glRotatef(-20, 1, 0, 0)
-        draw_cube((0, 0, 0), (1.2, 0.35, 0.1), glass)
+        glTranslatef(self.x, self.y, self.z)
+        glCallList(car_mesh(self.skin, self.color))
         glPopMatrix()
-
-    # ======================
-    # REAR WINDOW
-    # ======================
-        glPushMatrix()
-        glTranslatef(x, y + 0.7, z - 0.7)
-        glRotatef(15, 1, 0, 0)
-        draw_cube((0, 0, 0), (1.2, 0.35, 0.1), glass)
-        glPopMatrix()
-
-    # ======================
-    # HEADLIGHTS
-    # ======================
-        for side in (-1, 1):
-            draw_cube(
-                (x + side * 0.55, y + 0.15, z + 2.1),
-                (0.25, 0.18, 0.12),
-                light
-            )
-
-    # ======================
-    # TAILLIGHTS
-    # ======================
-        for side in (-1, 1):
-            draw_cube(
-                (x + side * 0.55, y + 0.2, z - 2.0),
-                (0.25, 0.15, 0.12),
-                tail
-            )
-
-    # ======================
-    # BUMPERS
-    # ======================
-        draw_cube((x, y + 0.05, z + 2.25), (1.9, 0.15, 0.25), trim)
-        draw_cube((x, y + 0.05, z - 2.15), (1.9, 0.15, 0.2), trim)
-
-  
-        # ======================
-        # WHEELS (fixed & clean)
-        # ======================
-        wheel_y = y - 0.25
-        wheel_w = 0.25   # thickness
-        wheel_h = 0.35   # height
-        wheel_d = 0.6    # diameter
-
-        for side in (-1, 1):
-            for dz in (1.25, -1.25):
-                draw_cube(
-                    (x + side * 1.05, wheel_y, z + dz),
-                    (wheel_w, wheel_h, wheel_d),
-                    wheel
-                )
-
-
+        gl.forget_color()
 
 
 class Player:
+    state_key = STATE_OPAQUE
+
     def __init__(self, lane_x_list, start_lane, y, z):
         # lane_x_list: list of lane center x coordinates
         self.lane_x_list = lane_x_list
@@ -185,6 +195,17 @@ class Player:
         self.queue = []
         self.model = CarModel(self.x, self.y, self.z)
 
+    def reset(self, start_lane):
+        """Back to the start of a run, keeping this object (and its model)."""
+        self.lane = start_lane
+        self.x = self.target_x = self.prev_x = self.lane_x_list[start_lane]
+        self.color = COL_PLAYER
+        self.move_duration = 0.045
+        self.t = 1.0
+        self.flash = 0.0
+        self.queue.clear()
+        self.model.x = self.x
+
     def rect(self):
         hx, hy, hz = self.w / 2.0, self.h / 2.0, self.d / 2.0
         return ((self.x - hx, self.y - hy, self.z - hz), (self.x + hx, self.y + hy, self.z + hz))
@@ -0,0 +1,333 @@
+# replay.py - run recordings and headless score verification
+#
+# A recording is the run seed plus every lane input tagged with the
+# simulation frame it was applied on. Simulation is deterministic at a fixed
+# timestep, so replaying the inputs must reproduce the claimed score, max
+# combo and crash frame exactly. Verification also checks the run was played
+# on the expected track and difficulty mode (by default the default track,
+# adaptive), otherwise an easier custom road would verify just as well.
+#
+#   python replay.py verify lane3d_bestrun.json
+#   python replay.py verify submissions/*.json --workers 8
+#   python replay.py verify runs/*.json --track wide.json --difficulty fixed
+#   python replay.py events lane3d_lastrun.json        (event stream as JSON lines)
+#   python replay.py bench --runs 2000 --workers 8     (synthetic throughput test)
+#   python replay.py states rec.json --every 60 --out rec.states
+#   python replay.py desync rec.json rec.states        (first checkpoint this build disagrees with)
+import argparse
+import bisect
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from simulation import Simulation, SIM_FPS
+from events import EventRecorder
+from track import Track, DEFAULT_TRACK
+
+REPLAY_VERSION = 4  # 2: continuous (time-of-impact) collision rules, 3: near-miss bonus,
+                    # 4: adaptive difficulty counts only accepted lane changes
+LAST_RUN_FILE = "lane3d_lastrun.json"
+BEST_RUN_FILE = "lane3d_bestrun.json"
+
+# Safety margin so a doctored recording can't keep a verifier busy forever
+MAX_EXTRA_FRAMES = 2
+
+
+def recording_from(sim):
+    """Snapshot a finished Simulation run as a plain dict."""
+    return {
+        "version": REPLAY_VERSION,
+        "fps": SIM_FPS,
+        "seed": sim.seed,
+        "frames": sim.frame,
+        "score": sim.score,
+        "max_combo": sim.max_combo,
+        "impact_time": sim.impact_time,
+        "track": sim.track.to_dict(),
+        "difficulty": "fixed" if sim.difficulty is None else "adaptive",
+        "inputs": [list(i) for i in sim.inputs],
+    }
+
+
+def save_run(sim, path):
+    try:
+        with open(path, "w") as f:
+            json.dump(recording_from(sim), f, separators=(",", ":"))
+    except OSError:
+        pass
+
+
+def load_run(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def simulation_for(rec):
+    """
+    A Simulation on the recording's track and difficulty mode (recordings
+    without them used the default track and the fixed curve).
+    """
+    return Simulation(track=Track.from_dict(rec["track"]) if "track" in rec else None,
+                      adaptive=rec.get("difficulty") == "adaptive")
+
+
+def simulate(rec, max_frames=None, sim=None):
+    """Re-run a recording headlessly; returns the finished Simulation."""
+    sim = sim or simulation_for(rec)
+    sim.start(int(rec["seed"]))
+    dt = 1.0 / rec.get("fps", SIM_FPS)
+    inputs = rec["inputs"]
+    if max_frames is None:
+        max_frames = int(rec["frames"]) + MAX_EXTRA_FRAMES
+
+    i = 0
+    n = len(inputs)
+    while sim.state == "playing" and sim.frame < max_frames:
+        while i < n and inputs[i][0] <= sim.frame:
+            sim.move(inputs[i][1])
+            i += 1
+        sim.update(dt)
+        sim.events.drain()
+    return sim
+
+
+def advance(sim, rec, until):
+    """Step a (possibly restored) simulation up to frame `until`, feeding the recording's inputs."""
+    inputs = rec["inputs"]
+    dt = 1.0 / rec.get("fps", SIM_FPS)
+    i = bisect.bisect_left([f for f, _ in inputs], sim.frame)
+    while sim.state == "playing" and sim.frame < until:
+        while i < len(inputs) and inputs[i][0] <= sim.frame:
+            sim.move(inputs[i][1])
+            i += 1
+        sim.update(dt)
+        sim.events.drain()
+    return sim
+
+
+def write_states(rec, path, every=60):
+    """Re-simulate a recording, saving a savestate every `every` frames to one file."""
+    from savestate import save_state
+    sim = simulation_for(rec)
+    sim.start(int(rec["seed"]))
+    n = 0
+    with open(path, "wb") as f:
+        while True:
+            data = save_state(sim)
+            f.write(len(data).to_bytes(4, "little") + data)
+            n += 1
+            if sim.state != "playing":
+                return n
+            advance(sim, rec, sim.frame + every)
+
+
+def read_states(path):
+    with open(path, "rb") as f:
+        blob = f.read()
+    out, pos = [], 0
+    while pos < len(blob):
+        n = int.from_bytes(blob[pos:pos + 4], "little")
+        out.append(blob[pos + 4:pos + 4 + n])
+        pos += 4 + n
+    return out
+
+
+def find_desync(rec, states):
+    """
+    Check each checkpoint-to-checkpoint transition of a states file against
+    this build: restore checkpoint k, step to checkpoint k+1's frame, compare.
+    Transitions are independent, so the first mismatch pins the desync to one
+    interval. Returns None, or (from_frame, to_frame, differing sections).
+    """
+    from savestate import save_state, load_state, diff_states
+    sim = simulation_for(rec)
+    for a, b in zip(states, states[1:]):
+        load_state(sim, b)
+        target = sim.frame
+        load_state(sim, a)
+        start = sim.frame
+        advance(sim, rec, target)
+        got = save_state(sim)
+        if got != b:
+            return start, target, diff_states(got, b)
+    return None
+
+
+def event_stream(rec):
+    """Re-simulate a recording and return its full event stream."""
+    sim = simulation_for(rec)
+    recorder = EventRecorder(sim.events)
+    simulate(rec, sim=sim)
+    return recorder.as_dicts()
+
+
+def run_conditions(rec):
+    """(track dict, difficulty mode) a recording was played under."""
+    if "track" not in rec:
+        return DEFAULT_TRACK.to_dict(), rec.get("difficulty", "fixed")
+    if not isinstance(rec["track"], dict):
+        raise TypeError(f"track is {type(rec['track']).__name__}, not an object")
+    return Track.from_dict(rec["track"]).to_dict(), rec.get("difficulty", "fixed")
+
+
+def verify(rec, track=None, difficulty="adaptive"):
+    """
+    Returns (ok, reason). Never raises on malformed input. The run must have
+    been played on `track` (a Track dict; None = the default track) in
+    `difficulty` mode ("adaptive" or "fixed"; None = either).
+    """
+    try:
+        if rec.get("version") != REPLAY_VERSION:
+            return False, f"unsupported version {rec.get('version')!r}"
+        if rec.get("fps", SIM_FPS) != SIM_FPS:
+            return False, f"unsupported fps {rec.get('fps')!r}"
+        played_on, mode = run_conditions(rec)
+        expected = (Track.from_dict(track) if track is not None else DEFAULT_TRACK).to_dict()
+        if played_on != expected:
+            differ = ", ".join(f"{k}={played_on[k]!r}" for k in expected if played_on[k] != expected[k])
+            return False, f"played on another track ({differ})"
+        if difficulty is not None and mode != difficulty:
+            return False, f"played with {mode} difficulty, expected {difficulty}"
+        frames = [f for f, _ in rec["inputs"]]
+        if frames != sorted(frames) or any(d not in (-1, 1) for _, d in rec["inputs"]):
+            return False, "malformed inputs"
+        sim = simulate(rec)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return False, f"malformed recording: {e}"
+
+    if sim.state != "gameover":
+        return False, f"run did not end at frame {rec['frames']}"
+    if sim.frame != rec["frames"]:
+        return False, f"crash at frame {sim.frame}, claimed {rec['frames']}"
+    if sim.score != rec["score"]:
+        return False, f"score {sim.score}, claimed {rec['score']}"
+    if sim.max_combo != rec["max_combo"]:
+        return False, f"max combo {sim.max_combo}, claimed {rec['max_combo']}"
+    return True, f"ok ({mode}, {played_on['lanes']} lanes)"
+
+
+def _verify_one(rec, track=None, difficulty="adaptive"):
+    ok, reason = verify(rec, track, difficulty)
+    return ok, reason, rec["frames"] if ok else 0
+
+
+def verify_batch(recs, workers=None, chunksize=16, track=None, difficulty="adaptive"):
+    """
+    Verify many recordings across a process pool (track/difficulty as in verify).
+    Returns (results, stats) where results is [(ok, reason), ...] in input order.
+    """
+    t0 = time.perf_counter()
+    check = partial(_verify_one, track=track, difficulty=difficulty)
+    if workers == 1:
+        out = [check(r) for r in recs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            out = list(pool.map(check, recs, chunksize=chunksize))
+    elapsed = time.perf_counter() - t0
+
+    sim_frames = sum(f for _, _, f in out)
+    stats = {
+        "runs": len(recs),
+        "accepted": sum(1 for ok, _, _ in out if ok),
+        "seconds": elapsed,
+        "runs_per_min": len(recs) / elapsed * 60.0 if elapsed > 0 else 0.0,
+        "sim_frames_per_s": sim_frames / elapsed if elapsed > 0 else 0.0,
+        "realtime_factor": sim_frames / SIM_FPS / elapsed if elapsed > 0 else 0.0,
+    }
+    return [(ok, reason) for ok, reason, _ in out], stats
+
+
+def bot_recording(seed, lane_change_chance=0.03):
+    """Play a random bot run headlessly and record it (for benchmarks)."""
+    bot = random.Random(seed ^ 0x5EED)
+    sim = Simulation(adaptive=True)  # the game's default mode, which verify expects
+    sim.start(seed)
+    dt = 1.0 / SIM_FPS
+    while sim.state == "playing":
+        if bot.random() < lane_change_chance:
+            sim.move(bot.choice((-1, 1)))
+        sim.update(dt)
+    return recording_from(sim)
+
+
+def print_stats(stats):
+    print(f"[VERIFY] {stats['accepted']}/{stats['runs']} accepted in {stats['seconds']:.2f}s  "
+          f"({stats['runs_per_min']:.0f} runs/min, {stats['sim_frames_per_s']:.0f} sim frames/s, "
+          f"{stats['realtime_factor']:.0f}x real time)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lane3D run recordings")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    v = sub.add_parser("verify", help="re-simulate recordings and check claimed scores")
+    v.add_argument("files", nargs="+")
+    v.add_argument("--workers", type=int, default=None)
+    v.add_argument("--track", help="track file the runs must be played on (default: the default track)")
+    v.add_argument("--difficulty", choices=("adaptive", "fixed", "any"), default="adaptive",
+                   help="difficulty mode the runs must be played in (default: adaptive)")
+
+    e = sub.add_parser("events", help="print the event stream of a recording as JSON lines")
+    e.add_argument("file")
+
+    st = sub.add_parser("states", help="save a savestate every N frames of a recording")
+    st.add_argument("file")
+    st.add_argument("--every", type=int, default=60)
+    st.add_argument("--out", required=True)
+
+    d = sub.add_parser("desync", help="find the first checkpoint interval this build disagrees with")
+    d.add_argument("file")
+    d.add_argument("states")
+
+    b = sub.add_parser("bench", help="verify synthetic bot runs to measure throughput")
+    b.add_argument("--runs", type=int, default=500)
+    b.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.cmd == "verify":
+        recs = []
+        for path in args.files:
+            try:
+                recs.append(load_run(path))
+            except (OSError, ValueError) as e:
+                recs.append({"error": str(e)})
+        track = Track.load(args.track).to_dict() if args.track else None
+        difficulty = None if args.difficulty == "any" else args.difficulty
+        results, stats = verify_batch(recs, args.workers, track=track, difficulty=difficulty)
+        for path, (ok, reason) in zip(args.files, results):
+            print(f"{'ACCEPT' if ok else 'REJECT'}  {path}: {reason}")
+        print_stats(stats)
+        sys.exit(0 if stats["accepted"] == stats["runs"] else 1)
+
+    if args.cmd == "events":
+        for event in event_stream(load_run(args.file)):
+            print(json.dumps(event))
+        return
+
+    if args.cmd == "states":
+        n = write_states(load_run(args.file), args.out, args.every)
+        print(f"[STATES] {n} checkpoints every {args.every} frames -> {args.out}")
+        return
+
+    if args.cmd == "desync":
+        found = find_desync(load_run(args.file), read_states(args.states))
+        if found is None:
+            print("[DESYNC] none: every checkpoint matches")
+            return
+        start, end, sections = found
+        print(f"[DESYNC] frames {start}..{end}: {', '.join(sections)} differ")
+        sys.exit(1)
+
+    recs = [bot_recording(seed) for seed in range(args.runs)]
+    # tamper with every 10th run so rejection is exercised too
+    for rec in recs[::10]:
+        rec["score"] += 10
+    results, stats = verify_batch(recs, args.workers)
+    print_stats(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# savestate.py - compact binary snapshots of a running simulation
+#
+# A state is everything Simulation.update reads: counters, timers, the
+# player's slide, every obstacle and coin, the recorded inputs and the RNG
+# state, so stepping a loaded state gives exactly the frames the original
+# would have. Fixed-size parts are struct-packed, variable-length tables are
+# raw array('d') / array('i') blocks behind a count, so save and load are a
+# single pass over the entities (no pickle, no per-field tags).
+#
+# Game adds the world around the road (buildings, building spawn cursor);
+# runs with adaptive difficulty add the controller's rolling window.
+# Particles and the global `random` stream buildings draw from are cosmetic
+# and not saved. Save between steps: events still waiting in the bus are not
+# part of the state.
+#
+#   python savestate.py bench --entities 20000      (save / load timings)
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+
+from spawner import Obstacle, Coin, Building
+from player import Player
+from replay import REPLAY_VERSION
+from difficulty import LEVELS
+
+MAGIC = b"L3DS"
+SAVESTATE_VERSION = 2  # 2: near-miss count
+RESUME_FILE = "lane3d_resume.bin"
+
+FLAG_WORLD = 1       # buildings block present
+FLAG_DIFFICULTY = 2  # adaptive difficulty controller block present
+
+STATES = ("menu", "playing", "gameover")
+
+# magic, format version, rules version (replay.REPLAY_VERSION), flags
+_HEADER = struct.Struct("<4sHHH")
+# lanes, lane spacing: a state only loads on the track it was saved on
+_TRACK = struct.Struct("<Bd")
+# seed, frame, state, score, combo, max_combo, near_misses, speed_tier, lane,
+# spawn_timer, spawn_interval, speed, combo_timer, road_scroll, impact_time (NaN = None)
+_SIM = struct.Struct("<qIBqiiiiidddddd")
+# lane, x, target_x, prev_x, y, z, color rgb, move_duration, t, flash, queued moves
+_PLAYER = struct.Struct("<i11dB")
+# random.Random state: version, has gauss_next, gauss_next (+ 625 uint32 words after)
+_RNG = struct.Struct("<i?d")
+_COUNT = struct.Struct("<I")
+
+OBSTACLE_FIELDS = 7   # lane, x, y, z, w, h, d
+COIN_FIELDS = 8       # lane, x, y, z, w, h, d, rotation
+BUILDING_FIELDS = 12  # x, y, z, w, h, d, color rgb, window tint rgb
+
+
+def _put_array(out, arr):
+    out.append(_COUNT.pack(len(arr)))
+    out.append(arr.tobytes())
+
+
+def _get_array(data, pos, typecode):
+    (n,) = _COUNT.unpack_from(data, pos)
+    pos += _COUNT.size
+    arr = array(typecode)
+    end = pos + n * arr.itemsize
+    if end > len(data):
+        raise ValueError("truncated state")
+    arr.frombytes(data[pos:end])
+    return arr, end
+
+
+def save_state(sim):
+    """Serialize a Simulation (or Game) to bytes."""
+    world = getattr(sim, "buildings", None) is not None
+    flags = (FLAG_WORLD if world else 0) | (FLAG_DIFFICULTY if sim.difficulty is not None else 0)
+    out = [_HEADER.pack(MAGIC, SAVESTATE_VERSION, REPLAY_VERSION, flags),
+           _TRACK.pack(sim.track.lanes, sim.track.spacing)]
+
+    impact = float("nan") if sim.impact_time is None else sim.impact_time
+    out.append(_SIM.pack(sim.seed, sim.frame, STATES.index(sim.state), sim.score, sim.combo,
+                         sim.max_combo, sim.near_misses, sim.speed_tier, sim.lane, sim.spawn_timer,
+                         sim.spawn_interval, sim.speed, sim.combo_timer, sim.road_scroll, impact))
+
+    p = sim.player
+    out.append(_PLAYER.pack(p.lane, p.x, p.target_x, p.prev_x, p.y, p.z, *p.color,
+                            p.move_duration, p.t, p.flash, len(p.queue)))
+    out.append(array("b", p.queue).tobytes())
+
+    version, words, gauss = sim.rng.getstate()
+    out.append(_RNG.pack(version, gauss is not None, gauss or 0.0))
+    out.append(array("I", words).tobytes())
+
+    _put_array(out, array("i", [v for step in sim.inputs for v in step]))
+    _put_array(out, array("d", [v for o in sim.obstacles
+                                for v in (o.lane, o.x, o.y, o.z, o.w, o.h, o.d)]))
+    _put_array(out, array("d", [v for c in sim.coins
+                                for v in (c.lane, c.x, c.y, c.z, c.w, c.h, c.d, c.rotation)]))
+    if sim.difficulty is not None:
+        _put_array(out, array("d", sim.difficulty.state()))
+    if world:
+        out.append(struct.pack("<d", sim.next_building_spawn_z))
+        _put_array(out, array("d", [v for b in sim.buildings
+                                    for v in (b.x, b.y, b.z, b.w, b.h, b.d) + b.color + b.window_tint]))
+    return b"".join(out)
+
+
+def load_state(sim, data):
+    """
+    Restore bytes from save_state into `sim` in place. Raises ValueError for
+    data from another format / rules version or another track.
+    """
+    data = memoryview(data)
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated state")
+    magic, version, rules, flags = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a Lane3D state")
+    if version != SAVESTATE_VERSION:
+        raise ValueError(f"unsupported state version {version}")
+    if rules != REPLAY_VERSION:
+        raise ValueError(f"state saved under rules version {rules}, running {REPLAY_VERSION}")
+    try:
+        return _load(sim, data, flags)
+    except struct.error as e:
+        raise ValueError(f"truncated state: {e}")
+    except IndexError as e:
+        raise ValueError(f"corrupt state: {e}")
+
+
+def _load(sim, data, flags):
+    pos = _HEADER.size
+    lanes, spacing = _TRACK.unpack_from(data, pos)
+    pos += _TRACK.size
+    if (lanes, spacing) != (sim.track.lanes, sim.track.spacing):
+        raise ValueError(f"state is for a {lanes}-lane track, this one has {sim.track.lanes}")
+
+    (seed, frame, state, score, combo, max_combo, near_misses, speed_tier, lane, spawn_timer,
+     spawn_interval, speed, combo_timer, road_scroll, impact) = _SIM.unpack_from(data, pos)
+    pos += _SIM.size
+
+    fields = _PLAYER.unpack_from(data, pos)
+    pos += _PLAYER.size
+    nqueue = fields[-1]
+    if pos + nqueue > len(data):
+        raise ValueError("truncated state")
+    queue = array("b", bytes(data[pos:pos + nqueue])).tolist()
+    pos += nqueue
+    if state >= len(STATES):
+        raise ValueError(f"unknown run state {state}")
+    if not (0 <= lane < lanes and 0 <= fields[0] < lanes):
+        raise ValueError(f"lane out of range for a {lanes}-lane track")
+    if any(d not in (-1, 1) for d in queue):
+        raise ValueError("bad queued move")
+
+    rng_version, has_gauss, gauss = _RNG.unpack_from(data, pos)
+    pos += _RNG.size
+    words = array("I")
+    if pos + 625 * words.itemsize > len(data):
+        raise ValueError("truncated state")
+    words.frombytes(data[pos:pos + 625 * words.itemsize])
+    pos += 625 * words.itemsize
+
+    inputs, pos = _get_array(data, pos, "i")
+    if len(inputs) % 2 or any(d not in (-1, 1) for d in inputs[1::2]):
+        raise ValueError("bad recorded inputs")
+    obstacles, pos = _get_array(data, pos, "d")
+    coins, pos = _get_array(data, pos, "d")
+    if bool(flags & FLAG_DIFFICULTY) != (sim.difficulty is not None):
+        raise ValueError("state and simulation disagree on adaptive difficulty")
+    if flags & FLAG_DIFFICULTY:
+        difficulty, pos = _get_array(data, pos, "d")
+        if len(difficulty) != len(sim.difficulty.state()):
+            raise ValueError("difficulty block has the wrong size")
+        level, head, filled = difficulty[0], difficulty[4], difficulty[5]
+        window = sim.difficulty.window
+        if not (0 <= level < len(LEVELS) and 0 <= head < window and 0 <= filled <= window):
+            raise ValueError("difficulty block out of range")
+    world = flags & FLAG_WORLD and hasattr(sim, "buildings")
+    if world:
+        (spawn_z,) = struct.unpack_from("<d", data, pos)
+        buildings, pos = _get_array(data, pos + 8, "d")
+
+    # Everything parsed; only now touch the simulation
+    sim.seed, sim.frame, sim.state = seed, frame, STATES[state]
+    sim.score, sim.combo, sim.max_combo = score, combo, max_combo
+    sim.near_misses = near_misses
+    sim.speed_tier, sim.lane = speed_tier, lane
+    sim.spawn_timer, sim.spawn_interval, sim.speed = spawn_timer, spawn_interval, speed
+    sim.combo_timer, sim.road_scroll = combo_timer, road_scroll
+    sim.impact_time = None if impact != impact else impact
+    sim.rng.setstate((rng_version, tuple(words), gauss if has_gauss else None))
+    sim.inputs = list(zip(inputs[0::2], inputs[1::2]))
+    if sim.difficulty is not None:
+        sim.difficulty.set_state(difficulty)
+        sim.difficulty.apply(sim)
+
+    p = Player(sim.track.lane_x, start_lane=fields[0], y=fields[4], z=fields[5])
+    p.x, p.target_x, p.prev_x = fields[1:4]
+    p.color = tuple(fields[6:9])
+    p.move_duration, p.t, p.flash = fields[9:12]
+    p.queue = queue
+    p.model.x = p.x
+    sim.player = p
+
+    sim.obstacles = []
+    for i in range(0, len(obstacles), OBSTACLE_FIELDS):
+        ln, x, y, z, w, h, d = obstacles[i:i + OBSTACLE_FIELDS]
+        o = Obstacle(int(ln), x, z, width=w, height=h)
+        o.y, o.d = y, d
+        sim.obstacles.append(o)
+    sim.coins = []
+    for i in range(0, len(coins), COIN_FIELDS):
+        ln, x, y, z, w, h, d, rot = coins[i:i + COIN_FIELDS]
+        c = Coin(int(ln), x, z, size=w)
+        c.y, c.h, c.d, c.rotation = y, h, d, rot
+        sim.coins.append(c)
+
+    if world:
+        sim.next_building_spawn_z = spawn_z
+        sim.buildings = []
+        for i in range(0, len(buildings), BUILDING_FIELDS):
+            x, y, z, w, h, d = buildings[i:i + 6]
+            b = Building(x, z, width=w, depth=d, height=h)
+            b.y = y
+            b.color = tuple(buildings[i + 6:i + 9])
+            b.window_tint = tuple(buildings[i + 9:i + 12])
+            sim.buildings.append(b)
+    return sim
+
+
+def _sections(data):
+    """{section name: bytes} for diffing; follows the layout save_state writes."""
+    data = memoryview(data)
+    out = {}
+    pos = 0
+    for name, size in (("header", _HEADER.size + _TRACK.size), ("sim", _SIM.size),
+                       ("player", _PLAYER.size)):
+        out[name] = bytes(data[pos:pos + size])
+        pos += size
+    nqueue = out["player"][-1]
+    out["player"] += bytes(data[pos:pos + nqueue])
+    pos += nqueue
+    rng_size = _RNG.size + 625 * 4
+    out["rng"] = bytes(data[pos:pos + rng_size])
+    pos += rng_size
+    sections = [("inputs", "i"), ("obstacles", "d"), ("coins", "d")]
+    if _HEADER.unpack_from(data, 0)[3] & FLAG_DIFFICULTY:
+        sections.append(("difficulty", "d"))
+    for name, typecode in sections:
+        start = pos
+        _, pos = _get_array(data, pos, typecode)
+        out[name] = bytes(data[start:pos])
+    out["world"] = bytes(data[pos:])
+    return out
+
+
+def diff_states(a, b):
+    """Names of the sections that differ between two saved states ([] if equal)."""
+    if a == b:
+        return []
+    sa, sb = _sections(a), _sections(b)
+    return [name for name in sa if sa[name] != sb[name]]
+
+
+class StateRing:
+    """The most recent `size` states, one every `every` simulation frames."""
+    def __init__(self, every=30, size=20):
+        self.every = every
+        self.states = deque(maxlen=size)   # (frame, bytes)
+
+    def record(self, sim):
+        """Call after each step; saves when the frame is on the interval."""
+        if sim.frame % self.every == 0 and (not self.states or self.states[-1][0] != sim.frame):
+            self.states.append((sim.frame, save_state(sim)))
+
+    def before(self, frame):
+        """Newest saved (frame, bytes) at or before `frame` (the oldest one if none)."""
+        for f, data in reversed(self.states):
+            if f <= frame:
+                return f, data
+        return self.states[0] if self.states else None
+
+    def discard_after(self, frame):
+        while self.states and self.states[-1][0] > frame:
+            self.states.pop()
+
+    def clear(self):
+        self.states.clear()
+
+
+def write_state(path, sim):
+    with open(path, "wb") as f:
+        f.write(save_state(sim))
+
+
+def read_state(path, sim):
+    with open(path, "rb") as f:
+        return load_state(sim, f.read())
+
+
+def bench(entities, repeats=20):
+    """Save / load timings for a state with `entities` obstacles + coins."""
+    from simulation import Simulation
+    sim = Simulation()
+    sim.start(1)
+    for i in range(entities // 2):
+        sim.obstacles.append(Obstacle(i % 3, sim.track.lane_x[i % 3], -i * 0.5))
+        sim.coins.append(Coin(i % 3, sim.track.lane_x[i % 3], -i * 0.5 - 0.25))
+    sim.inputs = [(i, 1 if i % 2 else -1) for i in range(entities // 4)]
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        data = save_state(sim)
+    t1 = time.perf_counter()
+    for _ in range(repeats):
+        load_state(sim, data)
+    t2 = time.perf_counter()
+    assert save_state(sim) == data
+    return {"entities": entities, "bytes": len(data),
+            "save_ms": (t1 - t0) / repeats * 1000.0, "load_ms": (t2 - t1) / repeats * 1000.0}
+
+
+def main(argv):
+    import argparse
+    ap = argparse.ArgumentParser(description="Lane3D savestates")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="save / load timings at large entity counts")
+    b.add_argument("--entities", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    b.add_argument("--repeats", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    for n in args.entities:
+        r = bench(n, args.repeats)
+        print(f"[STATE] {r['entities']:>7} entities  {r['bytes'] / 1024:9.1f} KiB  "
+              f"save {r['save_ms']:8.3f} ms  load {r['load_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,415 @@
+# sessions.py - many headless games stepped together in one process
+#
+# Each session owns its own Player (lane queue + interpolation) and its own
+# seeded Spawner, but obstacle/coin/score state for *all* sessions lives in
+# shared NumPy arrays, so moving entities, swept-AABB tests and timers are
+# one vectorized pass per frame no matter how many sessions are running.
+# Collisions use the same continuous (time-of-impact) sweep as Simulation.
+# Rules mirror Simulation.update exactly (same float ops, same order), so a
+# seed + inputs gives the same score here as in a Simulation in the same
+# difficulty mode. Sessions play the fixed curve unless created adaptive
+# (the game's default), which runs a DifficultyController per session fed
+# with the same clearances; replay recordings say which mode they used.
+#
+# Front ends (newline-delimited JSON, one request -> one response):
+#   python sessions.py --stdin
+#   python sessions.py --port 7777          (localhost TCP)
+#
+#   {"op": "create", "seed": 42}             -> {"id": 0}     ("adaptive": true for the game's mode)
+#   {"op": "input", "id": 0, "dir": -1}      -> {"ok": true}
+#   {"op": "step", "frames": 60}             -> {"frame": 60}
+#   {"op": "result", "id": 0}                -> {"score": ..., "alive": ...}
+#   {"op": "results"}                        -> {"results": {...}}
+#   {"op": "close", "id": 0}                 -> {"ok": true}
+import argparse
+import json
+import random
+import socketserver
+import sys
+import threading
+
+import numpy as np
+
+from difficulty import DifficultyController, DECIDE_FRAMES, LEVELS
+from player import Player
+from spawner import Spawner
+from utils import swept_aabb_toi
+from track import DEFAULT_TRACK, Track
+from simulation import (
+    PLAYER_Z, OBSTACLE_START_Z, OBSTACLE_SPEED, SPAWN_INTERVAL,
+    MIN_SPAWN_INTERVAL, COIN_SPAWN_CHANCE, COMBO_TIMEOUT, DESPAWN_Z,
+    NEAR_MISS_DIST, NEAR_MISS_POINTS, NEAR_MISS_COMBO_TIME,
+    BASE_FORWARD_SPEED, BASE_MOVE_DURATION, MIN_MOVE_DURATION, MAX_MOVE_DURATION,
+    score_coin,
+)
+
+
+class BoxStore:
+    """Fixed-size slots of axis-aligned boxes moving along Z, one row per session."""
+    def __init__(self, sessions, slots):
+        shape = (sessions, slots)
+        self.on = np.zeros(shape, dtype=bool)
+        self.z = np.zeros(shape)
+        self.hz = np.zeros(shape)       # half depth of the hitbox
+        self.x_min = np.zeros(shape)
+        self.x_max = np.zeros(shape)
+        self.y_min = np.zeros(shape)
+        self.y_max = np.zeros(shape)
+        self.dropped = 0                # spawns lost because a row was full
+
+    def add(self, row, entity):
+        """Pack an Obstacle/Coin (rect() + half_depth()) into a free slot."""
+        free = np.flatnonzero(~self.on[row])
+        if free.size == 0:
+            self.dropped += 1
+            return
+        k = free[0]
+        (x0, y0, z0), (x1, y1, z1) = entity.rect()
+        self.on[row, k] = True
+        self.z[row, k] = entity.z
+        self.hz[row, k] = entity.half_depth()
+        self.x_min[row, k] = x0
+        self.x_max[row, k] = x1
+        self.y_min[row, k] = y0
+        self.y_max[row, k] = y1
+
+    def clear(self, row):
+        self.on[row] = False
+
+    def advance(self, dz, mask):
+        self.z[mask] += dz[mask, None]
+
+    def cull(self):
+        self.on &= self.z < DESPAWN_Z
+
+    def toi(self, mask, origin, motion, half, separation=False):
+        """
+        (sessions, slots) time of impact of each session's player vs live boxes
+        (inf = none); with separation=True also the signed separations (dead
+        slots hold garbage there, mask with `on`).
+        """
+        hx, hy, hz = half
+        box_min = (self.x_min - hx, self.y_min - hy, (self.z - self.hz) - hz)
+        box_max = (self.x_max + hx, self.y_max + hy, (self.z + self.hz) + hz)
+        origin = tuple(np.asarray(v)[:, None] if np.ndim(v) else v for v in origin)
+        motion = tuple(np.asarray(v)[:, None] if np.ndim(v) else v for v in motion)
+        out = swept_aabb_toi(origin, motion, box_min, box_max, separation)
+        toi = out[1]
+        toi[~(self.on & mask[:, None])] = np.inf
+        return (toi, out[2]) if separation else toi
+
+
+class SessionManager:
+    def __init__(self, capacity=256, dt=1.0 / 60.0, max_obstacles=64, max_coins=32, track=None):
+        """max_obstacles / max_coins are per 3-lane pattern; wider tracks get more slots."""
+        self.track = track or DEFAULT_TRACK
+        max_obstacles *= self.track.patterns_per_spawn
+        max_coins *= self.track.patterns_per_spawn
+        self.capacity = capacity
+        self.dt = dt
+        self.frame = 0
+
+        self.used = np.zeros(capacity, dtype=bool)
+        self.playing = np.zeros(capacity, dtype=bool)
+        self.seed = np.zeros(capacity, dtype=np.int64)
+        self.frames = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity)
+        self.score = np.zeros(capacity, dtype=np.int64)
+        self.combo = np.zeros(capacity, dtype=np.int64)
+        self.max_combo = np.zeros(capacity, dtype=np.int64)
+        self.near_misses = np.zeros(capacity, dtype=np.int64)
+        self.combo_timer = np.zeros(capacity)
+        self.spawn_timer = np.zeros(capacity)
+        self.spawn_interval = np.zeros(capacity)
+        self.px = np.zeros(capacity)
+        self.prev_px = np.zeros(capacity)
+        self.impact_time = np.full(capacity, np.nan)
+        self.spawn_density = np.ones(capacity)
+
+        self.players = [None] * capacity
+        self.spawners = [None] * capacity
+        self.difficulty = [None] * capacity  # DifficultyController of adaptive sessions
+        self.obstacles = BoxStore(capacity, max_obstacles)
+        self.coins = BoxStore(capacity, max_coins)
+        self._tmp_obstacles = []
+        self._tmp_coins = []
+
+    # --- API ---
+    def _check(self, sid):
+        """ValueError unless sid is the id of an open session (no NumPy wrap-around)."""
+        if (not isinstance(sid, (int, np.integer)) or isinstance(sid, bool)
+                or not 0 <= sid < self.capacity or not self.used[sid]):
+            raise ValueError(f"no session {sid!r}")
+
+    def create(self, seed=None, adaptive=False):
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)
+                                 or not -2 ** 63 <= seed < 2 ** 63):
+            raise ValueError(f"seed must be a 64-bit integer, got {seed!r}")
+        free = np.flatnonzero(~self.used)
+        if free.size == 0:
+            raise RuntimeError("session capacity reached")
+        sid = int(free[0])
+        seed = seed if seed is not None else random.randrange(2 ** 31)
+
+        player = Player(self.track.lane_x, start_lane=self.track.start_lane, y=-1.0, z=PLAYER_Z)
+        self.players[sid] = player
+        self.spawners[sid] = Spawner(self.track, OBSTACLE_START_Z, coin_chance=COIN_SPAWN_CHANCE,
+                                     rng=random.Random(seed))
+        self.obstacles.clear(sid)
+        self.coins.clear(sid)
+
+        self.used[sid] = True
+        self.playing[sid] = True
+        self.seed[sid] = seed
+        self.frames[sid] = 0
+        self.speed[sid] = OBSTACLE_SPEED
+        self.score[sid] = 0
+        self.combo[sid] = 0
+        self.max_combo[sid] = 0
+        self.near_misses[sid] = 0
+        self.combo_timer[sid] = 0.0
+        self.spawn_timer[sid] = 0.0
+        self.spawn_interval[sid] = SPAWN_INTERVAL
+        self.px[sid] = self.prev_px[sid] = player.x
+        self.impact_time[sid] = np.nan
+        self.spawn_density[sid] = 1.0
+        self.difficulty[sid] = DifficultyController(round(1.0 / self.dt)) if adaptive else None
+        if adaptive:
+            self._apply_level(sid)
+        return sid
+
+    def close(self, sid):
+        self._check(sid)
+        self.used[sid] = False
+        self.playing[sid] = False
+        self.players[sid] = None
+        self.spawners[sid] = None
+        self.difficulty[sid] = None
+        self.obstacles.clear(sid)
+        self.coins.clear(sid)
+
+    def input(self, sid, direction):
+        """Queue a lane change (-1 / +1); ignored once the session crashed."""
+        self._check(sid)
+        if not isinstance(direction, int) or isinstance(direction, bool) or direction not in (-1, 1):
+            raise ValueError(f"dir must be -1 or 1, got {direction!r}")
+        if not self.playing[sid]:
+            return False
+        moved = self.players[sid].request_move(direction, None)
+        if moved and self.difficulty[sid] is not None:
+            self.difficulty[sid].moved()
+        return moved
+
+    def step(self, frames=1):
+        for _ in range(frames):
+            self._step()
+        return self.frame
+
+    def result(self, sid):
+        self._check(sid)
+        return {
+            "id": int(sid),
+            "seed": int(self.seed[sid]),
+            "alive": bool(self.playing[sid]),
+            "frames": int(self.frames[sid]),
+            "score": int(self.score[sid]),
+            "combo": int(self.combo[sid]),
+            "max_combo": int(self.max_combo[sid]),
+            "near_misses": int(self.near_misses[sid]),
+            "speed": float(self.speed[sid]),
+            "lane": self.players[sid].lane if self.players[sid] else None,
+            "x": float(self.px[sid]),
+            "impact_time": None if np.isnan(self.impact_time[sid]) else float(self.impact_time[sid]),
+            "difficulty": "fixed" if self.difficulty[sid] is None else "adaptive",
+        }
+
+    def results(self):
+        return {int(sid): self.result(sid) for sid in np.flatnonzero(self.used)}
+
+    def _apply_level(self, sid):
+        """DifficultyController.apply for a session's density and spawner."""
+        spawner = self.spawners[sid]
+        self.spawn_density[sid], spawner.pattern_cdf, spawner.coin_chance = \
+            LEVELS[self.difficulty[sid].level]
+
+    # --- batched frame (same order as Simulation.update) ---
+    def _step(self):
+        dt = self.dt
+        m = self.playing
+        if not m.any():
+            return
+        self.frame += 1
+        self.frames[m] += 1
+
+        self.speed[m] += dt * 0.9
+        move_duration = np.clip(
+            BASE_MOVE_DURATION * (BASE_FORWARD_SPEED / np.maximum(1e-6, self.speed)),
+            MIN_MOVE_DURATION, MAX_MOVE_DURATION)
+        dz = self.speed * dt
+
+        # Combo timer
+        ticking = m & (self.combo > 0)
+        self.combo_timer[ticking] -= dt
+        expired = ticking & (self.combo_timer <= 0)
+        self.combo[expired] = 0
+        self.combo_timer[expired] = 0.0
+
+        self.obstacles.advance(dz, m)
+        self.coins.advance(dz, m)
+
+        # Players keep their own lane queue / smoothstep logic
+        rows = np.flatnonzero(m)
+        for i in rows:
+            p = self.players[i]
+            p.move_duration = float(move_duration[i])
+            p.update(dt, None)
+            self.px[i] = p.x
+            self.prev_px[i] = p.prev_x
+
+        # Continuous collision, all sessions at once (see Simulation.update)
+        p = self.players[rows[0]]
+        half = (p.w / 2.0, p.h / 2.0, p.d / 2.0)
+        origin = (self.prev_px, p.y, p.z + dz)
+        motion = (self.px - self.prev_px, 0.0, -dz)
+
+        obstacle_toi, obstacle_sep = self.obstacles.toi(m, origin, motion, half, separation=True)
+        crash_toi = np.minimum(obstacle_toi.min(axis=1), 1.0)
+        coin_hits = self.coins.toi(m, origin, motion, half) <= crash_toi[:, None]
+        collected = coin_hits.sum(axis=1)
+        self.coins.on &= ~coin_hits
+        for i in np.flatnonzero(collected):
+            score, combo, speed = int(self.score[i]), int(self.combo[i]), float(self.speed[i])
+            for _ in range(collected[i]):
+                score, combo, speed, _points = score_coin(score, combo, speed)
+            self.score[i], self.combo[i], self.speed[i] = score, combo, speed
+            self.combo_timer[i] = COMBO_TIMEOUT
+            self.max_combo[i] = max(self.max_combo[i], combo)
+
+        crashed = m & (obstacle_toi.min(axis=1) <= 1.0)
+        self.impact_time[crashed] = (self.frames[crashed] - 1 + crash_toi[crashed]) * dt
+        self.playing &= ~crashed
+
+        # Near misses (see Simulation.update): obstacles whose front edge
+        # reaches the back of the player this step, close enough, in sessions
+        # still running
+        front = self.obstacles.z + self.obstacles.hz
+        back = p.z - half[2]
+        passing = (self.obstacles.on & (m & ~crashed)[:, None]
+                   & (front >= back) & (front - dz[:, None] < back))
+        dodged = passing & (obstacle_sep <= NEAR_MISS_DIST)
+        for i, n in zip(*np.unique(np.flatnonzero(dodged) // dodged.shape[1], return_counts=True)):
+            self.near_misses[i] += n
+            for _ in range(n):
+                self.score[i] += NEAR_MISS_POINTS
+                if self.combo[i] > 0:
+                    self.combo_timer[i] = min(COMBO_TIMEOUT, self.combo_timer[i] + NEAR_MISS_COMBO_TIME)
+
+        # Adaptive sessions: the same clearances and decisions as Simulation.
+        # A row's passing obstacles come from one pattern, added to ascending
+        # slots in spawn order, so they are observed in Simulation's order.
+        for i in np.flatnonzero(passing.any(axis=1)):
+            if self.difficulty[i] is not None:
+                self.difficulty[i].observe(obstacle_sep[i, passing[i]])
+        for i in np.flatnonzero(m & (self.frames % DECIDE_FRAMES == 0)):
+            c = self.difficulty[i]
+            if c is not None and c.close_period(int(self.combo[i])):
+                self._apply_level(i)
+
+        self.obstacles.cull()
+        self.coins.cull()
+
+        # Spawning (after collisions, like Simulation)
+        self.spawn_timer[m] += dt
+        due = m & (self.spawn_timer >= self.spawn_interval * self.spawn_density)
+        for i in np.flatnonzero(due):
+            self.spawn_timer[i] = 0.0
+            self._tmp_obstacles.clear()
+            self._tmp_coins.clear()
+            self.spawners[i].spawn_pattern(self._tmp_obstacles, self._tmp_coins)
+            for o in self._tmp_obstacles:
+                self.obstacles.add(i, o)
+            for c in self._tmp_coins:
+                self.coins.add(i, c)
+            self.spawn_interval[i] = max(MIN_SPAWN_INTERVAL, self.spawn_interval[i] * 0.995)
+
+
+# ---------------------------------------------------------------------------
+# JSON front end
+# ---------------------------------------------------------------------------
+def handle_request(manager, req):
+    """One request -> one reply; bad requests get {"error": ...}, never an exception."""
+    if not isinstance(req, dict):
+        return {"error": "request must be a JSON object"}
+    op = req.get("op")
+    try:
+        if op == "create":
+            return {"id": manager.create(req.get("seed"), bool(req.get("adaptive", False)))}
+        if op == "input":
+            return {"ok": bool(manager.input(req["id"], req["dir"]))}
+        if op == "step":
+            return {"frame": manager.step(int(req.get("frames", 1)))}
+        if op == "result":
+            return manager.result(req["id"])
+        if op == "results":
+            return {"results": manager.results()}
+        if op == "close":
+            manager.close(req["id"])
+            return {"ok": True}
+        return {"error": f"unknown op {op!r}"}
+    except (KeyError, ValueError, TypeError, IndexError, RuntimeError) as e:
+        return {"error": str(e) or type(e).__name__}
+
+
+def serve_lines(manager, lines, write, lock=None):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError as e:
+            reply = {"error": f"bad json: {e}"}
+        else:
+            if lock:
+                with lock:
+                    reply = handle_request(manager, req)
+            else:
+                reply = handle_request(manager, req)
+        write(json.dumps(reply) + "\n")
+
+
+def serve_socket(manager, port):
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lines = (raw.decode("utf-8") for raw in self.rfile)
+            serve_lines(manager, lines, lambda s: (self.wfile.write(s.encode("utf-8")), self.wfile.flush()), lock)
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler) as server:
+        print(f"[SESSIONS] listening on 127.0.0.1:{port}", file=sys.stderr)
+        server.serve_forever()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Headless multi-session Lane3D server")
+    ap.add_argument("--capacity", type=int, default=256)
+    ap.add_argument("--fps", type=int, default=60, help="fixed simulation rate")
+    ap.add_argument("--port", type=int, help="serve JSON lines on localhost TCP")
+    ap.add_argument("--stdin", action="store_true", help="serve JSON lines on stdin/stdout")
+    ap.add_argument("--track", help="track file (default: LANE3D_TRACK or track.json)")
+    args = ap.parse_args()
+
+    manager = SessionManager(capacity=args.capacity, dt=1.0 / args.fps, track=Track.load(args.track))
+    if args.port:
+        serve_socket(manager, args.port)
+    else:
+        def write(s):
+            sys.stdout.write(s)
+            sys.stdout.flush()
+        serve_lines(manager, sys.stdin, write)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# simulation.py - gameplay state and rules, no window / GL / audio
+#
+# Game (game.py) subclasses Simulation and adds rendering, sound and
+# persistence by subscribing to self.events. Tools that only need the rules
+# (sessions.py, replay verification, ...) use Simulation directly.
+#
+#   python simulation.py bench --entities 10 1000 10000   (collision sweep cost)
+import random
+import sys
+import time
+
+import numpy as np
+
+from player import Player
+from spawner import Spawner
+from utils import swept_aabb_toi
+from events import EventBus, COIN_COLLECTED, CRASH, SPEED_TIER, LANE_CHANGED, NEAR_MISS
+from track import DEFAULT_TRACK
+from difficulty import DifficultyController
+
+# Gameplay config
+SIM_FPS = 60              # fixed timestep; recordings depend on it
+SIM_DT = 1.0 / SIM_FPS
+PLAYER_Z = 2.0
+OBSTACLE_START_Z = -80.0
+OBSTACLE_SPEED = 20.0
+SPAWN_INTERVAL = 0.8
+MIN_SPAWN_INTERVAL = 0.4
+COIN_SPAWN_CHANCE = 0.28
+COMBO_TIMEOUT = 3.0
+SPEED_TIER_STEP = 5.0     # a SpeedTierReached event every +5 units of speed
+DESPAWN_Z = 20.0  # camera z (12.0) + 8.0: anything past this is behind the camera
+NEAR_MISS_DIST = 0.5      # clearance (world units) of a dodge that scores a near miss
+NEAR_MISS_POINTS = 10
+NEAR_MISS_COMBO_TIME = 1.0  # seconds added to a running combo's timer
+
+BASE_FORWARD_SPEED = OBSTACLE_SPEED
+BASE_MOVE_DURATION = 0.06
+MIN_MOVE_DURATION = 0.02
+MAX_MOVE_DURATION = 0.18
+
+
+def move_duration_for(speed):
+    """Lateral slide time shrinks as forward speed grows."""
+    scaled = BASE_MOVE_DURATION * (BASE_FORWARD_SPEED / max(1e-6, speed))
+    return max(MIN_MOVE_DURATION, min(MAX_MOVE_DURATION, scaled))
+
+
+def score_coin(score, combo, speed):
+    """Apply one coin pickup. Returns (score, combo, speed, points)."""
+    combo += 1
+    points = 10 * combo
+    score += points
+    if score == 100: speed += 2.0
+    elif score == 150: speed += 3.0
+    elif score > 150 and score % 50 == 0: speed += 1.5
+    return score, combo, speed, points
+
+
+def sweep_boxes(entities, origin, motion, half):
+    """
+    Time of impact of the player (moving `motion` relative to the world
+    entities over this step) against every entity's rect(), in one pass.
+    Returns (toi, sep, rects), aligned with `entities`: toi (inf = no
+    contact), the signed separation of the swept player box from each box
+    (see swept_aabb_toi) and the (n, 2, 3) boxes themselves.
+    """
+    if not entities:
+        return np.empty(0), np.empty(0), np.empty((0, 2, 3))
+    rects = np.array([e.rect() for e in entities])  # (n, 2, 3)
+    lo = (rects[:, 0] - half).T
+    hi = (rects[:, 1] + half).T
+    _, toi, sep = swept_aabb_toi(origin, motion, lo, hi, separation=True)
+    return toi, sep, rects
+
+
+class Simulation:
+    def __init__(self, seed=None, track=None, adaptive=False):
+        """adaptive: let a DifficultyController tune spawns (else the fixed curve only)."""
+        self.track = track or DEFAULT_TRACK
+        self.difficulty = DifficultyController(SIM_FPS) if adaptive else None
+        self.rng = random.Random()
+        self.events = EventBus()
+        self.spawner = Spawner(self.track, OBSTACLE_START_Z, coin_chance=COIN_SPAWN_CHANCE, rng=self.rng)
+        self.combo_timeout = COMBO_TIMEOUT
+        self.road_scroll = 0.0
+        self.start(seed)
+        self.state = "menu"
+
+    def start(self, seed=None):
+        """Begin a fresh run. Every run has a seed so it can be replayed."""
+        self.seed = seed if seed is not None else random.randrange(2 ** 31)
+        self.rng.seed(self.seed)
+        self.frame = 0
+        self.inputs = []  # (frame, direction) for replays; the old list may be saved
+        # Reuse the player and entity lists of the previous run when there is one
+        if getattr(self, "player", None) is None:
+            self.player = Player(self.track.lane_x, start_lane=self.track.start_lane, y=-1.0, z=PLAYER_Z)
+            self.obstacles = []
+            self.coins = []
+        else:
+            self.player.reset(self.track.start_lane)
+            self.obstacles.clear()
+            self.coins.clear()
+        self.spawn_timer = 0.0
+        self.spawn_interval = SPAWN_INTERVAL
+        self.spawn_density = 1.0  # spawn interval scale set by the difficulty level
+        if self.difficulty is not None:
+            self.difficulty.reset()
+            self.difficulty.apply(self)
+        self.speed = OBSTACLE_SPEED
+        self.score = 0
+        self.combo = 0
+        self.combo_timer = 0.0
+        self.max_combo = 0
+        self.near_misses = 0
+        self.impact_time = None  # seconds into the run of the fatal contact
+        self.speed_tier = 0
+        self.lane = self.player.lane
+        self.state = "playing"
+
+    def spawn(self):
+        self.spawner.spawn_pattern(self.obstacles, self.coins)
+
+    def move(self, direction):
+        """Lane change input (-1 left, +1 right)."""
+        if self.state == "playing":
+            self.inputs.append((self.frame, direction))
+            moved = self.player.request_move(direction, self.obstacles)
+            if moved and self.difficulty is not None:
+                self.difficulty.moved()
+            self.check_lane()
+            return moved
+        return False
+
+    def check_lane(self):
+        p = self.player
+        if p.lane != self.lane:
+            self.events.publish(LANE_CHANGED, self.frame, p.lane, p.lane - self.lane, p.target_x)
+            self.lane = p.lane
+
+    def pass_obstacles(self, passing, clearance):
+        """Obstacles (indices) dodged this step and their clearance from the swept player."""
+        if self.difficulty is not None:
+            self.difficulty.observe(clearance)
+        for i, gap in zip(passing.tolist(), clearance.tolist()):
+            if gap > NEAR_MISS_DIST:
+                continue
+            self.score += NEAR_MISS_POINTS
+            self.near_misses += 1
+            if self.combo > 0:
+                self.combo_timer = min(self.combo_timeout, self.combo_timer + NEAR_MISS_COMBO_TIME)
+            o = self.obstacles[i]
+            # gap <= 0 only when the swept boxes' extents touch but the path itself missed
+            self.events.publish(NEAR_MISS, self.frame, NEAR_MISS_POINTS, int(max(gap, 0.0) * 1000),
+                                o.x, o.y, o.z)
+
+    def update(self, dt):
+        if self.state != "playing":
+            return
+        self.frame += 1
+
+        self.speed += dt * 0.9
+        self.player.move_duration = move_duration_for(self.speed)
+
+        dz = self.speed * dt
+
+        # Accelerate
+        self.road_scroll += self.speed * dt
+
+        # Combo timer
+        if self.combo > 0:
+            self.combo_timer -= dt
+            if self.combo_timer <= 0:
+                self.combo = 0
+                self.combo_timer = 0.0
+
+        for o in self.obstacles:
+            o.update(dz)
+        for c in self.coins:
+            c.update(dz)
+
+        # Update player
+        self.player.update(dt, self.obstacles)
+        self.check_lane()
+
+        # Continuous collision on X and Z. Relative to the entities the
+        # player slides from prev_x to x and travels -dz along Z; entity
+        # rects are end-of-step, so start the player dz further back instead
+        # of moving every box. Nothing can tunnel however large dz gets.
+        p = self.player
+        px = p.x
+        prev_px = getattr(p, "prev_x", px)
+        half = np.array((p.w / 2.0, p.h / 2.0, p.d / 2.0))
+        origin = (prev_px, p.y, p.z + dz)
+        motion = (px - prev_px, 0.0, -dz)
+
+        # one batched sweep over obstacles + coins
+        toi, sep, rects = sweep_boxes(self.obstacles + self.coins, origin, motion, half)
+        obstacle_toi = toi[:len(self.obstacles)]
+        coin_toi = toi[len(self.obstacles):]
+        crash_toi = obstacle_toi.min() if len(obstacle_toi) else np.inf
+
+        # Coin collection: only coins reached before any crash, in contact order
+        hits = np.flatnonzero(coin_toi <= min(crash_toi, 1.0))
+        if len(hits):
+            collected = [self.coins[i] for i in hits[np.argsort(coin_toi[hits], kind="stable")]]
+            for c in collected:
+                self.coins.remove(c)
+                self.score, self.combo, self.speed, points = score_coin(self.score, self.combo, self.speed)
+                self.combo_timer = self.combo_timeout
+                self.max_combo = max(self.max_combo, self.combo)
+                self.events.publish(COIN_COLLECTED, self.frame, self.combo, points, c.x, c.y, c.z)
+
+        # --- OBSTACLE LOGIC ---
+        if crash_toi <= 1.0:
+            o = self.obstacles[int(np.argmin(obstacle_toi))]
+            self.impact_time = (self.frame - 1 + float(crash_toi)) * dt
+            self.state = "gameover"
+            self.events.publish(CRASH, self.frame, self.score, self.max_combo, o.x, o.y, o.z)
+
+        # Near misses: obstacles whose front edge reaches the back of the
+        # player's box this step (a late dodge is still mid-slide then), at
+        # the clearance the sweep already measured
+        n = len(self.obstacles)
+        if self.state == "playing" and n:
+            front = rects[:n, 1, 2]
+            back = p.z - half[2]
+            passing = np.flatnonzero((front >= back) & (front - dz < back))
+            if len(passing):
+                self.pass_obstacles(passing, sep[passing])
+        if self.difficulty is not None and self.frame % self.difficulty.every == 0:
+            self.difficulty.decide(self)
+
+        # Remove passed objects (after the sweep, so a huge dz can't skip them)
+        self.obstacles = [o for o in self.obstacles if o.z < DESPAWN_Z]
+        self.coins = [c for c in self.coins if c.z < DESPAWN_Z]
+
+        self.spawn_timer += dt
+        if self.spawn_timer >= self.spawn_interval * self.spawn_density:
+            self.spawn_timer = 0.0
+            self.spawn()
+            self.spawn_interval = max(MIN_SPAWN_INTERVAL, self.spawn_interval * 0.995)
+
+        tier = int((self.speed - OBSTACLE_SPEED) // SPEED_TIER_STEP)
+        if tier > self.speed_tier:
+            self.speed_tier = tier
+            self.events.publish(SPEED_TIER, self.frame, tier, 0, self.speed)
+
+
+def bench(entities, repeats=200):
+    """Collision sweep timings (us) against `entities` obstacles, with and without separations."""
+    from spawner import Obstacle
+    sim = Simulation()
+    sim.start(1)
+    lanes = sim.track.lane_x
+    boxes = [Obstacle(i % 3, lanes[i % 3], -i * 0.5) for i in range(entities)]
+    p = sim.player
+    half = np.array((p.w / 2.0, p.h / 2.0, p.d / 2.0))
+    origin, motion = (lanes[1], p.y, p.z + 0.3), (lanes[0] - lanes[1], 0.0, -0.3)
+    rects = np.array([e.rect() for e in boxes])
+    lo = (rects[:, 0] - half).T
+    hi = (rects[:, 1] + half).T
+    out = {"entities": entities}
+    for name, separation in (("toi_us", False), ("sep_us", True)):
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            swept_aabb_toi(origin, motion, lo, hi, separation)
+        out[name] = (time.perf_counter() - t0) / repeats * 1e6
+    t0 = time.perf_counter()
+    for _ in range(max(1, repeats // 10)):
+        sweep_boxes(boxes, origin, motion, half)
+    out["sweep_us"] = (time.perf_counter() - t0) / max(1, repeats // 10) * 1e6
+    return out
+
+
+def main(argv):
+    import argparse
+    ap = argparse.ArgumentParser(description="Lane3D simulation")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="collision sweep cost with and without near-miss separations")
+    b.add_argument("--entities", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    b.add_argument("--repeats", type=int, default=200)
+    args = ap.parse_args(argv)
+
+    for n in args.entities:
+        r = bench(n, args.repeats)
+        print(f"[SWEEP] {r['entities']:>6} boxes  toi only {r['toi_us']:8.1f} us  "
+              f"+ separations {r['sep_us']:8.1f} us ({r['sep_us'] - r['toi_us']:+.1f})  "
+              f"whole sweep_boxes {r['sweep_us']:9.1f} us")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
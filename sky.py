@@ -0,0 +1,90 @@
+# sky.py - background sky as one precompiled full-screen triangle
+#
+# The triangle is placed in eye space so that, under the normal perspective
+# projection and an identity modelview, it exactly covers the viewport: no
+# matrix push/pop. Depth testing is switched off inside the display list, and
+# with the test off nothing is written to the depth buffer, so the scene needs
+# no extra depth clear after the sky. (Parking the sky at the far plane
+# instead doesn't work with a 16-bit depth buffer, where it rounds to 1.0.)
+# It is recompiled only when the projection changes (window resize).
+#
+# Horizontal parallax is a texture-matrix translate; S mirrors so the wrap has no seam.
+import math
+
+import pygame
+from OpenGL.GL import *
+
+from diagnostics import gl_created, gl_deleted
+from glstate import gl
+from utils import load_texture, texture_from_surface
+
+SKY_BOTTOM = -0.6          # NDC y where the image's bottom edge sits (ground covers below)
+SKY_PARALLAX = 0.004       # texture widths scrolled per world unit of player x
+GRADIENT_TOP = (40, 90, 170)
+GRADIENT_HORIZON = (250, 180, 120)
+
+
+def gradient_surface(top=GRADIENT_TOP, bottom=GRADIENT_HORIZON, height=256):
+    """Procedural fallback: vertical gradient, 1 pixel wide (stretched and wrapped)."""
+    surf = pygame.Surface((1, height), pygame.SRCALPHA)
+    for y in range(height):
+        t = y / (height - 1)
+        surf.set_at((0, y), tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)) + (255,))
+    return surf
+
+
+class Sky:
+    def __init__(self, path="assets/sky.jpg"):
+        """Load `path`, falling back to a gradient when it can't be read."""
+        self.fallback = False
+        try:
+            self.texture = load_texture(path, GL_MIRRORED_REPEAT, GL_CLAMP_TO_EDGE)
+        except (pygame.error, FileNotFoundError):
+            self.texture = texture_from_surface(gradient_surface(), "sky:gradient", GL_MIRRORED_REPEAT, GL_CLAMP_TO_EDGE)
+            self.fallback = True
+        self.list = 0
+
+    def build(self, fovy, aspect, far):
+        """Compile the triangle for this projection (call on resize)."""
+        if not self.list:
+            self.list = glGenLists(1)
+            gl_created("display_lists")
+        d = far * 0.5
+        sy = d * math.tan(math.radians(fovy) / 2.0)
+        sx = sy * aspect
+        v_span = 1.0 - SKY_BOTTOM
+
+        glNewList(self.list, GL_COMPILE)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glColor3f(1.0, 1.0, 1.0)
+        glBegin(GL_TRIANGLES)
+        # NDC (-1,-1), (3,-1), (-1,3): covers the viewport with one triangle
+        for nx, ny in ((-1.0, -1.0), (3.0, -1.0), (-1.0, 3.0)):
+            glTexCoord2f((nx + 1.0) / 2.0, (ny - SKY_BOTTOM) / v_span)
+            glVertex3f(nx * sx, ny * sy, -d)
+        glEnd()
+        glDisable(GL_TEXTURE_2D)
+        glEnable(GL_DEPTH_TEST)
+        glEndList()
+
+    def draw(self, player_x=0.0):
+        """Expects the scene projection; resets modelview to identity."""
+        glMatrixMode(GL_TEXTURE)
+        glLoadIdentity()
+        glTranslatef(player_x * SKY_PARALLAX, 0.0, 0.0)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+        glCallList(self.list)
+        # what the list leaves behind
+        gl.assume(GL_DEPTH_TEST, True)
+        gl.assume(GL_TEXTURE_2D, False)
+        gl.assume_texture(self.texture)
+        gl.forget_color()
+
+    def delete(self):
+        if self.list:
+            glDeleteLists(self.list, 1)
+            gl_deleted("display_lists")
+            self.list = 0
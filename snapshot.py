@@ -0,0 +1,231 @@
+# snapshot.py - immutable world snapshots handed from the sim thread to the GL thread
+#
+# In threaded mode (LANE3D_THREADED=1) the simulation steps on its own thread
+# and after every step packs what the renderer needs into a WorldSnapshot:
+# one float32 row per obstacle / coin / building / particle, the player's
+# pose and the handful of scalars the HUD reads. The GL thread only ever
+# reads the newest published snapshot and never touches live game objects.
+#
+# SnapshotBuffer is a triple buffer. The writer fills its back slot, then
+# swaps it with the middle slot; the reader swaps middle into front only when
+# a newer snapshot is there. The lock is held for those two assignments and
+# nothing else, so neither side ever waits on the other's work, and a slot is
+# never written while it can be read. A snapshot that is replaced before the
+# reader picks it up is counted as dropped; a render that finds nothing new
+# is counted as repeated.
+import threading
+from collections import deque
+
+import numpy as np
+
+from glstate import STATE_BLENDED, STATE_GHOST
+from ghost import COL_GHOST
+from player import CarModel, Player
+from spawner import Obstacle, Building, Coin
+
+# Row layouts (float32)
+OBSTACLE_ROW = ("x", "y", "z", "w", "h", "d", "r", "g", "b")
+COIN_ROW = ("x", "y", "z", "w", "h", "d", "rotation")
+BUILDING_ROW = ("x", "y", "z", "w", "h", "d", "r", "g", "b")
+PARTICLE_ROW = ("x", "y", "z", "size", "alpha")
+
+
+class _Rows:
+    """Growable float32 table; only the first n rows are live."""
+    def __init__(self, width, capacity=64):
+        self.data = np.zeros((capacity, width), np.float32)
+        self.n = 0
+
+    def pack(self, rows):
+        n = len(rows)
+        if n > len(self.data):
+            self.data = np.zeros((max(n, 2 * len(self.data)), self.data.shape[1]), np.float32)
+        self.data.flags.writeable = True
+        if n:
+            self.data[:n] = rows
+        self.data.flags.writeable = False  # read-only until this slot is packed again
+        self.n = n
+
+    def tolist(self):
+        return self.data[:self.n].tolist()
+
+
+class WorldSnapshot:
+    """
+    Everything one rendered frame needs. Attribute names match Game's, so
+    render code takes either the live game or a snapshot. Immutable once
+    published: only the writer touches a slot, and only while it is the back
+    slot.
+    """
+    def __init__(self, particle_cls):
+        """particle_cls: game.Particle (passed in; game imports this module)."""
+        self.time = 0.0      # wall-clock end of the sim step it shows
+        self.frame = 0
+        self.state = "menu"
+        self.score = self.highscore = self.combo = self.max_combo = self.near_misses = 0
+        self.combo_timer = 0.0
+        self.combo_timeout = 1.0
+        self.speed = 0.0
+        self.road_scroll = 0.0
+        self.banner = None
+        self.car_skin = None
+        self.practice = False
+        self.resume_available = False
+        self.ghosts_on = True
+        self.ghosts = []     # (x, y, z, skin) of visible ghost cars
+        self.opponents = []  # (x, y, z, skin, color) of LAN opponents
+        self.standings = ()
+        self.net_status = None
+        self.player = CarModel(0.0, 0.0, 0.0)
+        self.obstacles = _Rows(len(OBSTACLE_ROW))
+        self.coins = _Rows(len(COIN_ROW))
+        self.buildings = _Rows(len(BUILDING_ROW))
+        self.particles = _Rows(len(PARTICLE_ROW))
+        # flyweights: one object per kind, re-pointed at each row while drawing
+        self._obstacle = Obstacle(0, 0.0, 0.0)
+        self._coin = Coin(0, 0.0, 0.0)
+        self._building = Building(0.0, 0.0)
+        self._particle = particle_cls(0.0, 0.0, 0.0)
+        self._particle.max_life = 1.0  # rows carry alpha in place of life
+        self._ghost = CarModel(0.0, 0.0, 0.0)
+        self._ghost.color = COL_GHOST
+        self._opponent = CarModel(0.0, 0.0, 0.0)
+
+    # --- writer side (sim thread) ---
+    def pack(self, game, t):
+        self.time = t
+        self.frame = game.frame
+        self.state = game.state
+        self.score, self.highscore = game.score, game.highscore
+        self.combo, self.max_combo = game.combo, game.max_combo
+        self.near_misses = game.near_misses
+        self.combo_timer, self.combo_timeout = game.combo_timer, game.combo_timeout
+        self.speed = game.speed
+        self.road_scroll = game.road_scroll
+        self.banner = game.banner
+        self.car_skin = game.car_skin
+        self.practice, self.resume_available = game.practice, game.resume_available
+        self.ghosts_on = game.ghosts_on
+        self.ghosts = [(g.model.x, g.model.y, g.model.z, g.model.skin)
+                       for g in game.ghosts if g.visible]
+        self.opponents = [(m.x, m.y, m.z, m.skin, m.color)
+                          for m in game.net.models] if game.net else []
+        self.standings, self.net_status = game.standings, game.net_status
+
+        p, car = game.player, self.player
+        car.x, car.y, car.z = p.x, p.y, p.z
+        car.color, car.skin = p.color, p.model.skin
+
+        self.obstacles.pack([(o.x, o.y, o.z, o.w, o.h, o.d) + o.color for o in game.obstacles])
+        self.coins.pack([(c.x, c.y, c.z, c.w, c.h, c.d, c.rotation) for c in game.coins])
+        self.buildings.pack([(b.x, b.y, b.z, b.w, b.h, b.d) + b.color for b in game.buildings])
+        self.particles.pack([(q.x, q.y, q.z, q.size, q.life / q.max_life)
+                             for q in game.particles if q.life > 0])
+
+    # --- reader side (GL thread) ---
+    def draw_groups(self):
+        return [
+            (Building.state_key, self._iter_buildings()),
+            (Coin.state_key, self._iter_coins()),
+            (Obstacle.state_key, self._iter_obstacles()),
+            (Player.state_key, (self.player,)),
+            (STATE_BLENDED, self._iter_particles()),
+            (STATE_GHOST, self._iter_ghosts()),
+            (Player.state_key, self._iter_opponents()),
+        ]
+
+    def _iter_obstacles(self):
+        o = self._obstacle
+        for o.x, o.y, o.z, o.w, o.h, o.d, r, g, b in self.obstacles.tolist():
+            o.color = (r, g, b)
+            yield o
+
+    def _iter_coins(self):
+        c = self._coin
+        for c.x, c.y, c.z, c.w, c.h, c.d, c.rotation in self.coins.tolist():
+            yield c
+
+    def _iter_buildings(self):
+        b = self._building
+        for b.x, b.y, b.z, b.w, b.h, b.d, r, g, bl in self.buildings.tolist():
+            b.color = (r, g, bl)
+            yield b
+
+    def _iter_particles(self):
+        p = self._particle
+        for p.x, p.y, p.z, p.size, p.life in self.particles.tolist():
+            yield p
+
+    def _iter_ghosts(self):
+        g = self._ghost
+        for g.x, g.y, g.z, g.skin in self.ghosts:
+            yield g
+
+    def _iter_opponents(self):
+        m = self._opponent
+        for m.x, m.y, m.z, m.skin, m.color in self.opponents:
+            yield m
+
+    def entity_count(self):
+        return self.obstacles.n + self.coins.n + self.buildings.n + self.particles.n
+
+
+class SnapshotBuffer:
+    def __init__(self, make, keep=4096):
+        """make(): a blank WorldSnapshot (called three times, on this thread)."""
+        self.back, self.middle, self.front = make(), make(), make()
+        self.fresh = False           # middle holds a snapshot the reader hasn't taken
+        self.lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.frames = 0
+        self.repeated = 0
+        self.ages = deque(maxlen=keep)   # ms from sim step end to render
+        self.age_max = 0.0               # since the last take_stats()
+        self._taken = (0, 0, 0)
+
+    def publish(self, game, t):
+        """Sim thread: pack into the back slot and make it the latest."""
+        self.back.pack(game, t)
+        with self.lock:
+            self.back, self.middle = self.middle, self.back
+            if self.fresh:
+                self.dropped += 1
+            self.fresh = True
+        self.published += 1
+
+    def read(self, now):
+        """GL thread: the newest snapshot (the previous one if nothing new)."""
+        with self.lock:
+            new = self.fresh
+            if new:
+                self.front, self.middle = self.middle, self.front
+                self.fresh = False
+        if not new:
+            self.repeated += 1
+        self.frames += 1
+        snap = self.front
+        age = (now - snap.time) * 1000.0
+        self.ages.append(age)
+        self.age_max = max(self.age_max, age)
+        return snap
+
+    def percentiles(self, ps=(50, 95, 99)):
+        if not self.ages:
+            return {}
+        s = sorted(self.ages)
+        out = {f"p{p}": s[min(len(s) - 1, int(len(s) * p / 100.0))] for p in ps}
+        out["max"] = s[-1]
+        return out
+
+    def take_stats(self):
+        """Per-interval counts for diagnostics."""
+        published, dropped, repeated = self.published, self.dropped, self.repeated
+        p0, d0, r0 = self._taken
+        self._taken = (published, dropped, repeated)
+        stats = {"snapshots_published": published - p0,
+                 "snapshots_dropped": dropped - d0,
+                 "frames_repeated": repeated - r0}
+        stats["snapshot_age_ms_max"] = round(self.age_max, 2)
+        self.age_max = 0.0
+        return stats
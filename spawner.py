@@ -3,12 +3,15 @@ import random
 from OpenGL.GL import *
 from player import draw_cube
 from utils import aabb
+from glstate import gl, STATE_OPAQUE, STATE_TWO_SIDED
 
 # Visual colors
 COL_WALL = (0.9, 0.9, 0.9)
 COL_COIN = (1.0, 0.85, 0.25)
 
 class Obstacle:
+    state_key = STATE_OPAQUE
+
     def __init__(self, lane_idx, x, z, width=1.6, height=1.6):
         self.lane = lane_idx
         self.x = x
@@ -33,14 +36,14 @@ class Obstacle:
         self.z += dz
 
     def draw(self):
-        glDisable(GL_TEXTURE_2D)
+        gl.disable(GL_TEXTURE_2D)
         
         # 1. SPIKE (Pyramid Shape)
         # Small obstacles are drawn as sharp pyramids
         if self.w < 2.0 and self.h < 2.5:
             glPushMatrix()
             glTranslatef(self.x, self.y, self.z)
-            glColor3f(*self.color)
+            gl.color(self.color)
             
             w, h, d = self.w / 2.0, self.h, self.d / 2.0
             
@@ -67,20 +70,33 @@ class Obstacle:
                 self.color
             )
 
+    def half_depth(self):
+        """Hitbox half extent along Z (the only axis the box moves on)."""
+        if self.h < 2.5 and self.w < 2.0:
+            return self.d / 2 * 0.7
+        return self.d / 2
+
     def rect(self):
         # AABB Collision box
-        hx, hy, hz = self.w / 2, self.h / 2, self.d / 2
+        hx, hy = self.w / 2, self.h / 2
+        hz = self.half_depth()
         
         # Make hitbox slightly forgiving for spikes
         if self.h < 2.5 and self.w < 2.0:
             scale = 0.7
-            return (self.x - hx*scale, self.y, self.z - hz*scale), \
-                   (self.x + hx*scale, self.y + self.h*scale, self.z + hz*scale)
+            return (self.x - hx*scale, self.y, self.z - hz), \
+                   (self.x + hx*scale, self.y + self.h*scale, self.z + hz)
             
         return (self.x - hx, self.y, self.z - hz), \
                (self.x + hx, self.y + self.h, self.z + hz)
 class Building:
-    def __init__(self, x, z, width=6.0, depth=6.0, height=10.0):
+    state_key = STATE_OPAQUE
+
+    def __init__(self, x, z, width=6.0, depth=6.0, height=10.0, rng=random):
+        self.reset(x, z, width, depth, height, rng)
+
+    def reset(self, x, z, width=6.0, depth=6.0, height=10.0, rng=random):
+        """Re-roll this building in place (pooled buildings are reused, not rebuilt)."""
         self.x = x
         self.y = -1.0
         self.z = z
@@ -89,31 +105,31 @@ class Building:
         self.d = depth
         
         # --- MIX OF DARK AND BRIGHT COLORS ---
-        if random.random() < 0.5:
+        if rng.random() < 0.5:
             # Bright Colors
             self.color = (
-                random.uniform(0.6, 1.0), 
-                random.uniform(0.6, 1.0), 
-                random.uniform(0.6, 1.0)
+                rng.uniform(0.6, 1.0), 
+                rng.uniform(0.6, 1.0), 
+                rng.uniform(0.6, 1.0)
             )
         else:
             # Dark Colors
-            base = random.uniform(0.15, 0.3) 
+            base = rng.uniform(0.15, 0.3) 
             self.color = (
-                base + random.uniform(-0.05, 0.1),
-                base + random.uniform(-0.05, 0.1),
-                base + random.uniform(-0.05, 0.1),
+                base + rng.uniform(-0.05, 0.1),
+                base + rng.uniform(-0.05, 0.1),
+                base + rng.uniform(-0.05, 0.1),
             )
         
         self.window_tint = (
-            random.uniform(0.5, 1.0),
-            random.uniform(0.5, 1.0),
-            random.uniform(0.5, 1.0)
+            rng.uniform(0.5, 1.0),
+            rng.uniform(0.5, 1.0),
+            rng.uniform(0.5, 1.0)
         )
 
     def draw_windows(self):
-        glDisable(GL_TEXTURE_2D)
-        glEnable(GL_POLYGON_OFFSET_FILL)
+        gl.disable(GL_TEXTURE_2D)
+        gl.enable(GL_POLYGON_OFFSET_FILL)
         glPolygonOffset(-1.0, -1.0)
         
         rows = int(self.h // 1.5)
@@ -127,9 +143,9 @@ class Building:
                 if random.random() < 0.3: continue 
 
                 if random.random() < 0.6:
-                    glColor3f(1.0, 1.0, 1.0) 
+                    gl.color((1.0, 1.0, 1.0))
                 else:
-                    glColor3f(*self.window_tint) 
+                    gl.color(self.window_tint)
 
                 wy = self.y + 0.6 + r * 1.5
                 wz = (self.z - self.d / 2.0) + 0.6 + c * 1.5
@@ -141,11 +157,11 @@ class Building:
                 glVertex3f(side_face_x, wy + 0.35, wz - 0.35)
                 glEnd()
 
-        glDisable(GL_POLYGON_OFFSET_FILL)
+        gl.disable(GL_POLYGON_OFFSET_FILL)
 
     def draw_lamp(self):
         """ Draws a street lamp attached to the sidewalk in front of the building """
-        glDisable(GL_TEXTURE_2D)
+        gl.disable(GL_TEXTURE_2D)
 
         # 1. Determine direction towards the road
         # If building X is positive, road is to the Left (-1)
@@ -190,6 +206,8 @@ class Building:
         self.draw_lamp()
 
 class Coin:
+    state_key = STATE_TWO_SIDED  # spins, so both faces must be drawn
+
     def __init__(self, lane, x, z, size=0.8):
         self.lane = lane
         self.x = x
@@ -200,8 +218,11 @@ class Coin:
         self.d = size * 0.5
         self.rotation = 0.0
 
+    def half_depth(self):
+        return self.d / 2.0
+
     def rect(self):
-        hx, hy, hz = self.w / 2.0, self.h / 2.0, self.d / 2.0
+        hx, hy, hz = self.w / 2.0, self.h / 2.0, self.half_depth()
         return ((self.x - hx, self.y - hy, self.z - hz), (self.x + hx, self.y + hy, self.z + hz))
 
     def update(self, dz):
@@ -209,45 +230,44 @@ class Coin:
         self.rotation += 3.0
 
     def draw(self):
-        glDisable(GL_CULL_FACE)  # Turn off culling for this coin
+        # culling is already off: coins are drawn as a STATE_TWO_SIDED group
         glPushMatrix()
         glTranslatef(self.x, self.y, self.z)
         glRotatef(self.rotation, 0, 1, 0)  # spin around Y axis
         draw_cube((0, 0, 0), (self.w, self.h, self.d), COL_COIN)
         glPopMatrix()
-        glEnable(GL_CULL_FACE)  # Turn it back on
 
 class Spawner:
-    def __init__(self, lane_x_list, start_z, coin_chance=0.28):
-        self.lane_x_list = lane_x_list
+    def __init__(self, track, start_z, coin_chance=0.28, rng=random):
+        self.track = track
+        self.lane_x_list = track.lane_x
         self.start_z = start_z
         self.coin_chance = coin_chance
+        # cumulative odds of (cube, cube or wide wall); the rest are tall walls.
+        # Simulation's difficulty level may change these and coin_chance.
+        self.pattern_cdf = (0.6, 0.85)
+        # rng: anything with random()/randint(), e.g. a seeded random.Random
+        self.rng = rng
 
     def spawn_pattern(self, obstacles_list, coins_list):
+        # wider tracks roll more patterns per tick
+        for _ in range(self.track.patterns_per_spawn):
+            self.spawn_one(obstacles_list, coins_list)
+
+    def spawn_one(self, obstacles_list, coins_list):
         # random pattern: normal cube, wide wall, or tall wall
-        lane = random.randint(0, len(self.lane_x_list) - 1)
-        r = random.random()
+        lane = self.rng.randint(0, len(self.lane_x_list) - 1)
+        r = self.rng.random()
         
         # 1. Spawn Obstacles
-        if r < 0.6:
+        if r < self.pattern_cdf[0]:
             # Normal obstacle (Cube)
             obstacles_list.append(
                 Obstacle(lane, self.lane_x_list[lane], self.start_z, width=1.6, height=1.6)
             )
-        elif r < 0.85:
-            # Wide wall spanning two lanes (if possible)
-            if lane == 0:
-                left = 0
-            elif lane == len(self.lane_x_list) - 1:
-                left = len(self.lane_x_list) - 2
-            else:
-                left = lane - 1
-            
-            # Calculate center point between the two lanes
-            center_x = (self.lane_x_list[left] + self.lane_x_list[left + 1]) / 2.0
-            # Width is the distance between lanes * 2, minus a small gap
-            width = abs(self.lane_x_list[left + 1] - self.lane_x_list[left]) * 2.0 - 0.3
-            
+        elif r < self.pattern_cdf[1]:
+            # Wide wall spanning two lanes (precomputed per lane by Track)
+            left, center_x, width = self.track.wall_spans[lane]
             obj = Obstacle(left, center_x, self.start_z, width=width, height=1.8)
             obstacles_list.append(obj)
         else:
@@ -257,7 +277,7 @@ class Spawner:
             )
 
         # 2. Spawn Coins
-        if random.random() < self.coin_chance:
-            cl = random.randint(0, len(self.lane_x_list) - 1)
+        if self.rng.random() < self.coin_chance:
+            cl = self.rng.randint(0, len(self.lane_x_list) - 1)
             coins_list.append(Coin(cl, self.lane_x_list[cl], self.start_z + 8.0))
 
@@ -0,0 +1,65 @@
+# telemetry.py - per-run session telemetry written as JSON lines
+#
+# Records go to a log.JsonlSink, so serialization and file I/O happen in
+# batches on the writer thread, never on the game loop.
+#
+#   {"t": "sample", "seed": .., "frame": .., "score": .., "speed": .., "combo": .., "level": ..}
+#   {"t": "run", "seed": .., "frames": .., "score": .., "max_combo": ..,
+#    "combo_spans": [[start_frame, end_frame, length], ...],
+#    "near_misses": [[frame, clearance], ...], ...}
+from events import COIN_COLLECTED, CRASH, NEAR_MISS
+from log import JsonlSink
+
+
+class RunTelemetry:
+    def __init__(self, path, sim, sample_every=30):
+        """sample_every: simulation frames between score/speed samples (30 = 0.5 s)."""
+        self.sink = JsonlSink(path)
+        self.sim = sim
+        self.sample_every = sample_every
+        self.spans = []
+        self.span = None  # [start_frame, end_frame, length] of the running combo
+        self.near_misses = []
+        sim.events.subscribe(self.on_event, COIN_COLLECTED, CRASH, NEAR_MISS)
+
+    def begin_run(self):
+        self.spans = []
+        self.span = None
+        self.near_misses = []
+
+    def sample(self):
+        """Call once per simulation step; only every Nth frame is recorded."""
+        sim = self.sim
+        if sim.frame % self.sample_every == 0:
+            record = {"t": "sample", "seed": sim.seed, "frame": sim.frame,
+                      "score": sim.score, "speed": round(sim.speed, 3), "combo": sim.combo}
+            if sim.difficulty is not None:
+                record["level"] = sim.difficulty.level
+            self.sink.put(record)
+
+    def on_event(self, kind, frame, i, j, x, y, z):
+        if kind == COIN_COLLECTED:
+            if i == 1 or self.span is None:
+                self._close_span()
+                self.span = [frame, frame, 1]
+            else:
+                self.span[1] = frame
+                self.span[2] = i
+        elif kind == NEAR_MISS:
+            self.near_misses.append([frame, j / 1000.0])
+        elif kind == CRASH:
+            self._close_span()
+            sim = self.sim
+            self.sink.put({"t": "run", "seed": sim.seed, "frames": sim.frame, "score": i,
+                           "max_combo": j, "impact_time": sim.impact_time,
+                           "combo_spans": self.spans, "near_misses": self.near_misses})
+            self.spans = []
+            self.near_misses = []
+
+    def _close_span(self):
+        if self.span and self.span[2] > 1:
+            self.spans.append(self.span)
+        self.span = None
+
+    def close(self):
+        self.sink.close()
@@ -0,0 +1,73 @@
+# track.py - road geometry: lane count, spacing, widths
+#
+# Everything derived from the layout (lane centers, lane-divider x, the
+# span of a two-lane wall rolled on each lane, building rows) is computed
+# once here; simulation, spawner, sessions and rendering read the tables
+# instead of re-deriving them every frame.
+#
+# track.json (all keys optional):
+#   {"lanes": 5, "spacing": 3.0, "road_width": 80.0, "block_length": 15.0}
+import json
+import os
+import zlib
+
+TRACK_FILE = "track.json"
+MAX_LANES = 15
+FIELDS = ("lanes", "spacing", "road_width", "block_length", "building_margin", "wall_gap")
+
+
+class Track:
+    def __init__(self, lanes=3, spacing=3.0, road_width=80.0, block_length=15.0,
+                 building_margin=4.5, wall_gap=0.3):
+        lanes = int(lanes)
+        if not 2 <= lanes <= MAX_LANES:
+            raise ValueError(f"lanes must be 2..{MAX_LANES}, got {lanes}")
+        self.lanes = lanes
+        self.spacing = float(spacing)
+        self.road_width = float(road_width)          # paved surface, centered on x = 0
+        self.block_length = float(block_length)      # building row pitch along Z
+        self.building_margin = float(building_margin)
+        self.wall_gap = float(wall_gap)
+
+        self.half_width = self.spacing * (lanes - 1) / 2.0   # outer lane center to road center
+        self.lane_x = tuple(-self.half_width + i * self.spacing for i in range(lanes))
+        self.start_lane = lanes // 2
+        self.dash_x = tuple((a + b) / 2.0 for a, b in zip(self.lane_x, self.lane_x[1:]))
+
+        # Wide wall for a pattern rolled on lane i: (left lane, center x, width).
+        # It covers lane i and a neighbour, shifted inward at the road edges.
+        spans = []
+        for lane in range(lanes):
+            left = min(max(lane - 1, 0), lanes - 2)
+            a, b = self.lane_x[left], self.lane_x[left + 1]
+            spans.append((left, (a + b) / 2.0, abs(b - a) * 2.0 - self.wall_gap))
+        self.wall_spans = tuple(spans)
+
+        self.building_x = (-(self.half_width + building_margin), self.half_width + building_margin)
+        # Obstacle patterns per spawn tick, so density per lane stays about
+        # the same as on the original 3-lane road
+        self.patterns_per_spawn = max(1, round(lanes / 3))
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in FIELDS}
+
+    def digest(self):
+        """32-bit hash of every field, for checking two peers race on the same road."""
+        return zlib.crc32(json.dumps(self.to_dict(), sort_keys=True).encode())
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{k: d[k] for k in FIELDS if k in d})
+
+    @classmethod
+    def load(cls, path=None):
+        """Read a track file (LANE3D_TRACK or track.json); defaults if there is none."""
+        path = path or os.environ.get("LANE3D_TRACK", TRACK_FILE)
+        try:
+            with open(path, "r") as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return cls()
+
+
+DEFAULT_TRACK = Track()
@@ -3,19 +3,64 @@
 import pygame
 from OpenGL.GL import *
 
+from diagnostics import allocated
+from glstate import gl
+
 TEXT_COLOR = (255, 255, 220)
 
+# HUD layout is authored for a 900px-tall window and scaled from there.
+BASE_HEIGHT = 900
+
+_fonts = {}  # pixel size -> Font; SysFont is slow and every size used to be reloaded
+
+def get_font(size):
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = pygame.font.SysFont("Arial", size)
+    return font
+
 class Overlay:
     def __init__(self, w, h):
+        self.w = 0
+        self.h = 0
+        self.surfaces = {}  # (w, h) -> Surface, so toggling fullscreen reuses both
+        self.resize(w, h)
+
+    def resize(self, w, h):
+        if (w, h) == (self.w, self.h):
+            return
         self.w = w
         self.h = h
-        self.surface = pygame.Surface((w, h), pygame.SRCALPHA)
-        self.font = pygame.font.SysFont("Arial", 26)
-        self.large_font = pygame.font.SysFont("Arial", 44)
+        self.scale = max(0.5, min(w, h) / BASE_HEIGHT)
+        surface = self.surfaces.get((w, h))
+        if surface is None:
+            # keep at most the current and previous size (windowed <-> fullscreen)
+            if len(self.surfaces) >= 2:
+                self.surfaces.pop(next(iter(self.surfaces)))
+            surface = self.surfaces[(w, h)] = pygame.Surface((w, h), pygame.SRCALPHA)
+            allocated("overlay_surfaces")
+        self.surface = surface
+        self.font = get_font(self.px(26))
+        self.large_font = get_font(self.px(44))
+
+    def px(self, v):
+        """Layout pixels (900px reference) -> native pixels."""
+        return int(round(v * self.scale))
+
+    def place(self, surf, ax, ay, dx=0, dy=0):
+        """
+        Blit `surf` anchored at fraction (ax, ay) of the overlay, offset by
+        (dx, dy) layout pixels. The item's own anchor follows ax, so 0 is
+        left-aligned, 0.5 centered and 1 right-aligned; y is the top edge.
+        Returns the top-left position used.
+        """
+        x = int(ax * self.w - ax * surf.get_width()) + self.px(dx)
+        y = int(ay * self.h) + self.px(dy)
+        self.surface.blit(surf, (x, y))
+        return x, y
 
     def blit_text(self, text, x, y, size=26, color=TEXT_COLOR):
-        font = pygame.font.SysFont("Arial", size)
-        surf = font.render(text, True, color)
+        surf = get_font(size).render(text, True, color)
         self.surface.blit(surf, (x, y))
 
     def draw_fullscreen(self):
@@ -30,10 +75,10 @@ class Overlay:
         glPushMatrix()
         glLoadIdentity()
 
-        glDisable(GL_DEPTH_TEST)
-        glDisable(GL_TEXTURE_2D)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        gl.disable(GL_DEPTH_TEST)
+        gl.disable(GL_TEXTURE_2D)
+        gl.enable(GL_BLEND)
+        gl.blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
         glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
 
@@ -1,6 +1,10 @@
 import pygame
 from OpenGL.GL import *
 import os
+import numpy as np
+
+from diagnostics import gl_created, gl_deleted
+from glstate import gl
 
 HIGH_SCORE_FILE = "lane3d_highscore.txt"
 
@@ -26,17 +30,84 @@ def aabb(a_min, a_max, b_min, b_max):
         and a_min[2] <= b_max[2] and a_max[2] >= b_min[2]
     )
 
+def swept_aabb_toi(origin, motion, box_min, box_max, separation=False):
+    """
+    Continuous collision: a point moving from `origin` by `motion` over one
+    step against boxes already grown by the mover's half extents (Minkowski
+    sum). Each argument is a 3-tuple (x, y, z) of scalars or NumPy arrays
+    that broadcast together, so one call tests every candidate at once.
+
+    Returns (hit, toi): hit is a bool array, toi the normalized time of
+    impact in [0, 1] (0 = already overlapping, inf where there is no hit).
+    Touching counts as a hit, like aabb().
+
+    separation=True also returns sep, the signed distance between the box
+    the mover sweeps this step and each box: the largest per-axis gap
+    between their extents (> 0 apart, <= 0 overlapping). Taken from the
+    same slab differences (box bounds must be arrays), so it costs a few
+    in-place array ops, not a second pass.
+    """
+    t_enter = 0.0
+    t_exit = 1.0
+    sep = None
+    with np.errstate(over="ignore", divide="ignore"):
+        for o, v, lo, hi in zip(origin, motion, box_min, box_max):
+            # Slab method. A still axis gets a huge finite inverse instead of
+            # inf so a point exactly on a face gives 0 (touching), not nan.
+            scalar = np.ndim(v) == 0
+            if scalar:
+                inv = 1.0 / v if v != 0 else 1e300
+            else:
+                inv = np.where(v == 0, 1e300, 1.0 / v)
+            near, far = lo - o, hi - o
+            if separation:
+                # gap between the box and the swept extent [o + behind, o + ahead]
+                if scalar:
+                    ahead, behind = max(v, 0.0), min(v, 0.0)
+                else:
+                    ahead, behind = np.maximum(v, 0.0), np.minimum(v, 0.0)
+                if sep is None:
+                    sep, tmp = near - ahead, behind - far
+                else:
+                    np.maximum(sep, np.subtract(near, ahead, out=tmp), out=sep)
+                    np.subtract(behind, far, out=tmp)
+                np.maximum(sep, tmp, out=sep)
+            # near / far become t1 / t2 in place (fewer large temporaries)
+            near *= inv
+            far *= inv
+            t_min = np.minimum(near, far)
+            t_max = np.maximum(near, far, out=far)
+            t_enter = np.maximum(t_enter, t_min, out=t_min if np.ndim(t_enter) == 0 else t_enter)
+            t_exit = np.minimum(t_exit, t_max, out=t_max if np.ndim(t_exit) == 0 else t_exit)
+    hit = t_enter <= t_exit
+    if separation:
+        return hit, np.where(hit, t_enter, np.inf), sep
+    return hit, np.where(hit, t_enter, np.inf)
+
 path ="C:/Users/abdel/Documents/GitHub/Speed-Dodge-Drive/assests/sky.jpg"
-def load_texture(path):
+_textures = {}  # path (or key) -> texture id, so reloading an image never leaks a texture
+
+def load_texture(path, wrap_s=GL_REPEAT, wrap_t=GL_REPEAT):
+    if path in _textures:
+        return _textures[path]
     surf = pygame.image.load(path).convert_alpha()
+    return texture_from_surface(surf, path, wrap_s, wrap_t)
+
+def texture_from_surface(surf, key, wrap_s=GL_REPEAT, wrap_t=GL_REPEAT):
+    """Upload a pygame Surface as an RGBA texture cached under `key`."""
+    if key in _textures:
+        return _textures[key]
     image = pygame.image.tostring(surf, "RGBA", True)
     w, h = surf.get_size()
 
     tex_id = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, tex_id)
+    gl_created("textures")
+    gl.bind_texture(tex_id)
 
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap_s)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap_t)
 
     glTexImage2D(
         GL_TEXTURE_2D, 0, GL_RGBA,
@@ -44,5 +115,12 @@ def load_texture(path):
         GL_RGBA, GL_UNSIGNED_BYTE, image
     )
 
-    glBindTexture(GL_TEXTURE_2D, 0)
+    gl.bind_texture(0)
+    _textures[key] = tex_id
     return tex_id
+
+def delete_texture(path):
+    tex_id = _textures.pop(path, None)
+    if tex_id is not None:
+        glDeleteTextures(np.array([tex_id], dtype=np.uint32))
+        gl_deleted("textures")